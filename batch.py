@@ -0,0 +1,239 @@
+"""
+Concurrent fan-out helpers for running many API calls.
+
+Calls run with bounded concurrency (a thread pool for synchronous functions, a
+semaphore for coroutines), or under an adaptive limiter whose limit follows
+the API's health. Each call's result or exception is captured in a
+BatchItem so one failure does not abort the rest.
+"""
+
+import time
+import asyncio
+import contextvars
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from logger import get_logger
+from metrics import percentile
+from concurrency import AdaptiveLimiter, AsyncAdaptiveLimiter
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class BatchItem:
+    """Outcome of one call in a batch."""
+
+    index: int
+    request: Dict[str, Any]
+    response: Any = None
+    error: Optional[BaseException] = None
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """Whether the call succeeded."""
+        return self.error is None
+
+
+@dataclass
+class BatchReport:
+    """Results of a batch in input order, with aggregate statistics."""
+
+    items: List[BatchItem] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def responses(self) -> List[Any]:
+        """Responses in input order, None where the call failed."""
+        return [item.response for item in self.items]
+
+    @property
+    def errors(self) -> List[BatchItem]:
+        """Items whose call failed."""
+        return [item for item in self.items if not item.ok]
+
+    @property
+    def succeeded(self) -> int:
+        """Number of successful calls."""
+        return sum(1 for item in self.items if item.ok)
+
+    @property
+    def failed(self) -> int:
+        """Number of failed calls."""
+        return len(self.items) - self.succeeded
+
+    @property
+    def throughput(self) -> float:
+        """Completed calls per second of wall-clock time."""
+        return len(self.items) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def latency_percentiles(self) -> Dict[str, Optional[float]]:
+        """p50/p95/p99 latency in seconds of the successful calls."""
+        latencies = [item.latency for item in self.items if item.ok]
+        return {name: percentile(latencies, q) for name, q in (("p50", 50), ("p95", 95), ("p99", 99))}
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate statistics as a dictionary."""
+        return {
+            "total": len(self.items),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed": self.elapsed,
+            "throughput": self.throughput,
+            "latency": self.latency_percentiles(),
+        }
+
+
+def _run_one(
+    func: Callable[..., Any],
+    index: int,
+    request: Dict[str, Any],
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> BatchItem:
+    """Call func with a request's keyword arguments, capturing the outcome."""
+    with limiter if limiter is not None else nullcontext():
+        item = BatchItem(index=index, request=request)
+        started_at = time.perf_counter()
+        try:
+            item.response = func(**request)
+        except Exception as e:
+            item.error = e
+        item.latency = time.perf_counter() - started_at
+        return item
+
+
+def iter_many(
+    func: Callable[..., Any],
+    requests: List[Dict[str, Any]],
+    max_concurrency: int = 8,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> Iterator[BatchItem]:
+    """Run func over many requests in a thread pool, yielding items as they complete.
+
+    Args:
+        func: Function called with each request's keyword arguments.
+        requests: Keyword argument dictionaries, one per call.
+        max_concurrency: Maximum number of calls in flight.
+        limiter: Optional adaptive limiter deciding how many calls are in
+            flight instead; max_concurrency is then ignored and the pool has
+            the limiter's max_limit threads.
+
+    Yields:
+        BatchItem per request, in completion order.
+    """
+    if not requests:
+        return
+    workers = limiter.policy.max_limit if limiter is not None else max_concurrency
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(requests)))) as executor:
+        futures = [
+            # Copy the caller's context so calls keep its priority and deadline (see scheduler.schedule)
+            executor.submit(contextvars.copy_context().run, _run_one, func, index, request, limiter)
+            for index, request in enumerate(requests)
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Don't start calls nobody will consume if the caller stops early
+            for future in futures:
+                future.cancel()
+
+
+def run_many(
+    func: Callable[..., Any],
+    requests: List[Dict[str, Any]],
+    max_concurrency: int = 8,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> BatchReport:
+    """Run func over many requests in a thread pool and collect the results.
+
+    Args:
+        func: Function called with each request's keyword arguments.
+        requests: Keyword argument dictionaries, one per call.
+        max_concurrency: Maximum number of calls in flight.
+        limiter: Optional adaptive limiter used instead of max_concurrency.
+
+    Returns:
+        BatchReport with items in input order.
+    """
+    started_at = time.perf_counter()
+    items = sorted(iter_many(func, requests, max_concurrency, limiter), key=lambda item: item.index)
+    report = BatchReport(items=items, elapsed=time.perf_counter() - started_at)
+    logger.debug(f"Batch finished: {report.summary()}")
+    return report
+
+
+async def _arun_one(
+    func: Callable[..., Awaitable[Any]],
+    index: int,
+    request: Dict[str, Any],
+    semaphore: AsyncContextManager[Any],
+) -> BatchItem:
+    """Await func with a request's keyword arguments, capturing the outcome."""
+    async with semaphore:
+        item = BatchItem(index=index, request=request)
+        started_at = time.perf_counter()
+        try:
+            item.response = await func(**request)
+        except Exception as e:
+            item.error = e
+        item.latency = time.perf_counter() - started_at
+        return item
+
+
+async def aiter_many(
+    func: Callable[..., Awaitable[Any]],
+    requests: List[Dict[str, Any]],
+    max_concurrency: int = 8,
+    limiter: Optional[AsyncAdaptiveLimiter] = None,
+) -> AsyncIterator[BatchItem]:
+    """Await func over many requests concurrently, yielding items as they complete.
+
+    Args:
+        func: Coroutine function called with each request's keyword arguments.
+        requests: Keyword argument dictionaries, one per call.
+        max_concurrency: Maximum number of calls in flight.
+        limiter: Optional adaptive limiter used instead of max_concurrency.
+
+    Yields:
+        BatchItem per request, in completion order.
+    """
+    semaphore = limiter if limiter is not None else asyncio.Semaphore(max(1, max_concurrency))
+    tasks = [
+        asyncio.ensure_future(_arun_one(func, index, request, semaphore))
+        for index, request in enumerate(requests)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def arun_many(
+    func: Callable[..., Awaitable[Any]],
+    requests: List[Dict[str, Any]],
+    max_concurrency: int = 8,
+    limiter: Optional[AsyncAdaptiveLimiter] = None,
+) -> BatchReport:
+    """Await func over many requests concurrently and collect the results.
+
+    Args:
+        func: Coroutine function called with each request's keyword arguments.
+        requests: Keyword argument dictionaries, one per call.
+        max_concurrency: Maximum number of calls in flight.
+        limiter: Optional adaptive limiter used instead of max_concurrency.
+
+    Returns:
+        BatchReport with items in input order.
+    """
+    started_at = time.perf_counter()
+    items = [item async for item in aiter_many(func, requests, max_concurrency, limiter)]
+    items.sort(key=lambda item: item.index)
+    report = BatchReport(items=items, elapsed=time.perf_counter() - started_at)
+    logger.debug(f"Async batch finished: {report.summary()}")
+    return report
@@ -0,0 +1,129 @@
+"""
+Benchmark the per-request CPU cost of response parsing.
+
+Runs chat completion and embedding requests through OpenAIClient against an
+in-process mock transport (no network), once with the SDK's pydantic parsing
+and once with fast_parse=True, and reports CPU time per request.
+
+Usage:
+    python benchmark_parsing.py --requests 2000
+"""
+
+import json
+import time
+import array
+import base64
+import random
+import argparse
+from typing import Any, Callable, Dict
+
+from openai import OpenAI
+
+# The SDK's HTTP library (httpx, or httpx2 in newer SDK releases)
+try:
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+import fast_json
+from openai_client import OpenAIClient
+
+
+def chat_body(words: int) -> bytes:
+    """Build a chat completion response body with a reply of the given length."""
+    return json.dumps({
+        "id": "chatcmpl-benchmark",
+        "object": "chat.completion",
+        "created": 1700000000,
+        "model": "gpt-4o-2024-08-06",
+        "system_fingerprint": "fp_benchmark",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": " ".join(["token"] * words), "refusal": None},
+            "logprobs": None,
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": 50,
+            "completion_tokens": words,
+            "total_tokens": 50 + words,
+            "prompt_tokens_details": {"cached_tokens": 0, "audio_tokens": 0},
+            "completion_tokens_details": {"reasoning_tokens": 0, "audio_tokens": 0},
+        },
+    }).encode("utf-8")
+
+
+def embedding_body(inputs: int, dimensions: int, encoding_format: str) -> bytes:
+    """Build an embeddings response body in float or base64 format."""
+    rng = random.Random(0)
+    vectors = [[rng.uniform(-1, 1) for _ in range(dimensions)] for _ in range(inputs)]
+    if encoding_format == "base64":
+        vectors = [base64.b64encode(array.array("f", vector).tobytes()).decode("ascii") for vector in vectors]
+    return json.dumps({
+        "object": "list",
+        "model": "text-embedding-3-small",
+        "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+        "usage": {"prompt_tokens": inputs * 8, "total_tokens": inputs * 8},
+    }).encode("utf-8")
+
+
+def make_client(fast_parse: bool, bodies: Dict[str, bytes]) -> OpenAIClient:
+    """Create a client whose HTTP requests are answered in-process."""
+    def handler(request: Any) -> Any:
+        if request.url.path.endswith("/embeddings"):
+            body = bodies[json.loads(request.content)["encoding_format"]]
+        else:
+            body = bodies["chat"]
+        return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+    client = OpenAIClient(api_key="benchmark", fast_parse=fast_parse)
+    client.client = OpenAI(
+        api_key="benchmark",
+        max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    return client
+
+
+def cpu_per_request(call: Callable[[], Any], requests: int) -> float:
+    """Return the CPU seconds one call takes on average."""
+    for _ in range(min(50, requests)):
+        call()
+    started_at = time.process_time()
+    for _ in range(requests):
+        call()
+    return (time.process_time() - started_at) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark response parsing CPU per request")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--reply-words", type=int, default=50, help="Words in each chat reply")
+    parser.add_argument("--embedding-inputs", type=int, default=16, help="Inputs per embeddings request")
+    parser.add_argument("--dimensions", type=int, default=256, help="Embedding dimensions")
+    args = parser.parse_args()
+
+    bodies = {
+        "chat": chat_body(args.reply_words),
+        "float": embedding_body(args.embedding_inputs, args.dimensions, "float"),
+        "base64": embedding_body(args.embedding_inputs, args.dimensions, "base64"),
+    }
+    messages = [{"role": "user", "content": "Hello"}]
+    texts = [f"text {i}" for i in range(args.embedding_inputs)]
+
+    sdk_client = make_client(False, bodies)
+    fast_client = make_client(True, bodies)
+
+    print(f"JSON backend: {fast_json.BACKEND}")
+    print(f"{'scenario':<12} {'sdk (us)':>10} {'fast (us)':>10} {'saved':>7}")
+    for name, request in (
+        ("chat", lambda client: client.chat_completion(messages=messages, model="gpt-4o")),
+        ("embeddings", lambda client: client.create_embeddings(texts, model="text-embedding-3-small")),
+    ):
+        sdk = cpu_per_request(lambda: request(sdk_client), args.requests)
+        fast = cpu_per_request(lambda: request(fast_client), args.requests)
+        print(f"{name:<12} {sdk * 1e6:>10.1f} {fast * 1e6:>10.1f} {1 - fast / sdk:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,705 @@
+"""
+Caching utilities for the OpenAI client.
+
+Provides a thread-safe in-memory LRU tier, a persistent SQLite tier that can be
+shared between worker processes, and the embedding, chat response and image
+caches built on top of them.
+"""
+
+import os
+import json
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Any, Tuple, Union
+
+from logger import get_logger
+from image_processing import ImagePreprocessConfig, ImageSource, PreparedImage, prepare_images, read_image_source
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for a cache."""
+
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    writes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache bounded by entry count and byte size."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: Optional[float] = None,
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries to keep.
+            max_bytes: Maximum total size of the stored values in bytes.
+            ttl: Seconds an entry stays valid, or None for no expiry.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, size: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """Store a value.
+
+        Args:
+            key: Cache key.
+            value: Value to store.
+            size: Size of the value in bytes, used for the byte limit. Defaults
+                to len(value).
+            ttl: Seconds the entry stays valid. Defaults to the cache TTL.
+        """
+        if size is None:
+            size = len(value)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.size_bytes += size
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Remove key if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.size_bytes -= size
+
+
+class SQLiteCache:
+    """Persistent byte-value cache stored in a SQLite database.
+
+    The database runs in WAL mode with a busy timeout so several processes can
+    read and write the same file, and is memory-mapped for fast reads. Entries
+    are evicted least-recently-used first once the stored values exceed
+    max_bytes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        ttl: Optional[float] = None,
+        mmap_size: int = 256 * 1024 * 1024,
+    ):
+        """Initialize the cache, creating the database if needed.
+
+        Args:
+            path: Path to the SQLite database file.
+            max_bytes: Maximum total size of the stored values in bytes.
+            ttl: Seconds an entry stays valid, or None for no expiry.
+            mmap_size: Bytes of the database file to memory-map.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.mmap_size = mmap_size
+        self.evictions = 0
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (name, value) "
+                "SELECT 'size_bytes', COALESCE(SUM(size), 0) FROM entries"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the enclosed statements in one write transaction."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @property
+    def size_bytes(self) -> int:
+        """Total size of the stored values in bytes."""
+        row = self._connection().execute("SELECT value FROM meta WHERE name = 'size_bytes'").fetchone()
+        return row[0] if row else 0
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value for key, or None if missing or expired."""
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            self.delete(key)
+            return None
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting least recently used entries if over the size limit.
+
+        Args:
+            key: Cache key.
+            value: Bytes to store.
+            ttl: Seconds the entry stays valid. Defaults to the cache TTL.
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+
+        with self._transaction() as conn:
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            old_size = row[0] if row else 0
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, now),
+            )
+            conn.execute(
+                "UPDATE meta SET value = value + ? WHERE name = 'size_bytes'",
+                (size - old_size,),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Delete least recently used entries until under max_bytes."""
+        total = conn.execute("SELECT value FROM meta WHERE name = 'size_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        conn.execute("UPDATE meta SET value = value - ? WHERE name = 'size_bytes'", (freed,))
+        self.evictions += len(victims)
+
+    def delete(self, key: str) -> None:
+        """Remove key if present."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.execute("UPDATE meta SET value = value - ? WHERE name = 'size_bytes'", (row[0],))
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE meta SET value = 0 WHERE name = 'size_bytes'")
+
+    def close(self) -> None:
+        """Close this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keys (Unicode NFC, surrounding whitespace stripped)."""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with a memory tier over an optional disk tier.
+
+    Keys are derived from the model, the requested dimensions and a hash of the
+    normalized text. Vectors are stored as packed float32, the precision the
+    API produces, so a 3072-dimension embedding takes 12 KB in either tier.
+    """
+
+    def __init__(
+        self,
+        memory: Optional[LRUCache] = None,
+        disk: Optional[SQLiteCache] = None,
+    ):
+        """Initialize the cache.
+
+        Args:
+            memory: In-memory tier. Defaults to an LRUCache with default limits.
+            disk: Optional persistent tier consulted on memory misses.
+        """
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def with_disk(
+        cls,
+        path: str,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+        ttl: Optional[float] = None,
+    ) -> "EmbeddingCache":
+        """Create a cache with both tiers.
+
+        Args:
+            path: Path to the SQLite database file.
+            max_memory_bytes: Byte limit of the memory tier.
+            max_disk_bytes: Byte limit of the disk tier.
+            ttl: Seconds an entry stays valid in both tiers.
+
+        Returns:
+            Configured EmbeddingCache.
+        """
+        return cls(
+            memory=LRUCache(max_bytes=max_memory_bytes, ttl=ttl),
+            disk=SQLiteCache(path, max_bytes=max_disk_bytes, ttl=ttl),
+        )
+
+    @staticmethod
+    def make_key(model: str, text: str, dimensions: Optional[int] = None) -> str:
+        """Build the cache key for an embedding.
+
+        Args:
+            model: Embedding model name.
+            text: Input text.
+            dimensions: Requested output dimensions, if any.
+
+        Returns:
+            Hex digest identifying the embedding.
+        """
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{dimensions or ''}:{digest}"
+
+    def get(
+        self,
+        model: str,
+        text: str,
+        dimensions: Optional[int] = None,
+        as_numpy: bool = False,
+    ) -> Optional[Any]:
+        """Look up an embedding.
+
+        Args:
+            model: Embedding model name.
+            text: Input text.
+            dimensions: Requested output dimensions, if any.
+            as_numpy: Return a read-only float32 numpy array instead of a list.
+
+        Returns:
+            The cached embedding, or None on a miss.
+        """
+        key = self.make_key(model, text, dimensions)
+        packed = self.memory.get(key)
+        tier = "memory"
+        if packed is None and self.disk is not None:
+            packed = self.disk.get(key)
+            tier = "disk"
+            if packed is not None:
+                self.memory.set(key, packed, len(packed))
+
+        with self._stats_lock:
+            if packed is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            if tier == "memory":
+                self.stats.memory_hits += 1
+            else:
+                self.stats.disk_hits += 1
+
+        if as_numpy:
+            import numpy as np
+            return np.frombuffer(packed, dtype=np.float32)
+        return array.array("f", packed).tolist()
+
+    def set(self, model: str, text: str, embedding: Any, dimensions: Optional[int] = None) -> None:
+        """Store an embedding in every tier.
+
+        Args:
+            model: Embedding model name.
+            text: Input text.
+            embedding: Embedding values (list of floats or 1-D float32 array).
+            dimensions: Requested output dimensions, if any.
+        """
+        key = self.make_key(model, text, dimensions)
+        if hasattr(embedding, "astype"):
+            packed = embedding.astype("float32").tobytes()
+        else:
+            packed = array.array("f", embedding).tobytes()
+        self.memory.set(key, packed, len(packed))
+        if self.disk is not None:
+            self.disk.set(key, packed)
+        with self._stats_lock:
+            self.stats.writes += 1
+
+    @property
+    def evictions(self) -> int:
+        """Total evictions across tiers."""
+        return self.memory.evictions + (self.disk.evictions if self.disk is not None else 0)
+
+    def clear(self) -> None:
+        """Remove all entries from every tier."""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+@dataclass
+class CachedResponse:
+    """A response read from a ResponseCache."""
+
+    response: Dict[str, Any]
+    stale: bool
+
+
+class ResponseCache:
+    """Cache of chat completion responses keyed by the full request.
+
+    Keys are a SHA-256 of the canonical JSON of the messages and every sampling
+    parameter, so only identical requests share an entry. By default only
+    deterministic requests (temperature 0 or an explicit seed) are cached.
+
+    Entries are fresh for ttl seconds. For a further stale_ttl seconds they are
+    still served, flagged as stale, so the caller can refresh them in the
+    background (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        backend: Optional[Union[LRUCache, SQLiteCache]] = None,
+        ttl: Optional[float] = 3600,
+        stale_ttl: float = 0,
+        deterministic_only: bool = True,
+    ):
+        """Initialize the cache.
+
+        Args:
+            backend: Storage tier. Defaults to an in-memory LRUCache; pass a
+                SQLiteCache for a persistent cache.
+            ttl: Seconds an entry is fresh, or None for no expiry.
+            stale_ttl: Seconds after ttl during which a stale entry is served.
+            deterministic_only: Only cache requests with temperature 0 or a seed.
+        """
+        self.backend = backend if backend is not None else LRUCache()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.deterministic_only = deterministic_only
+        self.stats = CacheStats()
+        self.stale_hits = 0
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    def should_cache(self, request: Dict[str, Any]) -> bool:
+        """Return whether a request is eligible for caching."""
+        if not self.deterministic_only:
+            return True
+        return request.get("temperature") == 0 or request.get("seed") is not None
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        """Build the cache key for a request.
+
+        Args:
+            request: Keyword arguments of the chat completion request.
+
+        Returns:
+            Hex digest identifying the request.
+        """
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Look up a response.
+
+        Args:
+            key: Key from make_key.
+
+        Returns:
+            The cached response, or None on a miss.
+        """
+        data = self.backend.get(key)
+        with self._lock:
+            if data is None:
+                self.stats.misses += 1
+                return None
+            entry = json.loads(data)
+            stale = self.ttl is not None and time.time() - entry["stored_at"] > self.ttl
+            self.stats.hits += 1
+            if stale:
+                self.stale_hits += 1
+        return CachedResponse(response=entry["response"], stale=stale)
+
+    def set(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a response.
+
+        Args:
+            key: Key from make_key.
+            response: Response dictionary to store.
+        """
+        data = json.dumps({"stored_at": time.time(), "response": response}).encode("utf-8")
+        ttl = self.ttl + self.stale_ttl if self.ttl is not None else None
+        self.backend.set(key, data, ttl=ttl)
+        with self._lock:
+            self.stats.writes += 1
+
+    def begin_refresh(self, key: str) -> bool:
+        """Claim the background refresh of a stale entry.
+
+        Returns:
+            True if the caller should refresh the entry, False if a refresh is
+            already in progress.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: str) -> None:
+        """Release a refresh claimed with begin_refresh."""
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self.backend.clear()
+
+
+class ImageCache:
+    """Cache of prepared (encoded and optionally preprocessed) images.
+
+    Entries are keyed by a SHA-256 of the image bytes plus the preprocessing
+    settings, so the same picture reached through different paths shares an
+    entry. A path index remembers each file's modification time and size, so a
+    repeat load of an unchanged file skips both the disk read and the encoding;
+    a changed file is re-read and re-hashed. Memory is accounted for the raw
+    bytes plus their base64 and data URL forms.
+    """
+
+    def __init__(self, memory: Optional[LRUCache] = None, max_paths: int = 10_000):
+        """Initialize the cache.
+
+        Args:
+            memory: Storage for prepared images. Defaults to an LRUCache
+                limited to 256 entries and 256 MB.
+            max_paths: Maximum number of file paths remembered in the index.
+        """
+        self.memory = memory if memory is not None else LRUCache(max_entries=256, max_bytes=256 * 1024 * 1024)
+        self.max_paths = max_paths
+        self.stats = CacheStats()
+        self._paths: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(digest: str, preprocess: Optional[ImagePreprocessConfig] = None) -> str:
+        """Build the cache key for an image.
+
+        Args:
+            digest: SHA-256 hex digest of the image bytes.
+            preprocess: Preprocessing settings applied to the image, if any.
+
+        Returns:
+            Key identifying the prepared image.
+        """
+        return f"{digest}:{repr(preprocess)}"
+
+    def load(self, image_path: str, preprocess: Optional[ImagePreprocessConfig] = None) -> PreparedImage:
+        """Return the prepared image for a file, reading it only if needed.
+
+        Args:
+            image_path: Path to the image file.
+            preprocess: Optional preprocessing settings.
+
+        Returns:
+            PreparedImage.
+        """
+        return self.load_many([image_path], preprocess)[0]
+
+    def prepare(self, data: bytes, preprocess: Optional[ImagePreprocessConfig] = None) -> PreparedImage:
+        """Return the prepared image for raw bytes, preparing it on a miss.
+
+        Args:
+            data: Raw image bytes.
+            preprocess: Optional preprocessing settings.
+
+        Returns:
+            PreparedImage.
+        """
+        return self.load_many([data], preprocess)[0]
+
+    def load_many(
+        self,
+        sources: List[ImageSource],
+        preprocess: Optional[ImagePreprocessConfig] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[PreparedImage]:
+        """Return prepared images for several sources, preparing misses in parallel.
+
+        Args:
+            sources: File paths, bytes or binary file-like objects.
+            preprocess: Optional preprocessing settings.
+            max_workers: Maximum worker processes used for the misses.
+
+        Returns:
+            PreparedImage per source, in input order.
+        """
+        results: List[Optional[PreparedImage]] = [None] * len(sources)
+        misses: Dict[str, Tuple[bytes, List[int]]] = {}
+        for index, source in enumerate(sources):
+            if isinstance(source, (str, os.PathLike)):
+                path = os.fspath(source)
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                with self._lock:
+                    known = self._paths.get(path)
+                if known is not None and known[0] == signature:
+                    image = self._lookup(self.make_key(known[1], preprocess))
+                    if image is not None:
+                        results[index] = image
+                        continue
+                data = read_image_source(path)
+                digest = hashlib.sha256(data).hexdigest()
+                self._remember_path(path, signature, digest)
+            else:
+                data = read_image_source(source)
+                digest = hashlib.sha256(data).hexdigest()
+
+            key = self.make_key(digest, preprocess)
+            pending = misses.get(key)
+            image = self._lookup(key) if pending is None else None
+            if image is not None:
+                results[index] = image
+            elif pending is not None:
+                pending[1].append(index)
+            else:
+                misses[key] = (data, [index])
+
+        if not misses:
+            return results
+        prepared = prepare_images([data for data, _ in misses.values()], preprocess, max_workers)
+        for (key, (data, indexes)), image in zip(misses.items(), prepared):
+            # Encode now so every hit reuses the same base64 text and data URL
+            self.memory.set(key, image, len(image.data) + len(image.base64) + len(image.data_url))
+            with self._lock:
+                self.stats.misses += 1
+                self.stats.writes += 1
+            for index in indexes:
+                results[index] = image
+        return results
+
+    def _lookup(self, key: str) -> Optional[PreparedImage]:
+        """Return a stored image, counting the hit."""
+        image = self.memory.get(key)
+        if image is not None:
+            with self._lock:
+                self.stats.hits += 1
+                self.stats.memory_hits += 1
+        return image
+
+    def _remember_path(self, path: str, signature: Tuple[int, int], digest: str) -> None:
+        """Record the content hash of a file at its current mtime and size."""
+        with self._lock:
+            self._paths[path] = (signature, digest)
+            self._paths.move_to_end(path)
+            while len(self._paths) > self.max_paths:
+                self._paths.popitem(last=False)
+
+    @property
+    def size_bytes(self) -> int:
+        """Bytes currently accounted to cached images."""
+        return self.memory.size_bytes
+
+    @property
+    def evictions(self) -> int:
+        """Number of images evicted to respect the limits."""
+        return self.memory.evictions
+
+    def clear(self) -> None:
+        """Remove all entries and forget known paths."""
+        self.memory.clear()
+        with self._lock:
+            self._paths.clear()
@@ -0,0 +1,283 @@
+"""
+Circuit breakers for OpenAI API calls.
+
+A breaker per (base_url, model) watches the outcome of recent calls. When too
+many of them fail or are slow, it opens and calls fail immediately with
+CircuitOpenError instead of waiting out timeouts against a degraded upstream.
+After open_duration it lets a few probe calls through (half-open) and closes
+again once they succeed.
+
+States are published as gauges ("circuit.<name>.state": 0 closed,
+1 half-open, 2 open) in the client metrics.
+"""
+
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, Type, TypeVar
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from logger import get_logger
+from metrics import ClientMetrics
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while a circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit {name} is open; retry in {retry_after:.1f}s")
+
+
+@dataclass(frozen=True)
+class CircuitBreakerConfig:
+    """When a circuit opens and how it recovers.
+
+    Attributes:
+        window: Number of recent calls the failure rate is computed over.
+        min_calls: Calls needed in the window before the circuit may open.
+        failure_rate_threshold: Fraction of failed or slow calls that opens
+            the circuit.
+        slow_call_threshold: Seconds after which a successful call counts as
+            slow (and so as a failure), or None to ignore latency.
+        open_duration: Seconds the circuit stays open before probing.
+        half_open_probes: Probe calls allowed while half-open; the circuit
+            closes once all of them succeed.
+        failure_types: Exception classes counted as upstream failures, besides
+            5xx status errors. Other errors (e.g. bad requests) do not count.
+    """
+
+    window: int = 20
+    min_calls: int = 10
+    failure_rate_threshold: float = 0.5
+    slow_call_threshold: Optional[float] = None
+    open_duration: float = 30.0
+    half_open_probes: int = 1
+    failure_types: Tuple[Type[BaseException], ...] = (APITimeoutError, APIConnectionError)
+
+    def is_failure(self, error: BaseException) -> bool:
+        """Return whether an error indicates a degraded upstream."""
+        if isinstance(error, self.failure_types):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker for one upstream."""
+
+    def __init__(
+        self,
+        name: str,
+        config: Optional[CircuitBreakerConfig] = None,
+        metrics: Optional[ClientMetrics] = None,
+    ):
+        """Initialize a closed breaker.
+
+        Args:
+            name: Name used in errors, logs and metric names.
+            config: Thresholds. Defaults to CircuitBreakerConfig().
+            metrics: Metrics to publish the state in.
+        """
+        self.name = name
+        self.config = config if config is not None else CircuitBreakerConfig()
+        self.metrics = metrics
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=self.config.window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self._publish()
+
+    @property
+    def failure_rate(self) -> float:
+        """Fraction of failed or slow calls in the window."""
+        with self._lock:
+            return self._outcomes.count(True) / len(self._outcomes) if self._outcomes else 0.0
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls would currently be rejected without probing."""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self._opened_at + self.config.open_duration
+
+    def before_call(self) -> None:
+        """Admit a call or reject it.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with all
+                probes in flight.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.config.open_duration - time.monotonic()
+                if remaining > 0:
+                    self._reject(remaining)
+                self._set_state(HALF_OPEN)
+                self._probes = 0
+                self._probe_successes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.config.half_open_probes:
+                    self._reject(self.config.open_duration)
+                self._probes += 1
+
+    def record(self, failed: bool) -> None:
+        """Record the outcome of an admitted call.
+
+        Args:
+            failed: Whether the call failed or was slow.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.config.half_open_probes:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                return
+
+            self._outcomes.append(failed)
+            if (
+                self.state == CLOSED
+                and len(self._outcomes) >= self.config.min_calls
+                and self._outcomes.count(True) / len(self._outcomes) >= self.config.failure_rate_threshold
+            ):
+                self._open()
+
+    def release(self) -> None:
+        """Give back the probe slot of an admitted call that ended without an outcome.
+
+        A cancelled call says nothing about the upstream, so it is not
+        recorded; while half-open its probe slot is freed for another call.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def call(self, call: Callable[[], T]) -> T:
+        """Run call through the breaker.
+
+        Raises:
+            CircuitOpenError: If the circuit rejects the call.
+        """
+        self.before_call()
+        started_at = time.monotonic()
+        try:
+            result = call()
+        except Exception as e:
+            self.record(self.config.is_failure(e))
+            raise
+        except BaseException:
+            # Cancelled (e.g. a losing hedge) or interrupted
+            self.release()
+            raise
+        self.record(self._is_slow(started_at))
+        return result
+
+    async def acall(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Await call through the breaker.
+
+        Raises:
+            CircuitOpenError: If the circuit rejects the call.
+        """
+        self.before_call()
+        started_at = time.monotonic()
+        try:
+            result = await call()
+        except Exception as e:
+            self.record(self.config.is_failure(e))
+            raise
+        except BaseException:
+            # Cancelled (e.g. a losing hedge) or interrupted
+            self.release()
+            raise
+        self.record(self._is_slow(started_at))
+        return result
+
+    def _is_slow(self, started_at: float) -> bool:
+        threshold = self.config.slow_call_threshold
+        return threshold is not None and time.monotonic() - started_at > threshold
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+        if self.metrics is not None:
+            self.metrics.increment(f"circuit.{self.name}.opened")
+
+    def _reject(self, retry_after: float) -> None:
+        if self.metrics is not None:
+            self.metrics.increment(f"circuit.{self.name}.rejected")
+        raise CircuitOpenError(self.name, retry_after)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            log = logger.warning if state == OPEN else logger.info
+            log(f"Circuit {self.name} changed from {self.state} to {state}")
+        self.state = state
+        self._publish()
+
+    def _publish(self) -> None:
+        if self.metrics is not None:
+            self.metrics.set_gauge(f"circuit.{self.name}.state", STATE_VALUES[self.state])
+
+
+class CircuitBreakerRegistry:
+    """Circuit breakers keyed by (base_url, model), created on first use.
+
+    Example:
+        breakers = CircuitBreakerRegistry(CircuitBreakerConfig(slow_call_threshold=30))
+        client = OpenAIClient(circuit_breakers=breakers, fallback_models={"gpt-4o": "gpt-4o-mini"})
+    """
+
+    def __init__(self, config: Optional[CircuitBreakerConfig] = None, metrics: Optional[ClientMetrics] = None):
+        """Initialize an empty registry.
+
+        Args:
+            config: Thresholds for every breaker. Defaults to
+                CircuitBreakerConfig().
+            metrics: Metrics breakers publish their state in. Clients set this
+                to their own metrics if it is None.
+        """
+        self.config = config if config is not None else CircuitBreakerConfig()
+        self.metrics = metrics
+        self._breakers: Dict[Tuple[Optional[str], str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str, base_url: Optional[str] = None) -> CircuitBreaker:
+        """Return the breaker for a model at a base URL.
+
+        Args:
+            model: Model name.
+            base_url: API base URL, or None for the SDK default.
+
+        Returns:
+            CircuitBreaker named after the model (prefixed with the base URL
+            when one is given).
+        """
+        key = (base_url, model)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                name = model if base_url is None else f"{base_url}|{model}"
+                breaker = self._breakers[key] = CircuitBreaker(name, self.config, self.metrics)
+            return breaker
+
+    def states(self) -> Dict[str, str]:
+        """Return the state of every breaker by name."""
+        with self._lock:
+            return {breaker.name: breaker.state for breaker in self._breakers.values()}
@@ -0,0 +1,232 @@
+"""
+Adaptive concurrency limits for fan-out calls (AIMD).
+
+Instead of a fixed worker count, an adaptive limiter lets the number of
+requests in flight find the level the API sustains. While attempts succeed
+at normal latency the limit grows by `increase` per window of `limit`
+samples (additive increase). On a 429, 5xx, timeout or latency inflation it is
+multiplied by `backoff` (multiplicative decrease), at most once per round of
+requests, so a burst of errors from the same overload only counts once.
+
+Latency inflation compares a moving average of recent latencies with a
+baseline: the lowest latency seen, slowly drifting upwards so it adapts when
+requests get larger.
+
+The limit is published as the "concurrency.limit" gauge and decreases are
+counted in "concurrency.decreases".
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Optional, TypeVar
+
+from logger import get_logger
+from metrics import ClientMetrics
+from routing import is_backend_failure
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class AIMDPolicy:
+    """How an adaptive concurrency limit grows and backs off.
+
+    Attributes:
+        initial_limit: Requests allowed in flight at the start.
+        min_limit: Lower bound of the limit.
+        max_limit: Upper bound of the limit, and the size of thread pools
+            running fan-out calls.
+        increase: Amount the limit grows per window of limit healthy samples.
+        backoff: Factor the limit is multiplied by on overload.
+        latency_tolerance: Average latency, as a multiple of the baseline,
+            above which the API counts as overloaded.
+        latency_alpha: Weight of the newest sample in the average latency.
+        baseline_drift: Fraction the baseline may rise per sample.
+        latency_floor: Seconds below which the baseline is not taken, so
+            jitter on very fast calls does not count as inflation.
+    """
+
+    initial_limit: int = 4
+    min_limit: int = 1
+    max_limit: int = 64
+    increase: float = 1.0
+    backoff: float = 0.5
+    latency_tolerance: float = 2.0
+    latency_alpha: float = 0.2
+    baseline_drift: float = 0.01
+    latency_floor: float = 0.05
+
+
+class _AIMDLimit:
+    """Limit arithmetic shared by the sync and async limiters."""
+
+    def __init__(self, policy: Optional[AIMDPolicy] = None, metrics: Optional[ClientMetrics] = None):
+        """Initialize the limit at policy.initial_limit.
+
+        Args:
+            policy: AIMD settings. Defaults to AIMDPolicy().
+            metrics: Metrics the limit is published in.
+        """
+        self.policy = policy if policy is not None else AIMDPolicy()
+        self.metrics = metrics
+        self._limit = float(min(max(self.policy.initial_limit, self.policy.min_limit), self.policy.max_limit))
+        self._in_flight = 0
+        self._baseline: Optional[float] = None
+        self._latency: Optional[float] = None
+        self._last_decrease_at = float("-inf")
+        self._lock = threading.Lock()
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        """Requests currently allowed in flight."""
+        return max(self.policy.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        """Slots currently held."""
+        return self._in_flight
+
+    def record(self, started_at: float, latency: float, error: Optional[BaseException] = None) -> None:
+        """Adjust the limit after one attempt.
+
+        Args:
+            started_at: time.monotonic() when the attempt started.
+            latency: Seconds the attempt took.
+            error: The attempt's exception, if it failed. Errors other than
+                overload (e.g. bad requests) leave the limit unchanged.
+        """
+        overloaded = error is not None and is_backend_failure(error)
+        if error is not None and not overloaded:
+            return
+
+        decreased = False
+        with self._lock:
+            if error is None:
+                self._observe_latency(latency)
+                baseline = max(self._baseline, self.policy.latency_floor)
+                overloaded = self._latency > self.policy.latency_tolerance * baseline
+            if overloaded:
+                # Attempts sent before the last decrease report the same overload
+                if started_at >= self._last_decrease_at:
+                    self._limit = max(float(self.policy.min_limit), self._limit * self.policy.backoff)
+                    self._last_decrease_at = time.monotonic()
+                    decreased = True
+            elif self._in_flight * 2 >= self._limit:
+                # Only grow while the current limit is actually being used
+                self._limit = min(float(self.policy.max_limit), self._limit + self.policy.increase / self._limit)
+            self._notify()
+
+        if decreased:
+            logger.debug(f"Concurrency limit lowered to {self.limit} after {error or 'latency inflation'}")
+            if self.metrics is not None:
+                self.metrics.increment("concurrency.decreases")
+        self._publish()
+
+    def _observe_latency(self, latency: float) -> None:
+        if self._baseline is None:
+            self._baseline = self._latency = latency
+            return
+        self._baseline = min(latency, self._baseline * (1 + self.policy.baseline_drift))
+        alpha = self.policy.latency_alpha
+        self._latency = alpha * latency + (1 - alpha) * self._latency
+
+    def _notify(self) -> None:
+        """Wake callers waiting for a slot; called with the lock held."""
+
+    def _publish(self) -> None:
+        if self.metrics is not None:
+            self.metrics.set_gauge("concurrency.limit", self.limit)
+
+
+class AdaptiveLimiter(_AIMDLimit):
+    """Thread-safe adaptive concurrency limiter.
+
+    Use it as a context manager to hold a slot, and wrap each attempt in
+    measure so its outcome adjusts the limit.
+
+    Example:
+        limiter = AdaptiveLimiter(AIMDPolicy(max_limit=32))
+        with limiter:
+            response = limiter.measure(lambda: client.chat.completions.create(**request))
+    """
+
+    def __init__(self, policy: Optional[AIMDPolicy] = None, metrics: Optional[ClientMetrics] = None):
+        super().__init__(policy, metrics)
+        self._condition = threading.Condition(self._lock)
+
+    def __enter__(self) -> "AdaptiveLimiter":
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def measure(self, call: Callable[[], T]) -> T:
+        """Run one attempt and adjust the limit by its latency and outcome."""
+        started_at = time.monotonic()
+        try:
+            result = call()
+        except Exception as e:
+            self.record(started_at, time.monotonic() - started_at, e)
+            raise
+        self.record(started_at, time.monotonic() - started_at)
+        return result
+
+    def _notify(self) -> None:
+        self._condition.notify_all()
+
+
+class AsyncAdaptiveLimiter(_AIMDLimit):
+    """Adaptive concurrency limiter for coroutines running in one event loop.
+
+    Use it as an async context manager to hold a slot, and wrap each attempt
+    in measure so its outcome adjusts the limit.
+    """
+
+    def __init__(self, policy: Optional[AIMDPolicy] = None, metrics: Optional[ClientMetrics] = None):
+        super().__init__(policy, metrics)
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def __aenter__(self) -> "AsyncAdaptiveLimiter":
+        while True:
+            with self._lock:
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return self
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+            await waiter
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._notify()
+
+    async def measure(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Await one attempt and adjust the limit by its latency and outcome."""
+        started_at = time.monotonic()
+        try:
+            result = await call()
+        except Exception as e:
+            self.record(started_at, time.monotonic() - started_at, e)
+            raise
+        self.record(started_at, time.monotonic() - started_at)
+        return result
+
+    def _notify(self) -> None:
+        # Waiters re-check the limit, so waking all of them is safe
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
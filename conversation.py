@@ -0,0 +1,277 @@
+"""
+Multi-turn conversations that stay under a prompt token budget.
+
+A Conversation keeps its message history together with a running token count
+(each message is counted once, when it is added) and, before every request,
+compacts the history with a pluggable strategy: a sliding window, dropping the
+oldest turns while keeping system messages, or summarizing older turns with a
+cheaper model.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+from logger import get_logger
+from results import ChatResult
+from tokens import REPLY_PRIMING_TOKENS, TokenCounter, context_window
+
+logger = get_logger(__name__)
+
+# Tokens kept free for the reply when the budget is derived from the context window
+DEFAULT_COMPLETION_RESERVE = 1000
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation so it can replace the original messages. "
+    "Keep names, numbers, decisions and open questions. Be concise."
+)
+
+MessageCounter = Callable[[Dict[str, Any]], int]
+
+
+def _is_summary(message: Dict[str, Any]) -> bool:
+    """Return whether a message is a summary produced by SummarizeOlder."""
+    content = message.get("content")
+    return message["role"] == "system" and isinstance(content, str) and content.startswith(SUMMARY_PREFIX)
+
+
+class CompactionStrategy:
+    """Base class for ways of shortening a conversation history.
+
+    Conversation only calls compact once the history exceeds its budget,
+    unless always_apply is set.
+    """
+
+    always_apply = False
+
+    def compact(self, messages: List[Dict[str, Any]], budget: int, count: MessageCounter) -> List[Dict[str, Any]]:
+        """Return a history whose messages fit in budget tokens where possible.
+
+        Args:
+            messages: Current history, oldest first.
+            budget: Token budget for the messages (chat overhead included).
+            count: Returns the token count of one message.
+
+        Returns:
+            The compacted history. The last message is always kept.
+        """
+        raise NotImplementedError
+
+
+class DropOldest(CompactionStrategy):
+    """Drop the oldest non-system messages until the history fits."""
+
+    def compact(self, messages: List[Dict[str, Any]], budget: int, count: MessageCounter) -> List[Dict[str, Any]]:
+        total = sum(count(message) for message in messages)
+        keep = [True] * len(messages)
+        for index, message in enumerate(messages[:-1]):
+            if total <= budget:
+                break
+            if message["role"] == "system":
+                continue
+            keep[index] = False
+            total -= count(message)
+        return [message for message, kept in zip(messages, keep) if kept]
+
+
+class SlidingWindow(CompactionStrategy):
+    """Keep system messages and only the most recent turns.
+
+    The window is applied on every request, not just when over budget, which
+    keeps the prompt size (and latency) flat however long the session runs.
+    """
+
+    always_apply = True
+
+    def __init__(self, max_messages: int = 20):
+        """Initialize the strategy.
+
+        Args:
+            max_messages: Number of recent non-system messages to keep.
+        """
+        self.max_messages = max_messages
+
+    def compact(self, messages: List[Dict[str, Any]], budget: int, count: MessageCounter) -> List[Dict[str, Any]]:
+        recent = [index for index, message in enumerate(messages) if message["role"] != "system"]
+        dropped = set(recent[:-self.max_messages]) if self.max_messages > 0 else set(recent[:-1])
+        windowed = [message for index, message in enumerate(messages) if index not in dropped]
+        return DropOldest().compact(windowed, budget, count)
+
+
+class SummarizeOlder(CompactionStrategy):
+    """Replace older turns with a summary written by a cheaper model.
+
+    When the history is over budget, every message except the system prompt
+    and the most recent turns is summarized into a single system message.
+    Earlier summaries are folded into the new one. If the result still does
+    not fit, the oldest turns are dropped.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str = "gpt-4o-mini",
+        keep_recent: int = 4,
+        max_summary_tokens: int = 500,
+    ):
+        """Initialize the strategy.
+
+        Args:
+            client: OpenAIClient used to write the summary.
+            model: Model used for summarizing, typically cheaper than the
+                conversation's model.
+            keep_recent: Number of recent non-system messages kept verbatim.
+            max_summary_tokens: Maximum length of the summary.
+        """
+        self.client = client
+        self.model = model
+        self.keep_recent = keep_recent
+        self.max_summary_tokens = max_summary_tokens
+
+    def compact(self, messages: List[Dict[str, Any]], budget: int, count: MessageCounter) -> List[Dict[str, Any]]:
+        if sum(count(message) for message in messages) <= budget:
+            return messages
+
+        turns = [index for index, message in enumerate(messages) if message["role"] != "system"]
+        recent = set(turns[-max(1, self.keep_recent):])
+        older = [
+            message for index, message in enumerate(messages)
+            if index not in recent and (message["role"] != "system" or _is_summary(message))
+        ]
+        if not older:
+            return DropOldest().compact(messages, budget, count)
+
+        summary = self._summarize(older)
+        logger.debug(f"Summarized {len(older)} older messages with {self.model}")
+        kept = [
+            message for index, message in enumerate(messages)
+            if index in recent or (message["role"] == "system" and not _is_summary(message))
+        ]
+        system = [message for message in kept if message["role"] == "system"]
+        rest = [message for message in kept if message["role"] != "system"]
+        compacted = system + [{"role": "system", "content": SUMMARY_PREFIX + summary}] + rest
+        return DropOldest().compact(compacted, budget, count)
+
+    def _summarize(self, messages: List[Dict[str, Any]]) -> str:
+        """Ask the summary model to condense messages."""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        response = self.client.chat_completion(
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            model=self.model,
+            temperature=0,
+            max_tokens=self.max_summary_tokens,
+        )
+        return response["choices"][0]["message"]["content"]
+
+
+class Conversation:
+    """Message history sent to chat_completion, kept under a token budget.
+
+    Example:
+        conversation = Conversation(client, system_prompt="You are helpful.")
+        reply = conversation.send("Hello!")
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str = "gpt-4o",
+        system_prompt: Optional[str] = None,
+        max_prompt_tokens: Optional[int] = None,
+        strategy: Optional[CompactionStrategy] = None,
+        counter: Optional[TokenCounter] = None,
+    ):
+        """Initialize the conversation.
+
+        Args:
+            client: OpenAIClient used to send messages.
+            model: Model the conversation is held with.
+            system_prompt: Optional system message placed first.
+            max_prompt_tokens: Prompt token budget. Defaults to the model's
+                context window minus DEFAULT_COMPLETION_RESERVE; None for an
+                unknown model disables compaction.
+            strategy: Compaction strategy. Defaults to DropOldest().
+            counter: Token counter. Defaults to the client's counter.
+        """
+        self.client = client
+        self.model = model
+        if max_prompt_tokens is None:
+            window = context_window(model)
+            max_prompt_tokens = window - DEFAULT_COMPLETION_RESERVE if window is not None else None
+        self.max_prompt_tokens = max_prompt_tokens
+        self.strategy = strategy if strategy is not None else DropOldest()
+        self.counter = counter or getattr(client, "token_counter", None) or TokenCounter()
+        self.messages: List[Dict[str, Any]] = []
+        self._total = 0
+        if system_prompt:
+            self.add("system", system_prompt)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Prompt tokens of the current history, including reply priming."""
+        return self._total + REPLY_PRIMING_TOKENS
+
+    def _count(self, message: Dict[str, Any]) -> int:
+        return self.counter.count_message(message, self.model)
+
+    def add(self, role: str, content: Any) -> None:
+        """Append a message and update the running token count.
+
+        Args:
+            role: Message role ("system", "user" or "assistant").
+            content: Message content.
+        """
+        message = {"role": role, "content": content}
+        tokens = self._count(message)
+        self.messages.append(message)
+        self._total += tokens
+
+    def compact(self) -> None:
+        """Apply the compaction strategy if the history is over budget."""
+        if self.max_prompt_tokens is None or not self.messages:
+            return
+        budget = self.max_prompt_tokens - REPLY_PRIMING_TOKENS
+        if self._total <= budget and not self.strategy.always_apply:
+            return
+
+        before = len(self.messages)
+        messages = self.strategy.compact(list(self.messages), budget, self._count)
+        self.messages = messages
+        # Per-message counts are cached by the counter, so this is cheap
+        self._total = sum(self._count(message) for message in messages)
+        if len(messages) != before:
+            logger.debug(
+                f"Compacted conversation from {before} to {len(messages)} messages, "
+                f"{self.prompt_tokens} prompt tokens"
+            )
+
+    def send(self, content: Any, **kwargs: Any) -> ChatResult:
+        """Add a user message, compact the history and request a reply.
+
+        The assistant's reply is appended to the history. If the request
+        fails, the history is left as it was before the call, so send can be
+        retried with the same content.
+
+        Args:
+            content: User message content.
+            **kwargs: Further chat_completion arguments (temperature, ...).
+
+        Returns:
+            The client's chat_completion result.
+        """
+        messages, total = list(self.messages), self._total
+        try:
+            self.add("user", content)
+            self.compact()
+            response = self.client.chat_completion(messages=list(self.messages), model=self.model, **kwargs)
+        except BaseException:
+            self.messages, self._total = messages, total
+            raise
+        self.add("assistant", response["choices"][0]["message"]["content"])
+        return response
@@ -0,0 +1,208 @@
+"""
+Micro-batching of single-text embedding calls.
+
+Callers that embed one text at a time from many concurrent handlers each pay
+for a separate request. An embedding batcher holds such calls for at most
+max_delay seconds (or until max_batch_size texts are waiting), sends them as
+one create_embeddings request and hands each caller its own vector.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_DELAY = 0.005
+
+
+class _Batch:
+    """Texts waiting to be embedded together, with one future per caller."""
+
+    __slots__ = ("texts", "futures", "full", "timer")
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.futures: List[Any] = []
+        self.full = threading.Event()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+def _deduplicate(texts: List[str]) -> Tuple[List[str], List[int]]:
+    """Return the distinct texts and, per input, the index of its distinct text."""
+    positions: Dict[str, int] = {}
+    indices = [positions.setdefault(text, len(positions)) for text in texts]
+    return list(positions), indices
+
+
+def _record(client: Any, size: int, distinct: int) -> None:
+    """Log a sent batch and record its size in the client's metrics."""
+    logger.debug(f"Sending embedding batch of {size} calls ({distinct} distinct texts)")
+    client.metrics.increment("embedding_batch.batches")
+    client.metrics.increment("embedding_batch.inputs", size)
+    client.metrics.observe("embedding_batch.size", distinct)
+
+
+class EmbeddingBatcher:
+    """Collects concurrent create_embedding calls into batched requests.
+
+    The first caller of a batch waits until the batch is full or max_delay has
+    passed, then sends it; later callers only wait for their vector. Batches
+    are kept per (model, as_numpy), and repeated texts are sent once.
+
+    Example:
+        batcher = EmbeddingBatcher(client, max_delay=0.005)
+        vector = batcher.embed("Hello", model="text-embedding-3-small")
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        """Initialize the batcher.
+
+        Args:
+            client: OpenAIClient whose create_embeddings sends the batches.
+            max_batch_size: Texts per batch; a full batch is sent at once.
+            max_delay: Longest time in seconds a call waits for others to join
+                its batch.
+        """
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: Dict[Tuple[str, bool], _Batch] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, text: str, model: str, as_numpy: bool = False) -> Any:
+        """Embed one text as part of a batch.
+
+        Args:
+            text: Text to embed.
+            model: Embedding model name.
+            as_numpy: Return a float32 numpy array instead of a list.
+
+        Returns:
+            The embedding of text.
+
+        Raises:
+            Exception: Whatever create_embeddings raised for the batch.
+        """
+        key = (model, as_numpy)
+        future: Future = Future()
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = _Batch()
+            batch.texts.append(text)
+            batch.futures.append(future)
+            if len(batch.texts) >= self.max_batch_size:
+                del self._pending[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_delay)
+            with self._lock:
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+            self._send(batch, model, as_numpy)
+        return future.result()
+
+    def _send(self, batch: _Batch, model: str, as_numpy: bool) -> None:
+        """Embed a closed batch and resolve its futures."""
+        texts, indices = _deduplicate(batch.texts)
+        _record(self.client, len(batch.texts), len(texts))
+        try:
+            embeddings = self.client.create_embeddings(texts, model=model, as_numpy=as_numpy)
+        except Exception as e:
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        for future, index in zip(batch.futures, indices):
+            future.set_result(embeddings[index])
+
+
+class AsyncEmbeddingBatcher:
+    """Collects concurrent async create_embedding calls into batched requests.
+
+    A batch is sent when it is full or max_delay after its first call,
+    from a task owned by the batcher, so cancelling one caller does not affect
+    the others.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        """Initialize the batcher.
+
+        Args:
+            client: AsyncOpenAIClient whose create_embeddings sends the batches.
+            max_batch_size: Texts per batch; a full batch is sent at once.
+            max_delay: Longest time in seconds a call waits for others to join
+                its batch.
+        """
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: Dict[Tuple[str, bool], _Batch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str, model: str, as_numpy: bool = False) -> Any:
+        """Embed one text as part of a batch.
+
+        Args:
+            text: Text to embed.
+            model: Embedding model name.
+            as_numpy: Return a float32 numpy array instead of a list.
+
+        Returns:
+            The embedding of text.
+
+        Raises:
+            Exception: Whatever create_embeddings raised for the batch.
+        """
+        loop = asyncio.get_running_loop()
+        key = (model, as_numpy)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch()
+            batch.timer = loop.call_later(self.max_delay, self._flush, key, batch)
+        future = loop.create_future()
+        batch.texts.append(text)
+        batch.futures.append(future)
+        if len(batch.texts) >= self.max_batch_size:
+            batch.timer.cancel()
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key: Tuple[str, bool], batch: _Batch) -> None:
+        """Close a batch and start sending it."""
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        task = asyncio.ensure_future(self._send(batch, *key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: _Batch, model: str, as_numpy: bool) -> None:
+        """Embed a closed batch and resolve its futures."""
+        texts, indices = _deduplicate(batch.texts)
+        _record(self.client, len(batch.texts), len(texts))
+        try:
+            embeddings = await self.client.create_embeddings(texts, model=model, as_numpy=as_numpy)
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, index in zip(batch.futures, indices):
+            if not future.done():
+                future.set_result(embeddings[index])
@@ -0,0 +1,29 @@
+"""
+Fast JSON decoding for raw API response bodies.
+
+Uses orjson when it is installed and falls back to the standard json module.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode a JSON document.
+
+    Args:
+        data: JSON text or UTF-8 bytes.
+
+    Returns:
+        The decoded value.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,249 @@
+"""
+Hedged requests to cut tail latency.
+
+If a request has not returned after the recent p95 (by default) of its
+operation's latency, a duplicate is sent and whichever finishes first wins.
+Hedges are limited by a budget that grows with the number of requests, so
+they add at most a configured fraction of extra load.
+
+Async losers are cancelled. A synchronous request cannot be interrupted once
+sent, so a losing thread runs to completion and its result is discarded.
+"""
+
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+from logger import get_logger
+from metrics import ClientMetrics
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class HedgingPolicy:
+    """When to send a duplicate request and how many to allow.
+
+    Attributes:
+        percentile: Latency percentile of recent requests after which a
+            request is hedged.
+        min_samples: Observations needed before hedging starts.
+        min_delay: Lower bound on the hedging delay in seconds.
+        max_hedge_ratio: Long-run limit on hedges as a fraction of requests.
+        burst: Hedges allowed before the ratio applies.
+    """
+
+    percentile: float = 95.0
+    min_samples: int = 20
+    min_delay: float = 0.05
+    max_hedge_ratio: float = 0.1
+    burst: int = 5
+
+
+class HedgeBudget:
+    """Token bucket limiting hedges to a fraction of requests.
+
+    Every request deposits max_hedge_ratio tokens (up to burst) and every
+    hedge spends one.
+    """
+
+    def __init__(self, ratio: float, burst: int):
+        """Initialize a full budget.
+
+        Args:
+            ratio: Tokens deposited per request.
+            burst: Maximum tokens held.
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """Add the tokens earned by one request."""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one token if available."""
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def _start(call: Callable[[], T]) -> "Future[T]":
+    """Run call in a new daemon thread and return its future."""
+    future: Future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(call())
+        except BaseException as e:
+            future.set_exception(e)
+
+    # Hedges keep the caller's context, e.g. its scheduling priority and deadline
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+    return future
+
+
+class Hedger:
+    """Runs calls with hedging according to a HedgingPolicy.
+
+    Counts hedges in "<operation>.hedges" and hedges that finished first in
+    "<operation>.hedge_wins".
+    """
+
+    def __init__(self, policy: Optional[HedgingPolicy] = None, metrics: Optional[ClientMetrics] = None):
+        """Initialize the hedger.
+
+        Args:
+            policy: Hedging policy. Defaults to HedgingPolicy().
+            metrics: Metrics holding the latencies hedging delays are derived
+                from, and where hedges are counted. Defaults to a new
+                ClientMetrics.
+        """
+        self.policy = policy if policy is not None else HedgingPolicy()
+        self.metrics = metrics if metrics is not None else ClientMetrics()
+        self.budget = HedgeBudget(self.policy.max_hedge_ratio, self.policy.burst)
+
+    def delay(self, latency_metric: str) -> Optional[float]:
+        """Return how long to wait before hedging, or None to not hedge.
+
+        Args:
+            latency_metric: Name of the observations (in seconds) the
+                percentile is taken from.
+        """
+        values = self.metrics.values(latency_metric)
+        if len(values) < self.policy.min_samples:
+            return None
+        return max(self.policy.min_delay, self.metrics.percentile(latency_metric, self.policy.percentile))
+
+    def run(
+        self,
+        operation: str,
+        call: Callable[[], T],
+        latency_metric: str,
+        discard: Optional[Callable[[T], Any]] = None,
+    ) -> T:
+        """Run call, sending a duplicate if it is slower than the hedging delay.
+
+        Args:
+            operation: Operation name used in metric names.
+            call: Zero-argument function making the request.
+            latency_metric: Observations the hedging delay is derived from.
+            discard: Called with the result of a losing request, e.g. to
+                close a stream.
+
+        Returns:
+            The first successful result.
+
+        Raises:
+            Exception: The primary request's error if every request failed.
+        """
+        self.budget.deposit()
+        delay = self.delay(latency_metric)
+        if delay is None:
+            return call()
+
+        primary = _start(call)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.budget.try_spend():
+            return primary.result()
+
+        logger.debug(f"{operation} slower than {delay:.3f}s, sending hedged request")
+        self.metrics.increment(f"{operation}.hedges")
+        attempts = [primary, _start(call)]
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [future for future in attempts if future in done and future.exception() is None]
+            if winners:
+                return self._settle(operation, attempts, winners[0], discard)
+        return primary.result()
+
+    def _settle(
+        self,
+        operation: str,
+        attempts: List[Future],
+        winner: Future,
+        discard: Optional[Callable[[Any], Any]],
+    ) -> Any:
+        """Return the winner's result and discard the other attempt's."""
+        if winner is not attempts[0]:
+            self.metrics.increment(f"{operation}.hedge_wins")
+
+        def discard_result(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                discard(future.result())
+
+        if discard is not None:
+            for future in attempts:
+                if future is not winner:
+                    future.add_done_callback(discard_result)
+        return winner.result()
+
+    async def arun(
+        self,
+        operation: str,
+        call: Callable[[], Awaitable[T]],
+        latency_metric: str,
+        discard: Optional[Callable[[T], Awaitable[Any]]] = None,
+    ) -> T:
+        """Await call, sending a duplicate if it is slower than the hedging delay.
+
+        The losing request is cancelled; if it already finished, discard is
+        awaited with its result.
+
+        Args:
+            operation: Operation name used in metric names.
+            call: Zero-argument function returning the request's awaitable.
+            latency_metric: Observations the hedging delay is derived from.
+            discard: Awaited with the result of a losing request that had
+                already finished, e.g. to close a stream.
+
+        Returns:
+            The first successful result.
+
+        Raises:
+            Exception: The primary request's error if every request failed.
+        """
+        self.budget.deposit()
+        delay = self.delay(latency_metric)
+        if delay is None:
+            return await call()
+
+        primary = asyncio.ensure_future(call())
+        attempts = [primary]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done or not self.budget.try_spend():
+                return await primary
+
+            logger.debug(f"{operation} slower than {delay:.3f}s, sending hedged request")
+            self.metrics.increment(f"{operation}.hedges")
+            attempts.append(asyncio.ensure_future(call()))
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in attempts if task in done and task.exception() is None]
+                if winners:
+                    if winners[0] is not primary:
+                        self.metrics.increment(f"{operation}.hedge_wins")
+                    for task in winners[1:]:
+                        if discard is not None:
+                            await discard(task.result())
+                    return winners[0].result()
+            return primary.result()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
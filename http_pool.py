@@ -0,0 +1,307 @@
+"""
+Shared HTTP connection pools for OpenAI clients.
+
+Creating an OpenAI SDK client normally creates a new HTTP connection pool, so
+every OpenAIClient pays its own TCP/TLS handshakes and keeps its own idle
+connections. A ClientRegistry hands out one tuned httpx client per
+(api_key, base_url) instead, shared by every OpenAIClient in the process.
+
+Async clients hold connections bound to the event loop they were used in, so
+the registry keeps one per running loop and forgets it once that loop is
+closed. SDK clients created outside a loop get a client that sends each
+request through the pool of the loop running at request time. Pools belong
+to the registry: close them with ClientRegistry.aclose, not through the SDK
+clients using them.
+
+Pools are not carried across os.fork(): sockets inherited from the parent
+must not be used by the child, so each registry forgets its clients in the
+child process and creates new ones on first use. SDK clients hold a
+process_http_client, which looks the pool up at request time, so SDK clients
+created before the fork use the child's pools as well.
+
+Response headers (e.g. x-ratelimit-*) of requests made inside
+listen_for_headers are passed to its listener; the SDK does not return them
+from its regular create calls.
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from openai import DefaultHttpxClient, DefaultAsyncHttpxClient
+
+from logger import get_logger
+
+# The SDK's HTTP library (httpx, or httpx2 in newer SDK releases)
+try:
+    import httpx2 as httpx
+except ImportError:  # pragma: no cover - depends on the SDK version
+    import httpx
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """Connection pool settings.
+
+    Attributes:
+        max_connections: Maximum concurrent connections per pool.
+        max_keepalive_connections: Maximum idle connections kept open.
+        keepalive_expiry: Seconds an idle connection is kept open.
+        http2: Use HTTP/2, multiplexing requests over fewer connections.
+            Requires the h2 package (pip install "httpx[http2]").
+        connect_timeout: Seconds allowed to establish a connection.
+        timeout: Overall request timeout in seconds.
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    connect_timeout: float = 5.0
+    timeout: float = 600.0
+
+    def client_kwargs(self) -> Dict[str, Any]:
+        """Return the keyword arguments for creating an httpx client."""
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            "http2": self.http2,
+        }
+
+
+# Receives the headers of responses to requests made in the current context
+_header_listener: ContextVar[Optional[Callable[[Any], None]]] = ContextVar("header_listener", default=None)
+
+
+@contextmanager
+def listen_for_headers(listener: Callable[[Any], None]) -> Iterator[None]:
+    """Pass the headers of every response received in this context to listener.
+
+    Works in threads and asyncio tasks alike, since the listener is stored in
+    a context variable. Only clients from a ClientRegistry report headers.
+
+    Args:
+        listener: Called with each response's headers (case-insensitive mapping).
+    """
+    token = _header_listener.set(listener)
+    try:
+        yield
+    finally:
+        _header_listener.reset(token)
+
+
+def _report_headers(response: Any) -> None:
+    """httpx response hook forwarding headers to the current listener."""
+    listener = _header_listener.get()
+    if listener is not None:
+        listener(response.headers)
+
+
+async def _areport_headers(response: Any) -> None:
+    """Async httpx response hook forwarding headers to the current listener."""
+    _report_headers(response)
+
+
+class _LoopBoundAsyncClient(DefaultAsyncHttpxClient):
+    """Async httpx client for SDK clients created outside an event loop.
+
+    Requests are sent through the registry's pool for the loop running at
+    request time, so the SDK client works across asyncio.run calls.
+    """
+
+    def __init__(self, registry: "ClientRegistry", api_key: str, base_url: Optional[str], **kwargs: Any):
+        super().__init__(**kwargs)
+        self._registry = registry
+        self._pool = (api_key, base_url)
+
+    async def send(self, request: Any, **kwargs: Any) -> Any:
+        return await self._registry.async_http_client(*self._pool).send(request, **kwargs)
+
+
+class _ProcessBoundClient(DefaultHttpxClient):
+    """Sync httpx client that sends through the registry's current pool.
+
+    SDK clients keep their httpx client for life; looking the pool up at
+    request time means one created before os.fork() uses the child's pool.
+    """
+
+    def __init__(self, registry: "ClientRegistry", api_key: str, base_url: Optional[str], **kwargs: Any):
+        super().__init__(**kwargs)
+        self._registry = registry
+        self._pool = (api_key, base_url)
+
+    def send(self, request: Any, **kwargs: Any) -> Any:
+        return self._registry.http_client(*self._pool).send(request, **kwargs)
+
+
+# Registries to reset in forked children
+_registries: "weakref.WeakSet[ClientRegistry]" = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for registry in list(_registries):
+        registry._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class ClientRegistry:
+    """Process-wide cache of httpx clients keyed by (api_key, base_url).
+
+    Async clients are additionally keyed by the event loop running when they
+    are requested, because their connections cannot be used from another loop.
+    The registry holds only a weak reference to each loop and forgets the
+    pools of loops that have closed.
+
+    Example:
+        registry = ClientRegistry(PoolConfig(max_connections=50, http2=True))
+        client = OpenAIClient(http_pool=registry)
+    """
+
+    def __init__(self, config: Optional[PoolConfig] = None):
+        """Initialize an empty registry.
+
+        Args:
+            config: Pool settings for the clients it creates. Defaults to
+                PoolConfig().
+        """
+        self.config = config if config is not None else PoolConfig()
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[Any, ...], Any] = {}
+        self._loops: Dict[Tuple[Any, ...], "weakref.ReferenceType[asyncio.AbstractEventLoop]"] = {}
+        _registries.add(self)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_closed_loops()
+            return len(self._clients)
+
+    def http_client(self, api_key: str, base_url: Optional[str] = None) -> Any:
+        """Return the shared synchronous httpx client for an API key and base URL.
+
+        Args:
+            api_key: API key the client is used with.
+            base_url: API base URL, or None for the SDK default.
+
+        Returns:
+            httpx Client, created on first use.
+        """
+        return self._get(("sync", api_key, base_url), DefaultHttpxClient, _report_headers)
+
+    def process_http_client(self, api_key: str, base_url: Optional[str] = None) -> Any:
+        """Return a synchronous httpx client to pass to SDK clients.
+
+        It sends each request through http_client(api_key, base_url) of the
+        process sending it, so it stays safe to use after os.fork().
+
+        Args:
+            api_key: API key the client is used with.
+            base_url: API base URL, or None for the SDK default.
+
+        Returns:
+            httpx Client, created on first use.
+        """
+        factory = partial(_ProcessBoundClient, self, api_key, base_url)
+        return self._get(("sync", api_key, base_url, None), factory, _report_headers)
+
+    def async_http_client(self, api_key: str, base_url: Optional[str] = None) -> Any:
+        """Return the shared asynchronous httpx client for an API key and base URL.
+
+        Args:
+            api_key: API key the client is used with.
+            base_url: API base URL, or None for the SDK default.
+
+        Returns:
+            httpx AsyncClient for the running event loop, created on first
+            use. Outside an event loop, a client that sends through the pool
+            of whichever loop is running at request time.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            factory = partial(_LoopBoundAsyncClient, self, api_key, base_url)
+            return self._get(("async", api_key, base_url, None), factory, _areport_headers)
+        return self._get(("async", api_key, base_url, id(loop)), DefaultAsyncHttpxClient, _areport_headers, loop)
+
+    def _get(
+        self,
+        key: Tuple[Any, ...],
+        factory: Callable[..., Any],
+        response_hook: Callable[[Any], Any],
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> Any:
+        """Return the client stored under key, creating it if needed."""
+        with self._lock:
+            self._evict_closed_loops()
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = factory(**self.config.client_kwargs(), event_hooks={"response": [response_hook]})
+                self._clients[key] = client
+                if loop is not None:
+                    self._loops[key] = weakref.ref(loop)
+                logger.debug(f"Created shared {key[0]} HTTP client ({len(self._clients)} pools)")
+            return client
+
+    def _evict_closed_loops(self) -> None:
+        """Forget the pools of event loops that are closed or gone; called with the lock held.
+
+        Their connections cannot be used or closed cleanly without the loop.
+        """
+        for key, loop_ref in list(self._loops.items()):
+            loop = loop_ref()
+            if loop is None or loop.is_closed():
+                del self._loops[key]
+                self._clients.pop(key, None)
+
+    def close(self) -> None:
+        """Close the synchronous clients and forget every client.
+
+        Async clients are only forgotten; use aclose to close them.
+        """
+        with self._lock:
+            clients, self._clients, self._loops = self._clients, {}, {}
+        for key, client in clients.items():
+            if key[0] == "sync":
+                client.close()
+
+    async def aclose(self) -> None:
+        """Close every client and forget them.
+
+        Async pools of other event loops are only forgotten, since their
+        connections can only be closed from their own loop.
+        """
+        running = asyncio.get_running_loop()
+        with self._lock:
+            loops = {key: loop_ref() for key, loop_ref in self._loops.items()}
+            clients, self._clients, self._loops = self._clients, {}, {}
+        for key, client in clients.items():
+            if key[0] == "sync":
+                client.close()
+            elif key not in loops or loops[key] is running:
+                await client.aclose()
+
+    def _reset(self) -> None:
+        """Forget every client without closing it (used after fork).
+
+        Closing would shut down connections the parent process still uses.
+        """
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._loops = {}
+
+
+default_registry = ClientRegistry()
@@ -0,0 +1,258 @@
+"""
+Image preparation for vision requests.
+
+Detects the real image format, and optionally downscales and re-encodes
+images to the size the vision models actually use, choosing the "low" or
+"high" detail level from the image dimensions. Preprocessing requires Pillow.
+"""
+
+import io
+import os
+import base64
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+from logger import get_logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+    ImageOps = None
+
+logger = get_logger(__name__)
+
+# High detail images are scaled to fit in a 2048x2048 square, then so that
+# the shortest side is 768px, and billed per 512px tile.
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+TILE_SIZE = 512
+BASE_IMAGE_TOKENS = 85
+TOKENS_PER_TILE = 170
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+# A file path, raw bytes or a binary file-like object
+ImageSource = Union[str, os.PathLike, bytes, BinaryIO]
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def detect_mime_type(data: bytes) -> str:
+    """Detect an image's MIME type from its leading bytes.
+
+    Args:
+        data: Raw image bytes.
+
+    Returns:
+        MIME type, defaulting to image/jpeg when the format is not recognized.
+    """
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def target_size(width: int, height: int) -> Tuple[int, int]:
+    """Return the size a high-detail image is scaled to by the API.
+
+    Args:
+        width: Original width in pixels.
+        height: Original height in pixels.
+
+    Returns:
+        (width, height) after fitting within MAX_LONG_SIDE and scaling the
+        shortest side down to MAX_SHORT_SIDE. Images are never upscaled.
+    """
+    scale = min(1.0, MAX_LONG_SIDE / max(width, height))
+    shortest = min(width, height) * scale
+    if shortest > MAX_SHORT_SIDE:
+        scale *= MAX_SHORT_SIDE / shortest
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """Estimate the prompt tokens an image costs.
+
+    Args:
+        width: Image width in pixels.
+        height: Image height in pixels.
+        detail: "low" or "high".
+
+    Returns:
+        Estimated token count.
+    """
+    if detail == "low":
+        return BASE_IMAGE_TOKENS
+    width, height = target_size(width, height)
+    tiles = -(-width // TILE_SIZE) * -(-height // TILE_SIZE)
+    return BASE_IMAGE_TOKENS + TOKENS_PER_TILE * tiles
+
+
+@dataclass(frozen=True)
+class ImagePreprocessConfig:
+    """Settings for preparing an image before upload.
+
+    Attributes:
+        detail: Fixed detail level ("low" or "high"), or None to choose it
+            from the image size.
+        low_detail_max_side: Images whose longest side is at most this many
+            pixels are sent with "low" detail when detail is None.
+        quality: JPEG/WebP quality used when re-encoding.
+        output_format: Format used when re-encoding opaque images. Images with
+            transparency are re-encoded as PNG.
+    """
+
+    detail: Optional[str] = None
+    low_detail_max_side: int = 512
+    quality: int = 85
+    output_format: str = "JPEG"
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """An image ready to attach to a message."""
+
+    data: bytes
+    mime_type: str
+    detail: str = "high"
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    @cached_property
+    def base64(self) -> str:
+        """Base64-encoded image data, computed once."""
+        return base64.b64encode(self.data).decode('utf-8')
+
+    @cached_property
+    def data_url(self) -> str:
+        """The image as a data: URL, computed once."""
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+    def content_part(self) -> dict:
+        """Return the image_url content part for a chat message."""
+        return {"type": "image_url", "image_url": {"url": self.data_url, "detail": self.detail}}
+
+
+def prepare_image(data: bytes, config: Optional[ImagePreprocessConfig] = None) -> PreparedImage:
+    """Prepare raw image bytes for a vision request.
+
+    Without a config the bytes are sent unchanged with their detected MIME type
+    and "high" detail. With a config the image is downscaled to the size the
+    model uses, re-encoded, and given a detail level; the original bytes are
+    kept when re-encoding would not make them smaller.
+
+    Args:
+        data: Raw image bytes.
+        config: Preprocessing settings, or None to skip preprocessing.
+
+    Returns:
+        PreparedImage.
+
+    Raises:
+        ImportError: If preprocessing is requested but Pillow is not installed.
+    """
+    mime_type = detect_mime_type(data)
+    if config is None:
+        return PreparedImage(data=data, mime_type=mime_type)
+    if Image is None:
+        raise ImportError("Pillow is required for image preprocessing. Install it with 'pip install pillow'.")
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        detail = config.detail or ("low" if max(width, height) <= config.low_detail_max_side else "high")
+        if detail == "low":
+            new_size = _fit(width, height, config.low_detail_max_side)
+        else:
+            new_size = target_size(width, height)
+
+        resized = new_size != (width, height)
+        if resized:
+            image = image.resize(new_size, Image.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        output_format = "PNG" if has_alpha else config.output_format.upper()
+        if output_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        save_args = {} if output_format == "PNG" else {"quality": config.quality, "optimize": True}
+        image.save(buffer, format=output_format, **save_args)
+        encoded = buffer.getvalue()
+
+    if not resized and len(encoded) >= len(data):
+        logger.debug(f"Keeping original {mime_type} image ({len(data)} bytes)")
+        return PreparedImage(data=data, mime_type=mime_type, detail=detail, width=width, height=height)
+
+    logger.debug(
+        f"Preprocessed image {width}x{height} ({len(data)} bytes) to "
+        f"{new_size[0]}x{new_size[1]} {output_format} ({len(encoded)} bytes), detail={detail}"
+    )
+    return PreparedImage(
+        data=encoded,
+        mime_type=f"image/{output_format.lower()}",
+        detail=detail,
+        width=new_size[0],
+        height=new_size[1],
+    )
+
+
+def read_image_source(source: ImageSource) -> bytes:
+    """Return the raw bytes of an image source.
+
+    Args:
+        source: File path, bytes or binary file-like object.
+
+    Returns:
+        Raw image bytes.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as image_file:
+            return image_file.read()
+    return source.read()
+
+
+def prepare_images(
+    images: List[bytes],
+    config: Optional[ImagePreprocessConfig] = None,
+    max_workers: Optional[int] = None,
+) -> List[PreparedImage]:
+    """Prepare several images, preprocessing them in parallel processes.
+
+    Decoding, resizing and re-encoding are CPU-bound, so with a config and more
+    than one image the work is spread over a process pool. Without a config
+    the images are only wrapped, which is cheap enough to do inline.
+
+    Args:
+        images: Raw image bytes.
+        config: Preprocessing settings, or None to skip preprocessing.
+        max_workers: Maximum worker processes. Defaults to the CPU count;
+            1 prepares the images in the calling process.
+
+    Returns:
+        PreparedImage per input, in input order.
+    """
+    workers = min(len(images), max_workers or os.cpu_count() or 1)
+    if config is None or workers <= 1:
+        return [prepare_image(data, config) for data in images]
+    logger.debug(f"Preprocessing {len(images)} images in {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(prepare_image, images, [config] * len(images)))
+
+
+def _fit(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """Scale (width, height) down so the longest side is at most max_side."""
+    scale = min(1.0, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
@@ -0,0 +1,242 @@
+"""
+Pool of API keys balanced by rate limit headroom.
+
+Each OpenAI key (or organization) has its own requests-per-minute and
+tokens-per-minute limits. A KeyPool tracks how much of them every key has
+left from the x-ratelimit-* headers of its responses and sends each request
+to the key with the most headroom, so throughput grows with the number of
+keys instead of being capped by one.
+
+Headroom is counted in requests of the size about to be sent: the smaller
+of the requests left and the tokens left divided by the request's tokens,
+minus what is already in flight on the key. Keys without headers yet are
+assumed to have unlimited headroom so every key gets used. Once a reset time
+passes, the key's limit is assumed to be available again.
+"""
+
+import time
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar, Union
+
+from openai import RateLimitError
+
+from logger import get_logger
+from metrics import ClientMetrics
+from retry import parse_reset_duration
+from http_pool import listen_for_headers
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class ApiKey:
+    """An API key and the organization it bills to.
+
+    Attributes:
+        key: The API key.
+        organization: Optional OpenAI organization ID.
+        name: Name used in logs and metric names. Defaults to the key's last
+            four characters.
+    """
+
+    key: str
+    organization: Optional[str] = None
+    name: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.name is None:
+            object.__setattr__(self, "name", f"key-{self.key[-4:]}")
+
+    def __repr__(self) -> str:
+        # Never put the key itself in logs or tracebacks
+        return f"ApiKey(name={self.name!r}, organization={self.organization!r})"
+
+
+class _Limit:
+    """Last known state of one rate limit (requests or tokens) of a key."""
+
+    __slots__ = ("limit", "remaining", "resets_at")
+
+    def __init__(self) -> None:
+        self.limit: Optional[float] = None
+        self.remaining: Optional[float] = None
+        self.resets_at = 0.0
+
+    def update(self, headers: Any, kind: str, now: float) -> None:
+        """Read the x-ratelimit-*-<kind> headers, if present."""
+        limit = _header_number(headers, f"x-ratelimit-limit-{kind}")
+        remaining = _header_number(headers, f"x-ratelimit-remaining-{kind}")
+        reset = headers.get(f"x-ratelimit-reset-{kind}")
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.remaining = remaining
+            reset_after = parse_reset_duration(reset) if reset else None
+            self.resets_at = now + reset_after if reset_after is not None else 0.0
+
+    def available(self, now: float) -> float:
+        """Return how much of the limit is left, or infinity if unknown."""
+        if self.remaining is None:
+            return float("inf")
+        if self.resets_at and now >= self.resets_at:
+            return self.limit if self.limit is not None else float("inf")
+        return self.remaining
+
+
+def _header_number(headers: Any, name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class _KeyState:
+    """Rate limit state and in-flight work of one key, guarded by the pool's lock."""
+
+    __slots__ = ("requests", "tokens", "pending_requests", "pending_tokens")
+
+    def __init__(self) -> None:
+        self.requests = _Limit()
+        self.tokens = _Limit()
+        self.pending_requests = 0
+        self.pending_tokens = 0
+
+    def headroom(self, tokens: int, now: float) -> float:
+        """Return how many requests of this size the key can still take."""
+        requests_left = self.requests.available(now) - self.pending_requests
+        tokens_left = self.tokens.available(now) - self.pending_tokens
+        return min(requests_left, tokens_left / max(tokens, 1))
+
+
+class KeyPool:
+    """Dispatches requests to the API key with the most rate limit headroom.
+
+    Publishes "keys.<name>.requests" counters and "keys.<name>.remaining_requests"
+    / "keys.<name>.remaining_tokens" gauges.
+
+    Example:
+        pool = KeyPool(["sk-team-a...", ApiKey("sk-team-b...", organization="org-b")])
+        client = OpenAIClient(key_pool=pool)
+    """
+
+    def __init__(self, keys: Sequence[Union[str, ApiKey]], metrics: Optional[ClientMetrics] = None):
+        """Initialize the pool.
+
+        Args:
+            keys: API keys as strings or ApiKey objects; names must be unique.
+            metrics: Metrics key state is published in. Clients set this to
+                their own metrics if it is None.
+
+        Raises:
+            ValueError: If no keys are given or names repeat.
+        """
+        if not keys:
+            raise ValueError("At least one API key is required")
+        self.keys: List[ApiKey] = [key if isinstance(key, ApiKey) else ApiKey(key) for key in keys]
+        names = [key.name for key in self.keys]
+        if len(set(names)) != len(names):
+            raise ValueError(f"API key names must be unique, got {names}")
+        self.metrics = metrics
+        self._states = {key.name: _KeyState() for key in self.keys}
+        self._lock = threading.Lock()
+
+    def choose(self, tokens: int = 0) -> ApiKey:
+        """Return the key with the most headroom for a request.
+
+        Ties go to the key with fewer requests in flight, then to the first.
+
+        Args:
+            tokens: Estimated tokens the request consumes.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return max(
+                self.keys,
+                key=lambda key: (
+                    self._states[key.name].headroom(tokens, now),
+                    -self._states[key.name].pending_requests,
+                ),
+            )
+
+    def update(self, key: ApiKey, headers: Any) -> None:
+        """Record the rate limit headers of a response received with key."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states[key.name]
+            state.requests.update(headers, "requests", now)
+            state.tokens.update(headers, "tokens", now)
+            remaining_requests, remaining_tokens = state.requests.remaining, state.tokens.remaining
+        if self.metrics is not None:
+            if remaining_requests is not None:
+                self.metrics.set_gauge(f"keys.{key.name}.remaining_requests", remaining_requests)
+            if remaining_tokens is not None:
+                self.metrics.set_gauge(f"keys.{key.name}.remaining_tokens", remaining_tokens)
+
+    def call(self, key: ApiKey, tokens: int, call: Callable[[], T]) -> T:
+        """Run call with key, counting it as in flight and reading its response headers.
+
+        Args:
+            key: Key the call uses.
+            tokens: Estimated tokens the call consumes.
+            call: Zero-argument function making the request.
+        """
+        self._start(key, tokens)
+        try:
+            with listen_for_headers(lambda headers: self.update(key, headers)):
+                return call()
+        except RateLimitError:
+            logger.warning(f"API key {key.name} was rate limited")
+            raise
+        finally:
+            self._finish(key, tokens)
+
+    async def acall(self, key: ApiKey, tokens: int, call: Callable[[], Awaitable[T]]) -> T:
+        """Await call with key, counting it as in flight and reading its response headers.
+
+        Args:
+            key: Key the call uses.
+            tokens: Estimated tokens the call consumes.
+            call: Zero-argument function returning the request's awaitable.
+        """
+        self._start(key, tokens)
+        try:
+            with listen_for_headers(lambda headers: self.update(key, headers)):
+                return await call()
+        except RateLimitError:
+            logger.warning(f"API key {key.name} was rate limited")
+            raise
+        finally:
+            self._finish(key, tokens)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return the known limits and in-flight work of every key by name."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "remaining_requests": state.requests.available(now),
+                    "remaining_tokens": state.tokens.available(now),
+                    "in_flight": state.pending_requests,
+                }
+                for name, state in self._states.items()
+            }
+
+    def _start(self, key: ApiKey, tokens: int) -> None:
+        with self._lock:
+            state = self._states[key.name]
+            state.pending_requests += 1
+            state.pending_tokens += tokens
+        if self.metrics is not None:
+            self.metrics.increment(f"keys.{key.name}.requests")
+
+    def _finish(self, key: ApiKey, tokens: int) -> None:
+        with self._lock:
+            state = self._states[key.name]
+            state.pending_requests -= 1
+            state.pending_tokens -= tokens
@@ -0,0 +1,110 @@
+"""
+In-process metrics for the OpenAI client.
+"""
+
+import math
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Any
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Return the q-th percentile of values using the nearest-rank method.
+
+    Args:
+        values: Observed values.
+        q: Percentile between 0 and 100.
+
+    Returns:
+        The percentile, or None if values is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class ClientMetrics:
+    """Thread-safe counters, gauges and recent-value histograms.
+
+    Counters are monotonically increasing totals (requests, retries, cache
+    hits). Gauges hold the current value of a state (e.g. a circuit breaker's).
+    Observations keep the most recent window values per name so percentiles
+    reflect current behaviour.
+    """
+
+    def __init__(self, window: int = 1000):
+        """Initialize metrics.
+
+        Args:
+            window: Number of recent observations kept per name.
+        """
+        self.window = window
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, float] = {}
+        self._observations: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Add value to a counter."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record an observation (e.g. a latency in seconds)."""
+        with self._lock:
+            if name not in self._observations:
+                self._observations[name] = deque(maxlen=self.window)
+            self._observations[name].append(value)
+
+    def counter(self, name: str) -> int:
+        """Return the current value of a counter."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name: str) -> Optional[float]:
+        """Return the current value of a gauge, or None if it was never set."""
+        with self._lock:
+            return self._gauges.get(name)
+
+    def values(self, name: str) -> List[float]:
+        """Return the recent observations for a name."""
+        with self._lock:
+            return list(self._observations.get(name, ()))
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """Return the q-th percentile of the recent observations for a name."""
+        return percentile(self.values(name), q)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return counters, gauges and p50/p95/p99 summaries of all observations."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            observations = {name: list(values) for name, values in self._observations.items()}
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "observations": {
+                name: {
+                    "count": len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                }
+                for name, values in observations.items()
+            },
+        }
+
+    def reset(self) -> None:
+        """Clear all counters, gauges and observations."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._observations.clear()
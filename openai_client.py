@@ -1,35 +1,545 @@
 import os
+import re
 import json
 import base64
-from typing import Dict, List, Optional, Any, Union
+import time
+import asyncio
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from functools import partial
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Union, Tuple, Callable, Awaitable, TypeVar, Iterator, AsyncIterator
 import logging
-from openai import OpenAI
-from openai.types.chat import ChatCompletionMessageParam
+from openai import OpenAI, AsyncOpenAI, BadRequestError
+from openai.types.chat import ChatCompletion, ChatCompletionMessageParam
 
 from logger import get_logger
+from cache import EmbeddingCache, ImageCache, ResponseCache
+from metrics import ClientMetrics
+from retry import RetryPolicy, call_with_retry, acall_with_retry
+from rate_limiter import RateLimiter
+from batch import BatchItem, BatchReport, run_many, iter_many, arun_many, aiter_many
+from streaming import (
+    ChatCompletionStream,
+    AsyncChatCompletionStream,
+    read_until_first_token,
+    aread_until_first_token,
+)
+from tokens import TokenCounter, estimate_request_tokens, estimate_tokens, fit_request
+from results import ChatResult
+from http_pool import ClientRegistry, default_registry
+from singleflight import AsyncSingleFlight, SingleFlight, request_key
+from embedding_batcher import DEFAULT_MAX_BATCH_SIZE, AsyncEmbeddingBatcher, EmbeddingBatcher
+from hedging import Hedger, HedgingPolicy
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from routing import Backend, BackendRouter
+from key_pool import KeyPool
+from concurrency import AIMDPolicy, AdaptiveLimiter, AsyncAdaptiveLimiter
+from scheduler import AsyncRequestScheduler, DeadlineExceededError, RequestScheduler, check_deadline, schedule
+import fast_json
+from image_processing import (
+    IMAGE_EXTENSIONS,
+    ImagePreprocessConfig,
+    ImageSource,
+    PreparedImage,
+    prepare_images,
+    read_image_source,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
 
-class OpenAIClient:
-    """Client for interacting with OpenAI API."""
+# Per-request limits of the embeddings endpoint
+EMBEDDING_MAX_INPUTS = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 300_000
+
+# 400 errors that mean an embeddings request was too big, so splitting it can help
+_BATCH_TOO_LARGE_CODES = {"context_length_exceeded", "max_tokens_per_request", "string_above_max_length"}
+_BATCH_TOO_LARGE_PATTERN = re.compile(
+    r"too many|too long|too large|maximum context length|tokens per request|maximum length|reduce the length",
+    re.IGNORECASE,
+)
+
+
+def _resolve_api_key(api_key: Optional[str]) -> str:
+    """Return the API key to use, falling back to the environment.
+
+    Args:
+        api_key: Explicit API key, or None to read OPENAI_API_KEY.
+
+    Returns:
+        The resolved API key.
+
+    Raises:
+        ValueError: If no API key is available.
+    """
+    resolved = api_key or os.environ.get("OPENAI_API_KEY")
+    if not resolved:
+        raise ValueError(
+            "OpenAI API key is required. Please set OPENAI_API_KEY environment variable "
+            "or provide api_key parameter."
+        )
+    return resolved
+
+
+def _format_messages(messages: List[Dict[str, Any]]) -> List[ChatCompletionMessageParam]:
+    """Convert message dictionaries to the format expected by the SDK.
+
+    Args:
+        messages: List of message dictionaries (role and content). Content may be
+            a string or a list of content parts (e.g. text and image_url).
+
+    Returns:
+        List of formatted messages.
+    """
+    return [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+
+
+def _load_images(
+    sources: List[ImageSource],
+    preprocess: Optional[ImagePreprocessConfig] = None,
+    cache: Optional[ImageCache] = None,
+    max_workers: Optional[int] = None,
+) -> List[PreparedImage]:
+    """Read images and prepare them for upload.
+
+    Args:
+        sources: File paths, bytes or binary file-like objects.
+        preprocess: Optional settings to downscale and re-encode the images.
+        cache: Optional cache of prepared images.
+        max_workers: Maximum processes used to preprocess the images.
+
+    Returns:
+        PreparedImage per source with the detected MIME type and detail level.
+    """
+    if cache is not None:
+        return cache.load_many(sources, preprocess, max_workers)
+    return prepare_images([read_image_source(source) for source in sources], preprocess, max_workers)
+
+
+def _list_images(directory: str) -> List[str]:
+    """Return the image files directly inside a directory, sorted by name."""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def _format_image_messages(
+    messages: List[Dict[str, Any]],
+    images: List[PreparedImage],
+) -> List[ChatCompletionMessageParam]:
+    """Format messages, attaching images to the last message.
+
+    Args:
+        messages: List of message dictionaries (role and content).
+        images: Prepared images to attach, in order.
+
+    Returns:
+        List of formatted messages.
+    """
+    # Add previous messages
+    formatted_messages = _format_messages(messages[:-1])
+
+    # Add the last message with the images
+    last_msg = messages[-1]
+    formatted_messages.append({
+        "role": last_msg["role"],
+        "content": [
+            {"type": "text", "text": last_msg["content"]},
+            *(image.content_part() for image in images),
+        ]
+    })
+    return formatted_messages
+
+
+def _is_batch_too_large(error: BadRequestError) -> bool:
+    """Return whether a 400 response rejected a request for its size or token count.
+
+    Other bad requests (unknown model, invalid input) fail the same way for
+    any part of the batch, so they must not be retried in smaller pieces.
+    """
+    if getattr(error, "code", None) in _BATCH_TOO_LARGE_CODES:
+        return True
+    return bool(_BATCH_TOO_LARGE_PATTERN.search(str(error)))
+
+
+def _batch_embedding_inputs(
+    texts: List[str],
+    max_inputs: int = EMBEDDING_MAX_INPUTS,
+    max_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+) -> List[Tuple[int, int]]:
+    """Pack consecutive texts into batches that respect the request limits.
+
+    Args:
+        texts: Texts to embed.
+        max_inputs: Maximum number of inputs per request.
+        max_tokens: Maximum estimated tokens per request.
+
+    Returns:
+        List of (start, end) index ranges into texts, in input order.
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if i > start and (i - start >= max_inputs or batch_tokens + tokens > max_tokens):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _embeddings_from_response(response: Any) -> List[Any]:
+    """Extract embeddings from a response in input order.
+
+    Args:
+        response: CreateEmbeddingResponse object returned by the SDK, or the
+            decoded JSON body when the raw-response fast path is used.
+
+    Returns:
+        List of embeddings (float lists or base64 strings), ordered to match
+        the request inputs.
+    """
+    if isinstance(response, dict):
+        return [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def _embedding_request_params(as_numpy: bool) -> Dict[str, Any]:
+    """Return extra embeddings.create parameters for the requested output type.
+
+    Args:
+        as_numpy: Whether the caller wants NumPy output.
+
+    Returns:
+        Keyword arguments to pass to the SDK.
+
+    Raises:
+        ImportError: If NumPy output is requested but numpy is not installed.
+    """
+    if not as_numpy:
+        return {}
+    if np is None:
+        raise ImportError("numpy is required for as_numpy=True. Install it with 'pip install numpy'.")
+    return {"encoding_format": "base64"}
+
+
+def _decode_base64_embeddings(encoded: List[str]) -> "np.ndarray":
+    """Decode base64 embeddings into a float32 matrix.
+
+    The decoded bytes are joined once and wrapped with frombuffer, so no
+    per-value Python objects are created. The returned array is read-only.
+
+    Args:
+        encoded: Base64-encoded little-endian float32 embeddings.
+
+    Returns:
+        Array of shape (len(encoded), dimensions).
+    """
+    buffer = b"".join(base64.b64decode(item) for item in encoded)
+    return np.frombuffer(buffer, dtype=np.float32).reshape(len(encoded), -1)
+
+
+def _merge_embeddings(
+    cached: List[Optional[Any]],
+    pending: List[int],
+    fetched: Any,
+    as_numpy: bool,
+) -> Any:
+    """Combine cached embeddings with freshly fetched ones in input order.
+
+    Args:
+        cached: Cached embedding per input, or None where the cache missed.
+        pending: Indices of the inputs that were fetched from the API.
+        fetched: Embeddings returned by the API for the pending inputs.
+        as_numpy: Whether to return a 2-D numpy array.
+
+    Returns:
+        Embeddings for every input, as a list or a 2-D numpy array.
+    """
+    if len(pending) == len(cached):
+        return fetched
+    merged = list(cached)
+    for index, embedding in zip(pending, fetched):
+        merged[index] = embedding
+    return np.vstack(merged) if as_numpy else merged
+
+
+def _chat_request(seed: Optional[int] = None, **params: Any) -> Dict[str, Any]:
+    """Build the keyword arguments for a chat completion request.
+
+    Args:
+        seed: Optional sampling seed, only included when set.
+        **params: Remaining request parameters.
+
+    Returns:
+        Keyword arguments for chat.completions.create.
+    """
+    if seed is not None:
+        params["seed"] = seed
+    return params
+
+
+def _is_deterministic(request: Dict[str, Any]) -> bool:
+    """Return whether identical chat requests may share one response."""
+    return request.get("temperature") == 0 or request.get("seed") is not None
+
+
+def _reconcile_usage(rate_limiter: RateLimiter, reservation: Any, response: Any) -> None:
+    """Correct a rate limit reservation with the usage reported in a response."""
+    if isinstance(response, dict):
+        total_tokens = (response.get("usage") or {}).get("total_tokens")
+    else:
+        total_tokens = getattr(getattr(response, "usage", None), "total_tokens", None)
+    if isinstance(total_tokens, int):
+        rate_limiter.reconcile(reservation, total_tokens)
+
+
+class _BaseOpenAIClient(ABC):
+    """Configuration and request helpers shared by OpenAIClient and AsyncOpenAIClient.
+
+    Subclasses name the sync or async components they use (single flight
+    group, scheduler, embedding batcher and concurrency limiter), create
+    their SDK clients in _sdk_client and implement the methods that talk to
+    the API.
+    """
+
+    _description: str
+    _single_flight_class: type
+    _scheduler_class: type
+    _embedding_batcher_class: type
+    _concurrency_limiter_class: type
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        response_cache: Optional[ResponseCache] = None,
+        image_cache: Optional[ImageCache] = None,
+        metrics: Optional[ClientMetrics] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        token_counter: Optional[TokenCounter] = None,
+        trim_to_context: bool = False,
+        check_context_window: bool = True,
+        fast_parse: bool = False,
+        base_url: Optional[str] = None,
+        http_pool: Optional[ClientRegistry] = None,
+        single_flight: Optional[Union[SingleFlight, AsyncSingleFlight]] = None,
+        embedding_batch_delay: Optional[float] = None,
+        embedding_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        hedging: Optional[HedgingPolicy] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        fallback_models: Optional[Dict[str, str]] = None,
+        router: Optional[BackendRouter] = None,
+        key_pool: Optional[KeyPool] = None,
+        adaptive_concurrency: Optional[AIMDPolicy] = None,
+        scheduler: Optional[Union[RequestScheduler, AsyncRequestScheduler]] = None,
+    ):
+        """Initialize the client.
 
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize OpenAI client.
-        
         Args:
             api_key: OpenAI API key. Defaults to OPENAI_API_KEY environment variable.
+            embedding_cache: Optional cache consulted before requesting embeddings.
+            response_cache: Optional cache consulted before requesting chat completions.
+            image_cache: Optional cache of encoded images, so repeat questions
+                about the same file skip the disk read and encoding.
+            metrics: Metrics to record into. Defaults to a new ClientMetrics.
+            retry_policy: Retry policy applied to every API call. Defaults to
+                RetryPolicy(); the SDK's own retries are disabled in its favour.
+            rate_limiter: Optional client-side RPM/TPM limiter. Requests wait
+                for capacity instead of being sent and rejected with a 429.
+            token_counter: Counter used to check chat requests against the
+                model's context window. Defaults to a new TokenCounter.
+            trim_to_context: Drop the oldest non-system messages of an
+                over-long prompt instead of raising ContextWindowExceededError.
+            check_context_window: Count chat prompts against the model's
+                context window and clamp max_tokens before sending them. Turn
+                it off to send requests unchanged and leave the check to the API.
+            fast_parse: Read chat and embedding responses as raw HTTP bodies
+                and decode only the fields we use with a fast JSON parser,
+                skipping the SDK's pydantic models.
+            base_url: API base URL. Defaults to the SDK default.
+            http_pool: Registry providing the shared HTTP connection pool.
+                Defaults to the process-wide default_registry.
+            single_flight: Optional group coalescing identical concurrent
+                embedding and deterministic chat requests into one API call
+                (an AsyncSingleFlight for AsyncOpenAIClient).
+            embedding_batch_delay: If set, concurrent create_embedding calls
+                wait up to this many seconds for each other and are sent as
+                one batched request.
+            embedding_batch_size: Texts per batch when batching embeddings;
+                a full batch is sent without waiting.
+            hedging: Optional policy for sending a duplicate of a chat request
+                that is slower than recent requests (or, when streaming, slow
+                to produce its first token) and using whichever answers first.
+            circuit_breakers: Optional circuit breakers (per model and base
+                URL) that make calls fail fast with CircuitOpenError while the
+                upstream is failing or slow.
+            fallback_models: Model to send a chat request to instead while the
+                requested model's circuit is open, e.g. {"gpt-4o": "gpt-4o-mini"}.
+            router: Optional pool of OpenAI-compatible backends. Each attempt
+                is sent to the backend with the best latency and load, and
+                failing backends are drained. base_url is not used for
+                routed calls.
+            key_pool: Optional pool of API keys. Each request to base_url is
+                sent with the key that has the most rate limit headroom left
+                according to recent x-ratelimit-* headers. api_key defaults
+                to the pool's first key.
+            adaptive_concurrency: Optional AIMD policy. Fan-out methods then
+                adjust how many requests are in flight to the API's health
+                (429s, 5xx, latency) instead of using max_concurrency.
+            scheduler: Optional scheduler capping the attempts in flight and
+                handing free slots to the most urgent request first, by the
+                priority and deadline set with scheduler.schedule() (an
+                AsyncRequestScheduler for AsyncOpenAIClient).
+
+        Raises:
+            TypeError: If single_flight or scheduler is the sync version for
+                the async client or the other way round.
         """
-        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError(
-                "OpenAI API key is required. Please set OPENAI_API_KEY environment variable "
-                "or provide api_key parameter."
+        for name, component, expected in (
+            ("single_flight", single_flight, self._single_flight_class),
+            ("scheduler", scheduler, self._scheduler_class),
+        ):
+            if component is not None and not isinstance(component, expected):
+                raise TypeError(
+                    f"{type(self).__name__} needs a {expected.__name__} as {name}, "
+                    f"got {type(component).__name__}"
+                )
+        self.api_key = _resolve_api_key(api_key or (key_pool.keys[0].key if key_pool is not None else None))
+        self.embedding_cache = embedding_cache
+        self.response_cache = response_cache
+        self.image_cache = image_cache
+        self.metrics = metrics if metrics is not None else ClientMetrics()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.token_counter = token_counter if token_counter is not None else TokenCounter()
+        self.trim_to_context = trim_to_context
+        self.check_context_window = check_context_window
+        self.fast_parse = fast_parse
+        self.http_pool = http_pool if http_pool is not None else default_registry
+        self.single_flight = single_flight
+        self.embedding_batcher = None
+        if embedding_batch_delay is not None:
+            self.embedding_batcher = self._embedding_batcher_class(
+                self, embedding_batch_size, embedding_batch_delay
             )
-        
-        self.client = OpenAI(api_key=self.api_key)
-        logger.info("OpenAI client initialized")
-    
+        self.hedger = Hedger(hedging, self.metrics) if hedging is not None else None
+        self.concurrency_limiter = None
+        if adaptive_concurrency is not None:
+            self.concurrency_limiter = self._concurrency_limiter_class(adaptive_concurrency, self.metrics)
+        self.scheduler = scheduler
+        if scheduler is not None and scheduler.metrics is None:
+            scheduler.metrics = self.metrics
+        self.circuit_breakers = circuit_breakers
+        if circuit_breakers is not None and circuit_breakers.metrics is None:
+            circuit_breakers.metrics = self.metrics
+        self.fallback_models = fallback_models or {}
+        self.base_url = base_url
+        self.router = router
+        if router is not None and router.metrics is None:
+            router.metrics = self.metrics
+
+        self.client = self._sdk_client(self.api_key, base_url)
+        self.backend_clients: Dict[str, Any] = {}
+        if router is not None:
+            self.backend_clients = {
+                backend.name: self._sdk_client(backend.api_key or self.api_key, backend.base_url)
+                for backend in router.backends
+            }
+        self.key_pool = key_pool
+        self.key_clients: Dict[str, Any] = {}
+        if key_pool is not None:
+            if key_pool.metrics is None:
+                key_pool.metrics = self.metrics
+            self.key_clients = {
+                key.name: self._sdk_client(key.key, base_url, key.organization) for key in key_pool.keys
+            }
+        logger.info(f"{self._description} initialized")
+
+    @abstractmethod
+    def _sdk_client(self, api_key: str, base_url: Optional[str], organization: Optional[str] = None) -> Any:
+        """Create an SDK client on the shared connection pool for a key and base URL."""
+
+    def _fit_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Check a chat request against the context window before sending it.
+
+        Returns:
+            The request, trimmed if allowed and with max_tokens clamped to the
+            tokens left in the context window; unchanged if
+            check_context_window is off.
+        """
+        if not self.check_context_window:
+            return request
+        return fit_request(request, self.token_counter, trim=self.trim_to_context)
+
+    def _choose_backend(self, model: Optional[str]) -> Optional[Backend]:
+        """Pick the backend for one attempt, avoiding backends whose circuit is open for the model."""
+        if self.router is None:
+            return None
+        if self.circuit_breakers is None or model is None:
+            return self.router.choose(model)
+        breakers = self.circuit_breakers
+        return self.router.choose(model, lambda backend: breakers.get(model, backend.base_url).is_open)
+
+    def _lookup_cached_embeddings(self, texts: List[str], model: str, as_numpy: bool) -> List[Optional[Any]]:
+        """Return the cached embedding for each text, or None where missing."""
+        if self.embedding_cache is None:
+            return [None] * len(texts)
+        return [self.embedding_cache.get(model, text, as_numpy=as_numpy) for text in texts]
+
+    def _store_fetched_embeddings(
+        self,
+        cached: List[Optional[Any]],
+        pending: List[int],
+        pending_texts: List[str],
+        fetched: List[Any],
+        model: str,
+        as_numpy: bool,
+    ) -> Any:
+        """Decode and cache fetched embeddings and merge them with the cached ones."""
+        if as_numpy and fetched:
+            fetched = _decode_base64_embeddings(fetched)
+        if self.embedding_cache is not None:
+            for text, embedding in zip(pending_texts, fetched):
+                self.embedding_cache.set(model, text, embedding)
+        return _merge_embeddings(cached, pending, fetched, as_numpy)
+
+
+class OpenAIClient(_BaseOpenAIClient):
+    """Client for interacting with OpenAI API."""
+
+    _description = "OpenAI client"
+    _single_flight_class = SingleFlight
+    _scheduler_class = RequestScheduler
+    _embedding_batcher_class = EmbeddingBatcher
+    _concurrency_limiter_class = AdaptiveLimiter
+
+    def _sdk_client(self, api_key: str, base_url: Optional[str], organization: Optional[str] = None) -> OpenAI:
+        """Create an SDK client on the shared connection pool for a key and base URL."""
+        return OpenAI(
+            api_key=api_key,
+            organization=organization,
+            base_url=base_url,
+            max_retries=0,
+            http_client=self.http_pool.process_http_client(api_key, base_url),
+        )
+
     def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -39,9 +549,14 @@ class OpenAIClient:
         top_p: float = 1.0,
         frequency_penalty: float = 0.0,
         presence_penalty: float = 0.0,
-    ) -> Dict[str, Any]:
+        seed: Optional[int] = None,
+        use_cache: bool = True,
+        return_raw: bool = False,
+        priority: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> Union[ChatResult, ChatCompletion]:
         """Generate a chat completion response.
-        
+
         Args:
             messages: List of message dictionaries (role and content).
             model: Model name to use for completion.
@@ -50,99 +565,498 @@ class OpenAIClient:
             top_p: Nucleus sampling parameter.
             frequency_penalty: Frequency penalty parameter.
             presence_penalty: Presence penalty parameter.
-            
+            seed: Seed for best-effort deterministic sampling.
+            use_cache: Set to False to bypass the response cache for this call.
+            return_raw: Return the SDK's ChatCompletion object without any
+                conversion. Raw responses bypass the response cache.
+            priority: Priority class (scheduler.Priority) of the request.
+                Defaults to the one set with scheduler.schedule().
+            deadline: Seconds after which the request is dropped with
+                DeadlineExceededError if it has not been sent yet.
+
         Returns:
-            Response from the API as a dictionary.
+            ChatResult (a read-only mapping in the shape of the API response),
+            or the SDK object when return_raw is set.
         """
         logger.debug(f"Generating chat completion with model: {model}")
-        
+
         # Convert messages to the expected format
-        formatted_messages: List[ChatCompletionMessageParam] = []
-        for msg in messages:
-            if isinstance(msg["content"], list):
-                # Handle message with image content
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-            else:
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-        
+        request = _chat_request(
+            messages=_format_messages(messages),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            frequency_penalty=frequency_penalty,
+            presence_penalty=presence_penalty,
+            seed=seed,
+        )
+        request = self._fit_request(request)
+
+        cache_key = None
+        cacheable = use_cache and not return_raw and self.response_cache is not None
+        if cacheable and self.response_cache.should_cache(request):
+            cache_key = self.response_cache.make_key(request)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Chat completion served from cache")
+                if cached.stale and self.response_cache.begin_refresh(cache_key):
+                    threading.Thread(
+                        target=self._refresh_cached_completion,
+                        args=(cache_key, request),
+                        daemon=True,
+                    ).start()
+                return ChatResult.from_dict(cached.response)
+
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=formatted_messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                top_p=top_p,
-                frequency_penalty=frequency_penalty,
-                presence_penalty=presence_penalty,
-            )
-            
-            # Convert to dictionary for consistent return format
-            response_dict = {
-                "id": response.id,
-                "object": response.object,
-                "created": response.created,
-                "model": response.model,
-                "choices": [
-                    {
-                        "index": choice.index,
-                        "message": {
-                            "role": choice.message.role,
-                            "content": choice.message.content,
-                        },
-                        "finish_reason": choice.finish_reason,
-                    }
-                    for choice in response.choices
-                ],
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens,
-                } if response.usage else None,
-            }
-            
-            logger.debug(f"Chat completion generated successfully. Usage: {response_dict['usage']}")
-            return response_dict
-        
+            with schedule(priority, deadline):
+                if self.single_flight is not None and not return_raw and _is_deterministic(request):
+                    result = self._coalesce(
+                        "chat_completion", request, lambda: self._send_chat("chat_completion", request)
+                    )
+                else:
+                    result = self._send_chat("chat_completion", request, return_raw)
+            if return_raw:
+                return result
+            if cache_key is not None:
+                self.response_cache.set(cache_key, result.to_dict())
+
+            logger.debug(f"Chat completion generated successfully. Usage: {result.usage}")
+            return result
+
         except Exception as e:
             logger.error(f"Error generating chat completion: {str(e)}")
             raise
-    
+
+    def chat_completion_many(
+        self,
+        requests: List[Dict[str, Any]],
+        max_concurrency: int = 8,
+    ) -> BatchReport:
+        """Generate many chat completions concurrently.
+
+        Each request is a dictionary of chat_completion keyword arguments. A
+        failing request is captured in its BatchItem instead of aborting the
+        batch.
+
+        Args:
+            requests: chat_completion keyword arguments, one dictionary per call.
+            max_concurrency: Maximum number of requests in flight, unless
+                adaptive_concurrency is set.
+
+        Returns:
+            BatchReport with results in input order, throughput and latency
+            percentiles.
+        """
+        logger.debug(f"Generating {len(requests)} chat completions with max concurrency {max_concurrency}")
+        report = run_many(self.chat_completion, requests, max_concurrency, self.concurrency_limiter)
+        self.metrics.increment("chat_completion_many.failed", report.failed)
+        logger.debug(f"Chat completions generated. Summary: {report.summary()}")
+        return report
+
+    def iter_chat_completion_many(
+        self,
+        requests: List[Dict[str, Any]],
+        max_concurrency: int = 8,
+    ) -> Iterator[BatchItem]:
+        """Generate many chat completions concurrently, yielding them as they complete.
+
+        Args:
+            requests: chat_completion keyword arguments, one dictionary per call.
+            max_concurrency: Maximum number of requests in flight, unless
+                adaptive_concurrency is set.
+
+        Returns:
+            Iterator of BatchItem in completion order; item.index is the
+            position of the request in requests.
+        """
+        return iter_many(self.chat_completion, requests, max_concurrency, self.concurrency_limiter)
+
+    def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        top_p: float = 1.0,
+        frequency_penalty: float = 0.0,
+        presence_penalty: float = 0.0,
+        seed: Optional[int] = None,
+        priority: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> ChatCompletionStream:
+        """Start a streamed chat completion.
+
+        The returned stream yields content deltas as they arrive. Once it is
+        exhausted, its response attribute holds the assembled response in the
+        same shape chat_completion returns (usage included) and its stats
+        attribute the time-to-first-token and tokens/sec, which are also
+        recorded in the client metrics.
+
+        Args:
+            messages: List of message dictionaries (role and content).
+            model: Model name to use for completion.
+            temperature: Sampling temperature between 0 and 2.
+            max_tokens: Maximum number of tokens to generate.
+            top_p: Nucleus sampling parameter.
+            frequency_penalty: Frequency penalty parameter.
+            presence_penalty: Presence penalty parameter.
+            seed: Seed for best-effort deterministic sampling.
+            priority: Priority class (scheduler.Priority) of the request.
+            deadline: Seconds after which the request is dropped with
+                DeadlineExceededError if it has not been sent yet.
+
+        Returns:
+            Iterable stream of content deltas.
+        """
+        logger.debug(f"Streaming chat completion with model: {model}")
+
+        request = _chat_request(
+            messages=_format_messages(messages),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            frequency_penalty=frequency_penalty,
+            presence_penalty=presence_penalty,
+            seed=seed,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        request = self._fit_request(request)
+
+        try:
+            started_at = time.perf_counter()
+
+            def open_stream() -> Any:
+                return self._execute(
+                    "chat_completion_stream",
+                    lambda client: client.chat.completions.create(**request),
+                    model=model,
+                    tokens=estimate_request_tokens(request),
+                )
+
+            with schedule(priority, deadline):
+                if self.hedger is not None:
+                    chunks = self.hedger.run(
+                        "chat_completion_stream",
+                        lambda: read_until_first_token(open_stream()),
+                        "chat_completion.ttft",
+                        discard=lambda losing: losing.close(),
+                    )
+                else:
+                    chunks = open_stream()
+            return ChatCompletionStream(chunks, started_at, self.metrics)
+
+        except Exception as e:
+            logger.error(f"Error starting chat completion stream: {str(e)}")
+            raise
+
+    def _execute(
+        self,
+        operation: str,
+        call: Callable[[OpenAI], T],
+        model: Optional[str] = None,
+        tokens: int = 0,
+    ) -> T:
+        """Run an API call with the client's retry policy and record its latency.
+
+        Args:
+            operation: Operation name used in logs and metric names.
+            call: Function making the SDK call on the SDK client it is given.
+            model: Model the call is for, used for routing, rate limiting and
+                circuit breaking.
+            tokens: Estimated tokens the call consumes, used for rate limiting
+                and choosing an API key.
+
+        Returns:
+            The SDK response.
+
+        Raises:
+            DeadlineExceededError: If the deadline set with schedule() passes
+                before an attempt is sent.
+        """
+        self.metrics.increment(f"{operation}.requests")
+
+        def attempt() -> T:
+            check_deadline()
+            backend = self._choose_backend(model)
+            if backend is not None:
+                client = self.backend_clients[backend.name]
+                send, base_url = partial(self.router.call, backend, partial(call, client)), backend.base_url
+            elif self.key_pool is not None:
+                key = self.key_pool.choose(tokens)
+                client = self.key_clients[key.name]
+                send, base_url = partial(self.key_pool.call, key, tokens, partial(call, client)), self.base_url
+            else:
+                send, base_url = partial(call, self.client), self.base_url
+            if self.concurrency_limiter is not None:
+                send = partial(self.concurrency_limiter.measure, send)
+            if self.rate_limiter is not None and model is not None:
+                send = self._rate_limited(operation, send, model, tokens)
+            if self.circuit_breakers is not None and model is not None:
+                send = partial(self.circuit_breakers.get(model, base_url).call, send)
+            if self.scheduler is not None:
+                send = partial(self.scheduler.run, send)
+            return send()
+
+        started_at = time.perf_counter()
+        try:
+            result = call_with_retry(attempt, self.retry_policy, self.metrics, operation)
+        except DeadlineExceededError:
+            self.metrics.increment(f"{operation}.expired")
+            raise
+        self.metrics.observe(f"{operation}.latency", time.perf_counter() - started_at)
+        return result
+
+    def _rate_limited(self, operation: str, call: Callable[[], T], model: str, tokens: int) -> Callable[[], T]:
+        """Wrap a call so every attempt waits for rate limit capacity first."""
+        def limited() -> T:
+            reservation = self.rate_limiter.acquire(model, tokens)
+            if reservation.waited:
+                self.metrics.observe(f"{operation}.rate_limit_wait", reservation.waited)
+                try:
+                    check_deadline()
+                except DeadlineExceededError:
+                    # Nothing was sent, so give the reserved tokens back
+                    self.rate_limiter.reconcile(reservation, 0)
+                    raise
+            response = call()
+            _reconcile_usage(self.rate_limiter, reservation, response)
+            return response
+
+        return limited
+
+    def _send_chat(
+        self,
+        operation: str,
+        request: Dict[str, Any],
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Send a chat completion request, using the fallback model while the model's circuit is open."""
+        try:
+            return self._send_chat_request(operation, request, return_raw)
+        except CircuitOpenError:
+            fallback = self.fallback_models.get(request["model"])
+            if fallback is None:
+                raise
+            logger.warning(f"Circuit for {request['model']} is open, sending {operation} to {fallback}")
+            self.metrics.increment(f"{operation}.fallbacks")
+            fallback_request = self._fit_request({**request, "model": fallback})
+            return self._send_chat_request(operation, fallback_request, return_raw)
+
+    def _send_chat_request(
+        self,
+        operation: str,
+        request: Dict[str, Any],
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Send a chat completion request and convert the response.
+
+        With fast_parse the raw HTTP body is decoded straight into a ChatResult
+        without building the SDK's models; return_raw always uses the SDK path.
+        """
+        if self.fast_parse and not return_raw:
+            data = self._hedged(operation, lambda: self._execute(
+                operation,
+                lambda client: fast_json.loads(
+                    client.chat.completions.with_raw_response.create(**request).content
+                ),
+                model=request["model"],
+                tokens=estimate_request_tokens(request),
+            ))
+            return ChatResult.from_dict(data)
+
+        response = self._hedged(operation, lambda: self._execute(
+            operation,
+            lambda client: client.chat.completions.create(**request),
+            model=request["model"],
+            tokens=estimate_request_tokens(request),
+        ))
+        return response if return_raw else ChatResult.from_completion(response)
+
+    def _hedged(self, operation: str, call: Callable[[], T]) -> T:
+        """Run call, hedging it on the operation's latency if a hedging policy is set."""
+        if self.hedger is None:
+            return call()
+        return self.hedger.run(operation, call, f"{operation}.latency")
+
+    def _coalesce(self, operation: str, request: Dict[str, Any], call: Callable[[], T]) -> T:
+        """Run call, sharing it with identical in-flight requests if single_flight is set."""
+        if self.single_flight is None:
+            return call()
+        result, shared = self.single_flight.do(request_key(operation, request), call)
+        if shared:
+            self.metrics.increment(f"{operation}.coalesced")
+        return result
+
+    def _create_embeddings(
+        self,
+        model: str,
+        input: Union[str, List[str]],
+        params: Dict[str, Any],
+        tokens: int,
+    ) -> Any:
+        """Send an embeddings request, coalescing it with identical in-flight requests."""
+        return self._coalesce(
+            "embedding",
+            {"model": model, "input": input, **params},
+            lambda: self._execute(
+                "embedding", self._embeddings_call(model, input, params), model=model, tokens=tokens
+            ),
+        )
+
+    def _embeddings_call(
+        self,
+        model: str,
+        input: Union[str, List[str]],
+        params: Dict[str, Any],
+    ) -> Callable[[OpenAI], Any]:
+        """Return a call that creates embeddings on the SDK client it is given.
+
+        With fast_parse the call returns the decoded raw JSON body. Float output
+        is requested explicitly, since the SDK otherwise asks for base64 and
+        decodes it only when building its models.
+        """
+        if self.fast_parse:
+            params = {"encoding_format": "float", **params}
+            return lambda client: fast_json.loads(
+                client.embeddings.with_raw_response.create(model=model, input=input, **params).content
+            )
+        return lambda client: client.embeddings.create(model=model, input=input, **params)
+
+    def _refresh_cached_completion(self, cache_key: str, request: Dict[str, Any]) -> None:
+        """Re-fetch a stale cached completion in the background."""
+        try:
+            result = self._send_chat("chat_completion", request)
+            self.response_cache.set(cache_key, result.to_dict())
+            logger.debug("Stale cached chat completion refreshed")
+        except Exception as e:
+            logger.warning(f"Error refreshing cached chat completion: {str(e)}")
+        finally:
+            self.response_cache.end_refresh(cache_key)
+
     def create_embedding(
         self,
         text: str,
         model: str = "text-embedding-3-large",
-    ) -> List[float]:
+        as_numpy: bool = False,
+    ) -> Union[List[float], "np.ndarray"]:
         """Create an embedding for text.
-        
+
         Args:
             text: Text to embed.
             model: Model name to use for embedding.
-            
+            as_numpy: Request base64 encoding and return a float32 numpy array
+                instead of a list of floats. Requires numpy.
+
         Returns:
-            List of embedding values.
+            List of embedding values, or a 1-D numpy array if as_numpy is True.
         """
         logger.debug(f"Creating embedding with model: {model}")
-        
+
+        params = _embedding_request_params(as_numpy)
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(model, text, as_numpy=as_numpy)
+            if cached is not None:
+                logger.debug("Embedding served from cache")
+                return cached
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.embed(text, model, as_numpy)
+
         try:
-            response = self.client.embeddings.create(
-                model=model,
-                input=text,
-            )
-            
-            embedding = response.data[0].embedding
+            response = self._create_embeddings(model, text, params, estimate_tokens(text))
+
+            embedding = _embeddings_from_response(response)[0]
+            if as_numpy:
+                embedding = _decode_base64_embeddings([embedding])[0]
+            if self.embedding_cache is not None:
+                self.embedding_cache.set(model, text, embedding)
             logger.debug(f"Embedding created successfully. Dimensions: {len(embedding)}")
             return embedding
-        
+
         except Exception as e:
             logger.error(f"Error creating embedding: {str(e)}")
             raise
-    
+
+    def create_embeddings(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-large",
+        max_inputs: int = EMBEDDING_MAX_INPUTS,
+        max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+        max_concurrency: int = 4,
+        as_numpy: bool = False,
+    ) -> Union[List[List[float]], "np.ndarray"]:
+        """Create embeddings for many texts using batched requests.
+
+        Texts are packed into as few requests as the per-request input-count and
+        token limits allow, and the batches are sent concurrently. A batch the
+        API rejects as too large is split in half and retried.
+
+        Args:
+            texts: Texts to embed.
+            model: Model name to use for embedding.
+            max_inputs: Maximum number of inputs per request.
+            max_batch_tokens: Maximum estimated tokens per request.
+            max_concurrency: Maximum number of batches in flight at once,
+                unless adaptive_concurrency is set.
+            as_numpy: Request base64 encoding and return a float32 matrix with
+                one row per text instead of lists of floats. Requires numpy.
+
+        Returns:
+            List of embeddings in the same order as texts, or a 2-D numpy array
+            if as_numpy is True.
+        """
+        params = _embedding_request_params(as_numpy)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32) if as_numpy else []
+
+        cached = self._lookup_cached_embeddings(texts, model, as_numpy)
+        pending = [i for i, embedding in enumerate(cached) if embedding is None]
+        pending_texts = [texts[i] for i in pending]
+        batches = _batch_embedding_inputs(pending_texts, max_inputs, max_batch_tokens)
+        logger.debug(f"Creating {len(pending_texts)} embeddings in {len(batches)} batches with model: {model}")
+
+        try:
+            fetched = []
+            if batches:
+                limiter = self.concurrency_limiter
+                workers = limiter.policy.max_limit if limiter is not None else max_concurrency
+
+                def embed(batch: Tuple[int, int]) -> List[Any]:
+                    with limiter if limiter is not None else nullcontext():
+                        return self._embed_batch(pending_texts[batch[0]:batch[1]], model, params)
+
+                # Each batch runs with the caller's priority and deadline
+                contexts = [contextvars.copy_context() for _ in batches]
+                with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+                    results = executor.map(lambda context, batch: context.run(embed, batch), contexts, batches)
+                    fetched = [embedding for batch in results for embedding in batch]
+
+            embeddings = self._store_fetched_embeddings(cached, pending, pending_texts, fetched, model, as_numpy)
+
+            logger.debug(f"Embeddings created successfully. Count: {len(embeddings)}")
+            return embeddings
+
+        except Exception as e:
+            logger.error(f"Error creating embeddings: {str(e)}")
+            raise
+
+    def _embed_batch(self, batch: List[str], model: str, params: Dict[str, Any]) -> List[Any]:
+        """Embed one batch, splitting it if the API rejects it as too large."""
+        try:
+            response = self._create_embeddings(
+                model, batch, params, sum(estimate_tokens(text) for text in batch)
+            )
+        except BadRequestError as e:
+            if len(batch) == 1 or not _is_batch_too_large(e):
+                raise
+            mid = len(batch) // 2
+            logger.warning(f"Embedding batch of {len(batch)} inputs rejected, splitting in half")
+            return self._embed_batch(batch[:mid], model, params) + self._embed_batch(batch[mid:], model, params)
+        return _embeddings_from_response(response)
+
     def chat_with_image(
         self,
         messages: List[Dict[str, Any]],
@@ -150,85 +1064,803 @@ class OpenAIClient:
         model: str = "gpt-4o-vision-preview",
         temperature: float = 0.7,
         max_tokens: int = 1000,
-    ) -> Dict[str, Any]:
+        preprocess: Optional[ImagePreprocessConfig] = None,
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
         """Generate a chat completion with image input.
-        
+
         Args:
             messages: List of message dictionaries (role and content).
             image_path: Path to the image file.
             model: Model name to use for completion.
             temperature: Sampling temperature between 0 and 2.
             max_tokens: Maximum number of tokens to generate.
-            
+            preprocess: Optional settings to downscale and re-encode the image
+                and pick its detail level before upload (requires Pillow).
+            return_raw: Return the SDK's ChatCompletion object without conversion.
+
+        Returns:
+            ChatResult, or the SDK object when return_raw is set.
+        """
+        return self.chat_with_images(
+            messages=messages,
+            images=[image_path],
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            preprocess=preprocess,
+            return_raw=return_raw,
+        )
+
+    def chat_with_images(
+        self,
+        messages: List[Dict[str, Any]],
+        images: List[ImageSource],
+        model: str = "gpt-4o-vision-preview",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        preprocess: Optional[ImagePreprocessConfig] = None,
+        max_workers: Optional[int] = None,
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Generate a chat completion with several images attached.
+
+        Args:
+            messages: List of message dictionaries (role and content). The
+                images are attached to the last message.
+            images: File paths, bytes or binary file-like objects, in order.
+            model: Model name to use for completion.
+            temperature: Sampling temperature between 0 and 2.
+            max_tokens: Maximum number of tokens to generate.
+            preprocess: Optional settings to downscale and re-encode the images
+                and pick their detail level before upload (requires Pillow).
+            max_workers: Maximum processes used to preprocess the images.
+            return_raw: Return the SDK's ChatCompletion object without conversion.
+
         Returns:
-            Response from the API as a dictionary.
+            ChatResult, or the SDK object when return_raw is set.
         """
-        logger.debug(f"Generating chat completion with image using model: {model}")
-        
+        logger.debug(f"Generating chat completion with {len(images)} images using model: {model}")
+
         try:
-            # Read image file and encode as base64
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
+            # Read the images, detect their format and optionally shrink them
+            prepared = _load_images(images, preprocess, self.image_cache, max_workers)
+
             # Create messages with image content
-            formatted_messages = []
-            
-            # Add previous messages
-            for msg in messages[:-1]:
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-            
-            # Add the last message with the image
-            last_msg = messages[-1]
-            formatted_messages.append({
-                "role": last_msg["role"],
-                "content": [
-                    {"type": "text", "text": last_msg["content"]},
-                    {"type": "image_url", 
-                     "image_url": {
-                         "url": f"data:image/jpeg;base64,{base64_image}",
-                         "detail": "high"
-                     }
-                    }
-                ]
-            })
-            
-            response = self.client.chat.completions.create(
+            formatted_messages = _format_image_messages(messages, prepared)
+
+            request = _chat_request(
                 model=model,
                 messages=formatted_messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
             )
-            
-            # Convert to dictionary for consistent return format
-            response_dict = {
-                "id": response.id,
-                "object": response.object,
-                "created": response.created,
-                "model": response.model,
-                "choices": [
-                    {
-                        "index": choice.index,
-                        "message": {
-                            "role": choice.message.role,
-                            "content": choice.message.content,
-                        },
-                        "finish_reason": choice.finish_reason,
-                    }
-                    for choice in response.choices
-                ],
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens,
-                } if response.usage else None,
-            }
-            
-            logger.debug(f"Chat completion with image generated successfully. Usage: {response_dict['usage']}")
-            return response_dict
-        
+            request = self._fit_request(request)
+            result = self._send_chat("chat_with_image", request, return_raw)
+            if return_raw:
+                return result
+
+            logger.debug(f"Chat completion with images generated successfully. Usage: {result.usage}")
+            return result
+
         except Exception as e:
-            logger.error(f"Error generating chat completion with image: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error(f"Error generating chat completion with images: {str(e)}")
+            raise
+
+    def iter_chat_with_image_directory(
+        self,
+        messages: List[Dict[str, Any]],
+        directory: str,
+        max_concurrency: int = 4,
+        **kwargs: Any,
+    ) -> Iterator[BatchItem]:
+        """Ask the same question about every image in a directory.
+
+        Args:
+            messages: List of message dictionaries; each image is attached to
+                the last message.
+            directory: Directory containing the images (not searched recursively).
+            max_concurrency: Maximum number of requests in flight, unless
+                adaptive_concurrency is set.
+            **kwargs: Further chat_with_image arguments (model, preprocess, ...).
+
+        Returns:
+            Iterator of BatchItem per image in completion order;
+            item.request["image_path"] names the image.
+        """
+        requests = [
+            {"messages": messages, "image_path": path, **kwargs}
+            for path in _list_images(directory)
+        ]
+        logger.debug(f"Running {len(requests)} image requests from {directory}")
+        return iter_many(self.chat_with_image, requests, max_concurrency, self.concurrency_limiter)
+
+
+class AsyncOpenAIClient(_BaseOpenAIClient):
+    """Asynchronous client for interacting with OpenAI API.
+
+    Mirrors OpenAIClient with awaitable methods. A single instance holds one
+    AsyncOpenAI SDK client (and therefore one connection pool), so it can be
+    shared by every task on an event loop.
+    """
+
+    _description = "Async OpenAI client"
+    _single_flight_class = AsyncSingleFlight
+    _scheduler_class = AsyncRequestScheduler
+    _embedding_batcher_class = AsyncEmbeddingBatcher
+    _concurrency_limiter_class = AsyncAdaptiveLimiter
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        """Initialize asynchronous OpenAI client; see _BaseOpenAIClient.__init__ for the arguments."""
+        super().__init__(*args, **kwargs)
+        self._background_tasks: set = set()
+
+    def _sdk_client(
+        self,
+        api_key: str,
+        base_url: Optional[str],
+        organization: Optional[str] = None,
+    ) -> AsyncOpenAI:
+        """Create an SDK client on the shared connection pool for a key and base URL."""
+        return AsyncOpenAI(
+            api_key=api_key,
+            organization=organization,
+            base_url=base_url,
+            max_retries=0,
+            http_client=self.http_pool.async_http_client(api_key, base_url),
+        )
+
+    async def __aenter__(self) -> "AsyncOpenAIClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Wait for background cache refreshes to finish.
+
+        The HTTP connection pools belong to http_pool and are shared with
+        other clients, so they stay open; close them with
+        `await client.http_pool.aclose()` once no client needs them.
+        """
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        top_p: float = 1.0,
+        frequency_penalty: float = 0.0,
+        presence_penalty: float = 0.0,
+        seed: Optional[int] = None,
+        use_cache: bool = True,
+        return_raw: bool = False,
+        priority: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Generate a chat completion response.
+
+        Args:
+            messages: List of message dictionaries (role and content).
+            model: Model name to use for completion.
+            temperature: Sampling temperature between 0 and 2.
+            max_tokens: Maximum number of tokens to generate.
+            top_p: Nucleus sampling parameter.
+            frequency_penalty: Frequency penalty parameter.
+            presence_penalty: Presence penalty parameter.
+            seed: Seed for best-effort deterministic sampling.
+            use_cache: Set to False to bypass the response cache for this call.
+            return_raw: Return the SDK's ChatCompletion object without any
+                conversion. Raw responses bypass the response cache.
+            priority: Priority class (scheduler.Priority) of the request.
+                Defaults to the one set with scheduler.schedule().
+            deadline: Seconds after which the request is dropped with
+                DeadlineExceededError if it has not been sent yet.
+
+        Returns:
+            ChatResult (a read-only mapping in the shape of the API response),
+            or the SDK object when return_raw is set.
+        """
+        logger.debug(f"Generating async chat completion with model: {model}")
+
+        request = _chat_request(
+            messages=_format_messages(messages),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            frequency_penalty=frequency_penalty,
+            presence_penalty=presence_penalty,
+            seed=seed,
+        )
+        request = self._fit_request(request)
+
+        cache_key = None
+        cacheable = use_cache and not return_raw and self.response_cache is not None
+        if cacheable and self.response_cache.should_cache(request):
+            cache_key = self.response_cache.make_key(request)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Async chat completion served from cache")
+                if cached.stale and self.response_cache.begin_refresh(cache_key):
+                    task = asyncio.create_task(self._refresh_cached_completion(cache_key, request))
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
+                return ChatResult.from_dict(cached.response)
+
+        try:
+            with schedule(priority, deadline):
+                if self.single_flight is not None and not return_raw and _is_deterministic(request):
+                    result = await self._coalesce(
+                        "chat_completion", request, lambda: self._send_chat("chat_completion", request)
+                    )
+                else:
+                    result = await self._send_chat("chat_completion", request, return_raw)
+            if return_raw:
+                return result
+            if cache_key is not None:
+                self.response_cache.set(cache_key, result.to_dict())
+
+            logger.debug(f"Async chat completion generated successfully. Usage: {result.usage}")
+            return result
+
+        except Exception as e:
+            logger.error(f"Error generating async chat completion: {str(e)}")
+            raise
+
+    async def chat_completion_many(
+        self,
+        requests: List[Dict[str, Any]],
+        max_concurrency: int = 8,
+    ) -> BatchReport:
+        """Generate many chat completions concurrently.
+
+        Each request is a dictionary of chat_completion keyword arguments. A
+        failing request is captured in its BatchItem instead of aborting the
+        batch.
+
+        Args:
+            requests: chat_completion keyword arguments, one dictionary per call.
+            max_concurrency: Maximum number of requests in flight, unless
+                adaptive_concurrency is set.
+
+        Returns:
+            BatchReport with results in input order, throughput and latency
+            percentiles.
+        """
+        logger.debug(f"Generating {len(requests)} async chat completions with max concurrency {max_concurrency}")
+        report = await arun_many(self.chat_completion, requests, max_concurrency, self.concurrency_limiter)
+        self.metrics.increment("chat_completion_many.failed", report.failed)
+        logger.debug(f"Async chat completions generated. Summary: {report.summary()}")
+        return report
+
+    def iter_chat_completion_many(
+        self,
+        requests: List[Dict[str, Any]],
+        max_concurrency: int = 8,
+    ) -> AsyncIterator[BatchItem]:
+        """Generate many chat completions concurrently, yielding them as they complete.
+
+        Args:
+            requests: chat_completion keyword arguments, one dictionary per call.
+            max_concurrency: Maximum number of requests in flight, unless
+                adaptive_concurrency is set.
+
+        Returns:
+            Async iterator of BatchItem in completion order; item.index is the
+            position of the request in requests.
+        """
+        return aiter_many(self.chat_completion, requests, max_concurrency, self.concurrency_limiter)
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        top_p: float = 1.0,
+        frequency_penalty: float = 0.0,
+        presence_penalty: float = 0.0,
+        seed: Optional[int] = None,
+        priority: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> AsyncChatCompletionStream:
+        """Start a streamed chat completion.
+
+        The returned stream yields content deltas as they arrive. Once it is
+        exhausted, its response attribute holds the assembled response in the
+        same shape chat_completion returns (usage included) and its stats
+        attribute the time-to-first-token and tokens/sec, which are also
+        recorded in the client metrics.
+
+        Args:
+            messages: List of message dictionaries (role and content).
+            model: Model name to use for completion.
+            temperature: Sampling temperature between 0 and 2.
+            max_tokens: Maximum number of tokens to generate.
+            top_p: Nucleus sampling parameter.
+            frequency_penalty: Frequency penalty parameter.
+            presence_penalty: Presence penalty parameter.
+            seed: Seed for best-effort deterministic sampling.
+            priority: Priority class (scheduler.Priority) of the request.
+            deadline: Seconds after which the request is dropped with
+                DeadlineExceededError if it has not been sent yet.
+
+        Returns:
+            Iterable stream of content deltas.
+        """
+        logger.debug(f"Streaming async chat completion with model: {model}")
+
+        request = _chat_request(
+            messages=_format_messages(messages),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            frequency_penalty=frequency_penalty,
+            presence_penalty=presence_penalty,
+            seed=seed,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        request = self._fit_request(request)
+
+        try:
+            started_at = time.perf_counter()
+
+            async def open_stream() -> Any:
+                return await self._execute(
+                    "chat_completion_stream",
+                    lambda client: client.chat.completions.create(**request),
+                    model=model,
+                    tokens=estimate_request_tokens(request),
+                )
+
+            async def open_until_first_token() -> Any:
+                return await aread_until_first_token(await open_stream())
+
+            with schedule(priority, deadline):
+                if self.hedger is not None:
+                    chunks = await self.hedger.arun(
+                        "chat_completion_stream",
+                        open_until_first_token,
+                        "chat_completion.ttft",
+                        discard=lambda losing: losing.close(),
+                    )
+                else:
+                    chunks = await open_stream()
+            return AsyncChatCompletionStream(chunks, started_at, self.metrics)
+
+        except Exception as e:
+            logger.error(f"Error starting async chat completion stream: {str(e)}")
+            raise
+
+    async def _execute(
+        self,
+        operation: str,
+        call: Callable[[AsyncOpenAI], Awaitable[T]],
+        model: Optional[str] = None,
+        tokens: int = 0,
+    ) -> T:
+        """Run an API call with the client's retry policy and record its latency.
+
+        Args:
+            operation: Operation name used in logs and metric names.
+            call: Function returning the SDK call's awaitable for the SDK
+                client it is given.
+            model: Model the call is for, used for routing, rate limiting and
+                circuit breaking.
+            tokens: Estimated tokens the call consumes, used for rate limiting
+                and choosing an API key.
+
+        Returns:
+            The SDK response.
+
+        Raises:
+            DeadlineExceededError: If the deadline set with schedule() passes
+                before an attempt is sent.
+        """
+        self.metrics.increment(f"{operation}.requests")
+
+        async def attempt() -> T:
+            check_deadline()
+            backend = self._choose_backend(model)
+            if backend is not None:
+                client = self.backend_clients[backend.name]
+                send, base_url = partial(self.router.acall, backend, partial(call, client)), backend.base_url
+            elif self.key_pool is not None:
+                key = self.key_pool.choose(tokens)
+                client = self.key_clients[key.name]
+                send, base_url = partial(self.key_pool.acall, key, tokens, partial(call, client)), self.base_url
+            else:
+                send, base_url = partial(call, self.client), self.base_url
+            if self.concurrency_limiter is not None:
+                send = partial(self.concurrency_limiter.measure, send)
+            if self.rate_limiter is not None and model is not None:
+                send = self._rate_limited(operation, send, model, tokens)
+            if self.circuit_breakers is not None and model is not None:
+                send = partial(self.circuit_breakers.get(model, base_url).acall, send)
+            if self.scheduler is not None:
+                send = partial(self.scheduler.run, send)
+            return await send()
+
+        started_at = time.perf_counter()
+        try:
+            result = await acall_with_retry(attempt, self.retry_policy, self.metrics, operation)
+        except DeadlineExceededError:
+            self.metrics.increment(f"{operation}.expired")
+            raise
+        self.metrics.observe(f"{operation}.latency", time.perf_counter() - started_at)
+        return result
+
+    def _rate_limited(
+        self,
+        operation: str,
+        call: Callable[[], Awaitable[T]],
+        model: str,
+        tokens: int,
+    ) -> Callable[[], Awaitable[T]]:
+        """Wrap a call so every attempt waits for rate limit capacity first."""
+        async def limited() -> T:
+            reservation = await self.rate_limiter.acquire_async(model, tokens)
+            if reservation.waited:
+                self.metrics.observe(f"{operation}.rate_limit_wait", reservation.waited)
+                try:
+                    check_deadline()
+                except DeadlineExceededError:
+                    # Nothing was sent, so give the reserved tokens back
+                    self.rate_limiter.reconcile(reservation, 0)
+                    raise
+            response = await call()
+            _reconcile_usage(self.rate_limiter, reservation, response)
+            return response
+
+        return limited
+
+    async def _send_chat(
+        self,
+        operation: str,
+        request: Dict[str, Any],
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Send a chat completion request, using the fallback model while the model's circuit is open."""
+        try:
+            return await self._send_chat_request(operation, request, return_raw)
+        except CircuitOpenError:
+            fallback = self.fallback_models.get(request["model"])
+            if fallback is None:
+                raise
+            logger.warning(f"Circuit for {request['model']} is open, sending {operation} to {fallback}")
+            self.metrics.increment(f"{operation}.fallbacks")
+            fallback_request = self._fit_request({**request, "model": fallback})
+            return await self._send_chat_request(operation, fallback_request, return_raw)
+
+    async def _send_chat_request(
+        self,
+        operation: str,
+        request: Dict[str, Any],
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Send a chat completion request and convert the response.
+
+        With fast_parse the raw HTTP body is decoded straight into a ChatResult
+        without building the SDK's models; return_raw always uses the SDK path.
+        """
+        if self.fast_parse and not return_raw:
+            async def create_raw(client: AsyncOpenAI) -> Dict[str, Any]:
+                raw = await client.chat.completions.with_raw_response.create(**request)
+                return fast_json.loads(raw.content)
+
+            data = await self._hedged(operation, lambda: self._execute(
+                operation,
+                create_raw,
+                model=request["model"],
+                tokens=estimate_request_tokens(request),
+            ))
+            return ChatResult.from_dict(data)
+
+        response = await self._hedged(operation, lambda: self._execute(
+            operation,
+            lambda client: client.chat.completions.create(**request),
+            model=request["model"],
+            tokens=estimate_request_tokens(request),
+        ))
+        return response if return_raw else ChatResult.from_completion(response)
+
+    async def _hedged(self, operation: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Await call, hedging it on the operation's latency if a hedging policy is set."""
+        if self.hedger is None:
+            return await call()
+        return await self.hedger.arun(operation, call, f"{operation}.latency")
+
+    async def _coalesce(self, operation: str, request: Dict[str, Any], call: Callable[[], Awaitable[T]]) -> T:
+        """Await call, sharing it with identical in-flight requests if single_flight is set."""
+        if self.single_flight is None:
+            return await call()
+        result, shared = await self.single_flight.do(request_key(operation, request), call)
+        if shared:
+            self.metrics.increment(f"{operation}.coalesced")
+        return result
+
+    async def _create_embeddings(
+        self,
+        model: str,
+        input: Union[str, List[str]],
+        params: Dict[str, Any],
+        tokens: int,
+    ) -> Any:
+        """Send an embeddings request, coalescing it with identical in-flight requests."""
+        return await self._coalesce(
+            "embedding",
+            {"model": model, "input": input, **params},
+            lambda: self._execute(
+                "embedding", self._embeddings_call(model, input, params), model=model, tokens=tokens
+            ),
+        )
+
+    def _embeddings_call(
+        self,
+        model: str,
+        input: Union[str, List[str]],
+        params: Dict[str, Any],
+    ) -> Callable[[AsyncOpenAI], Awaitable[Any]]:
+        """Return a coroutine function that creates embeddings on the SDK client it is given.
+
+        With fast_parse it returns the decoded raw JSON body. Float output is
+        requested explicitly, since the SDK otherwise asks for base64 and
+        decodes it only when building its models.
+        """
+        if self.fast_parse:
+            params = {"encoding_format": "float", **params}
+
+            async def create_raw(client: AsyncOpenAI) -> Dict[str, Any]:
+                raw = await client.embeddings.with_raw_response.create(model=model, input=input, **params)
+                return fast_json.loads(raw.content)
+
+            return create_raw
+        return lambda client: client.embeddings.create(model=model, input=input, **params)
+
+    async def _refresh_cached_completion(self, cache_key: str, request: Dict[str, Any]) -> None:
+        """Re-fetch a stale cached completion in the background."""
+        try:
+            result = await self._send_chat("chat_completion", request)
+            self.response_cache.set(cache_key, result.to_dict())
+            logger.debug("Stale cached async chat completion refreshed")
+        except Exception as e:
+            logger.warning(f"Error refreshing cached async chat completion: {str(e)}")
+        finally:
+            self.response_cache.end_refresh(cache_key)
+
+    async def create_embedding(
+        self,
+        text: str,
+        model: str = "text-embedding-3-large",
+        as_numpy: bool = False,
+    ) -> Union[List[float], "np.ndarray"]:
+        """Create an embedding for text.
+
+        Args:
+            text: Text to embed.
+            model: Model name to use for embedding.
+            as_numpy: Request base64 encoding and return a float32 numpy array
+                instead of a list of floats. Requires numpy.
+
+        Returns:
+            List of embedding values, or a 1-D numpy array if as_numpy is True.
+        """
+        logger.debug(f"Creating async embedding with model: {model}")
+
+        params = _embedding_request_params(as_numpy)
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(model, text, as_numpy=as_numpy)
+            if cached is not None:
+                logger.debug("Embedding served from cache")
+                return cached
+        if self.embedding_batcher is not None:
+            return await self.embedding_batcher.embed(text, model, as_numpy)
+
+        try:
+            response = await self._create_embeddings(model, text, params, estimate_tokens(text))
+
+            embedding = _embeddings_from_response(response)[0]
+            if as_numpy:
+                embedding = _decode_base64_embeddings([embedding])[0]
+            if self.embedding_cache is not None:
+                self.embedding_cache.set(model, text, embedding)
+            logger.debug(f"Async embedding created successfully. Dimensions: {len(embedding)}")
+            return embedding
+
+        except Exception as e:
+            logger.error(f"Error creating async embedding: {str(e)}")
+            raise
+
+    async def create_embeddings(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-large",
+        max_inputs: int = EMBEDDING_MAX_INPUTS,
+        max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+        max_concurrency: int = 4,
+        as_numpy: bool = False,
+    ) -> Union[List[List[float]], "np.ndarray"]:
+        """Create embeddings for many texts using batched requests.
+
+        Args:
+            texts: Texts to embed.
+            model: Model name to use for embedding.
+            max_inputs: Maximum number of inputs per request.
+            max_batch_tokens: Maximum estimated tokens per request.
+            max_concurrency: Maximum number of batches in flight at once,
+                unless adaptive_concurrency is set.
+            as_numpy: Request base64 encoding and return a float32 matrix with
+                one row per text instead of lists of floats. Requires numpy.
+
+        Returns:
+            List of embeddings in the same order as texts, or a 2-D numpy array
+            if as_numpy is True.
+        """
+        params = _embedding_request_params(as_numpy)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32) if as_numpy else []
+
+        cached = self._lookup_cached_embeddings(texts, model, as_numpy)
+        pending = [i for i, embedding in enumerate(cached) if embedding is None]
+        pending_texts = [texts[i] for i in pending]
+        batches = _batch_embedding_inputs(pending_texts, max_inputs, max_batch_tokens)
+        logger.debug(f"Creating {len(pending_texts)} async embeddings in {len(batches)} batches with model: {model}")
+        semaphore = self.concurrency_limiter or asyncio.Semaphore(max(1, max_concurrency))
+
+        async def embed(batch: Tuple[int, int]) -> List[Any]:
+            async with semaphore:
+                return await self._embed_batch(pending_texts[batch[0]:batch[1]], model, params)
+
+        try:
+            results = await asyncio.gather(*(embed(batch) for batch in batches))
+            fetched = [embedding for batch in results for embedding in batch]
+
+            embeddings = self._store_fetched_embeddings(cached, pending, pending_texts, fetched, model, as_numpy)
+
+            logger.debug(f"Async embeddings created successfully. Count: {len(embeddings)}")
+            return embeddings
+
+        except Exception as e:
+            logger.error(f"Error creating async embeddings: {str(e)}")
+            raise
+
+    async def _embed_batch(self, batch: List[str], model: str, params: Dict[str, Any]) -> List[Any]:
+        """Embed one batch, splitting it if the API rejects it as too large."""
+        try:
+            response = await self._create_embeddings(
+                model, batch, params, sum(estimate_tokens(text) for text in batch)
+            )
+        except BadRequestError as e:
+            if len(batch) == 1 or not _is_batch_too_large(e):
+                raise
+            mid = len(batch) // 2
+            logger.warning(f"Embedding batch of {len(batch)} inputs rejected, splitting in half")
+            first, second = await asyncio.gather(
+                self._embed_batch(batch[:mid], model, params),
+                self._embed_batch(batch[mid:], model, params),
+            )
+            return first + second
+        return _embeddings_from_response(response)
+
+    async def chat_with_image(
+        self,
+        messages: List[Dict[str, Any]],
+        image_path: str,
+        model: str = "gpt-4o-vision-preview",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        preprocess: Optional[ImagePreprocessConfig] = None,
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Generate a chat completion with image input.
+
+        Args:
+            messages: List of message dictionaries (role and content).
+            image_path: Path to the image file.
+            model: Model name to use for completion.
+            temperature: Sampling temperature between 0 and 2.
+            max_tokens: Maximum number of tokens to generate.
+            preprocess: Optional settings to downscale and re-encode the image
+                and pick its detail level before upload (requires Pillow).
+            return_raw: Return the SDK's ChatCompletion object without conversion.
+
+        Returns:
+            ChatResult, or the SDK object when return_raw is set.
+        """
+        return await self.chat_with_images(
+            messages=messages,
+            images=[image_path],
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            preprocess=preprocess,
+            return_raw=return_raw,
+        )
+
+    async def chat_with_images(
+        self,
+        messages: List[Dict[str, Any]],
+        images: List[ImageSource],
+        model: str = "gpt-4o-vision-preview",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        preprocess: Optional[ImagePreprocessConfig] = None,
+        max_workers: Optional[int] = None,
+        return_raw: bool = False,
+    ) -> Union[ChatResult, ChatCompletion]:
+        """Generate a chat completion with several images attached.
+
+        Args:
+            messages: List of message dictionaries (role and content). The
+                images are attached to the last message.
+            images: File paths, bytes or binary file-like objects, in order.
+            model: Model name to use for completion.
+            temperature: Sampling temperature between 0 and 2.
+            max_tokens: Maximum number of tokens to generate.
+            preprocess: Optional settings to downscale and re-encode the images
+                and pick their detail level before upload (requires Pillow).
+            max_workers: Maximum processes used to preprocess the images.
+            return_raw: Return the SDK's ChatCompletion object without conversion.
+
+        Returns:
+            ChatResult, or the SDK object when return_raw is set.
+        """
+        logger.debug(f"Generating async chat completion with {len(images)} images using model: {model}")
+
+        try:
+            # Read and preprocess off the event loop so large files don't block other tasks
+            prepared = await asyncio.to_thread(_load_images, images, preprocess, self.image_cache, max_workers)
+
+            formatted_messages = _format_image_messages(messages, prepared)
+
+            request = _chat_request(
+                model=model,
+                messages=formatted_messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            request = self._fit_request(request)
+            result = await self._send_chat("chat_with_image", request, return_raw)
+            if return_raw:
+                return result
+
+            logger.debug(f"Async chat completion with images generated successfully. Usage: {result.usage}")
+            return result
+
+        except Exception as e:
+            logger.error(f"Error generating async chat completion with images: {str(e)}")
+            raise
+
+    def iter_chat_with_image_directory(
+        self,
+        messages: List[Dict[str, Any]],
+        directory: str,
+        max_concurrency: int = 4,
+        **kwargs: Any,
+    ) -> AsyncIterator[BatchItem]:
+        """Ask the same question about every image in a directory.
+
+        Args:
+            messages: List of message dictionaries; each image is attached to
+                the last message.
+            directory: Directory containing the images (not searched recursively).
+            max_concurrency: Maximum number of requests in flight, unless
+                adaptive_concurrency is set.
+            **kwargs: Further chat_with_image arguments (model, preprocess, ...).
+
+        Returns:
+            Async iterator of BatchItem per image in completion order;
+            item.request["image_path"] names the image.
+        """
+        requests = [
+            {"messages": messages, "image_path": path, **kwargs}
+            for path in _list_images(directory)
+        ]
+        logger.debug(f"Running {len(requests)} async image requests from {directory}")
+        return aiter_many(self.chat_with_image, requests, max_concurrency, self.concurrency_limiter)
@@ -0,0 +1,194 @@
+"""
+Client-side rate limiting for OpenAI API calls.
+
+Each model gets two token buckets, one for requests per minute and one for
+tokens per minute. A request waits until both buckets can cover it, and its
+token estimate is reconciled with the actual usage once the response arrives.
+"""
+
+import time
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Per-model limits. None means unlimited."""
+
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously up to its capacity.
+
+    Not thread-safe on its own; RateLimiter serializes access.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        """Initialize a full bucket.
+
+        Args:
+            capacity: Maximum number of tokens held.
+            refill_per_second: Tokens added per second.
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    @classmethod
+    def per_minute(cls, limit: int) -> "TokenBucket":
+        """Create a bucket allowing limit tokens per minute."""
+        return cls(capacity=limit, refill_per_second=limit / 60.0)
+
+    def refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Return seconds until amount tokens are available (0 if available now)."""
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def take(self, amount: float) -> None:
+        """Remove tokens. The balance may go negative after a reconciliation."""
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        """Return tokens, e.g. when a request used fewer than estimated."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass
+class Reservation:
+    """Capacity taken for one request."""
+
+    model: str
+    tokens: int
+    waited: float = 0.0
+
+
+class RateLimiter:
+    """Dual token-bucket limiter on requests and tokens per minute, per model.
+
+    acquire blocks the calling thread (acquire_async awaits) until both buckets
+    can cover the request instead of letting it be rejected with a 429.
+    """
+
+    def __init__(
+        self,
+        default: Optional[RateLimit] = None,
+        per_model: Optional[Dict[str, RateLimit]] = None,
+    ):
+        """Initialize the limiter.
+
+        Args:
+            default: Limits for models without an explicit entry.
+            per_model: Limits keyed by model name.
+        """
+        self.default = default
+        self.per_model = dict(per_model or {})
+        self._buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, model: str) -> Optional[RateLimit]:
+        """Return the limits that apply to a model."""
+        return self.per_model.get(model, self.default)
+
+    def _buckets_for(self, model: str) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            limit = self.limit_for(model) or RateLimit()
+            buckets = (
+                TokenBucket.per_minute(limit.requests_per_minute) if limit.requests_per_minute else None,
+                TokenBucket.per_minute(limit.tokens_per_minute) if limit.tokens_per_minute else None,
+            )
+            self._buckets[model] = buckets
+        return buckets
+
+    def _try_acquire(self, model: str, tokens: int) -> float:
+        """Take capacity if both buckets allow it, otherwise return the wait time."""
+        with self._lock:
+            request_bucket, token_bucket = self._buckets_for(model)
+            wait = max(
+                request_bucket.wait_time(1) if request_bucket else 0.0,
+                token_bucket.wait_time(tokens) if token_bucket else 0.0,
+            )
+            if wait > 0:
+                return wait
+            if request_bucket:
+                request_bucket.take(1)
+            if token_bucket:
+                token_bucket.take(tokens)
+            return 0.0
+
+    def acquire(self, model: str, tokens: int = 0) -> Reservation:
+        """Block until a request of the given size may be sent.
+
+        Args:
+            model: Model the request is for.
+            tokens: Estimated tokens the request will consume.
+
+        Returns:
+            Reservation to pass to reconcile once the actual usage is known.
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(model, tokens)
+            if wait == 0:
+                break
+            logger.debug(f"Rate limit reached for {model}, waiting {wait:.2f}s")
+            time.sleep(wait)
+            waited += wait
+        return Reservation(model=model, tokens=tokens, waited=waited)
+
+    async def acquire_async(self, model: str, tokens: int = 0) -> Reservation:
+        """Wait without blocking the event loop until a request may be sent.
+
+        Args:
+            model: Model the request is for.
+            tokens: Estimated tokens the request will consume.
+
+        Returns:
+            Reservation to pass to reconcile once the actual usage is known.
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(model, tokens)
+            if wait == 0:
+                break
+            logger.debug(f"Rate limit reached for {model}, waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+            waited += wait
+        return Reservation(model=model, tokens=tokens, waited=waited)
+
+    def reconcile(self, reservation: Reservation, actual_tokens: int) -> None:
+        """Correct the token bucket with the usage reported by the API.
+
+        Args:
+            reservation: Reservation returned by acquire.
+            actual_tokens: Total tokens the request actually consumed.
+        """
+        difference = reservation.tokens - actual_tokens
+        if difference == 0:
+            return
+        with self._lock:
+            _, token_bucket = self._buckets_for(reservation.model)
+            if token_bucket is None:
+                return
+            if difference > 0:
+                token_bucket.give(difference)
+            else:
+                token_bucket.take(-difference)
@@ -0,0 +1,168 @@
+"""
+Compact result objects for chat completions.
+
+ChatResult and its parts use __slots__ instead of a per-instance __dict__ and
+are built once from the SDK response by ChatResult.from_completion. They are
+also read-only mappings, so code written against the previous dictionary
+responses (result["choices"][0]["message"]["content"]) keeps working. They
+are not dicts, though: json.dumps() rejects them, so serialize to_dict().
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class _ResultView(Mapping):
+    """Read-only mapping view over the slots named in _fields."""
+
+    __slots__ = ()
+    _fields: tuple = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a plain (JSON-serializable) dictionary copy."""
+        return {name: _plain(getattr(self, name)) for name in self._fields}
+
+
+def _plain(value: Any) -> Any:
+    """Convert result views (and lists of them) to plain dictionaries."""
+    if isinstance(value, _ResultView):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+class Usage(_ResultView):
+    """Token usage of a completion."""
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "total_tokens")
+    _fields = __slots__
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int, total_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = total_tokens
+
+
+class ChatMessage(_ResultView):
+    """A generated message."""
+
+    __slots__ = ("role", "content")
+    _fields = __slots__
+
+    def __init__(self, role: str, content: Optional[str]):
+        self.role = role
+        self.content = content
+
+
+class Choice(_ResultView):
+    """One generated alternative."""
+
+    __slots__ = ("index", "message", "finish_reason")
+    _fields = __slots__
+
+    def __init__(self, index: int, message: ChatMessage, finish_reason: Optional[str]):
+        self.index = index
+        self.message = message
+        self.finish_reason = finish_reason
+
+
+class ChatResult(_ResultView):
+    """A chat completion response."""
+
+    __slots__ = ("id", "object", "created", "model", "choices", "usage")
+    _fields = __slots__
+
+    def __init__(
+        self,
+        id: str,
+        object: str,
+        created: int,
+        model: str,
+        choices: List[Choice],
+        usage: Optional[Usage],
+    ):
+        self.id = id
+        self.object = object
+        self.created = created
+        self.model = model
+        self.choices = choices
+        self.usage = usage
+
+    @property
+    def content(self) -> Optional[str]:
+        """Content of the first choice's message."""
+        return self.choices[0].message.content if self.choices else None
+
+    @classmethod
+    def from_completion(cls, response: Any) -> "ChatResult":
+        """Build a result from an SDK ChatCompletion object.
+
+        Args:
+            response: ChatCompletion object returned by the SDK.
+
+        Returns:
+            ChatResult.
+        """
+        usage = response.usage
+        return cls(
+            id=response.id,
+            object=response.object,
+            created=response.created,
+            model=response.model,
+            choices=[
+                Choice(
+                    choice.index,
+                    ChatMessage(choice.message.role, choice.message.content),
+                    choice.finish_reason,
+                )
+                for choice in response.choices
+            ],
+            usage=Usage(usage.prompt_tokens, usage.completion_tokens, usage.total_tokens) if usage else None,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChatResult":
+        """Build a result from a response dictionary (e.g. a cached response).
+
+        Args:
+            data: Response dictionary in the shape produced by to_dict.
+
+        Returns:
+            ChatResult.
+        """
+        usage = data.get("usage")
+        return cls(
+            id=data["id"],
+            object=data["object"],
+            created=data["created"],
+            model=data["model"],
+            choices=[
+                Choice(
+                    choice["index"],
+                    ChatMessage(choice["message"]["role"], choice["message"]["content"]),
+                    choice["finish_reason"],
+                )
+                for choice in data["choices"]
+            ],
+            usage=Usage(
+                usage["prompt_tokens"],
+                usage["completion_tokens"],
+                usage["total_tokens"],
+            ) if usage else None,
+        )
@@ -0,0 +1,247 @@
+"""
+Retry policy for OpenAI API calls.
+
+Retries transient failures (rate limits, server errors, timeouts and connection
+errors) with full-jitter exponential backoff, honoring the server's
+Retry-After and x-ratelimit-reset-* headers when present.
+"""
+
+import re
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, InternalServerError, RateLimitError
+
+from logger import get_logger
+from metrics import ClientMetrics
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse an x-ratelimit-reset-* value such as "1s", "6m0s" or "20ms".
+
+    Args:
+        value: Header value.
+
+    Returns:
+        Duration in seconds, or None if the value cannot be parsed.
+    """
+    parts = _DURATION_PART.findall(value.strip())
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_from_headers(headers: Any) -> Optional[float]:
+    """Return how long the server asked us to wait, in seconds.
+
+    Checks retry-after-ms, retry-after (seconds or an HTTP date) and the
+    x-ratelimit-reset-requests / x-ratelimit-reset-tokens headers, in that order.
+
+    Args:
+        headers: Response headers (case-insensitive mapping).
+
+    Returns:
+        Delay in seconds, or None if no usable header is present.
+    """
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    resets = [
+        parse_reset_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+@dataclass
+class RetryPolicy:
+    """Configuration for retrying failed API calls.
+
+    Attributes:
+        max_attempts: Maximum number of attempts, including the first one.
+        base_delay: Backoff base in seconds; attempt n waits up to base_delay * 2**n.
+        max_delay: Upper bound on a single backoff delay in seconds.
+        deadline: Total seconds allowed across all attempts, or None.
+        retry_on: Exception classes that are always retried.
+        max_attempts_by_error: Per exception class overrides of max_attempts.
+        respect_retry_after: Wait at least as long as the server's Retry-After
+            or x-ratelimit-reset-* headers ask for.
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    deadline: Optional[float] = 120.0
+    retry_on: Tuple[Type[BaseException], ...] = (
+        RateLimitError,
+        InternalServerError,
+        APITimeoutError,
+        APIConnectionError,
+    )
+    max_attempts_by_error: Dict[Type[BaseException], int] = field(default_factory=dict)
+    respect_retry_after: bool = True
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Return whether an error is worth retrying."""
+        if isinstance(error, self.retry_on):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+    def max_attempts_for(self, error: BaseException) -> int:
+        """Return the attempt limit for an error, honoring per-class overrides."""
+        for error_class in type(error).__mro__:
+            if error_class in self.max_attempts_by_error:
+                return self.max_attempts_by_error[error_class]
+        return self.max_attempts
+
+    def compute_delay(self, attempt: int, error: BaseException) -> float:
+        """Return the delay before the next attempt.
+
+        Args:
+            attempt: Number of attempts made so far (1 after the first failure).
+            error: The error that caused the retry.
+
+        Returns:
+            Delay in seconds.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if self.respect_retry_after:
+            response = getattr(error, "response", None)
+            server_delay = retry_after_from_headers(getattr(response, "headers", None))
+            if server_delay is not None:
+                delay = max(delay, min(server_delay, self.max_delay))
+        return delay
+
+    def next_delay(self, attempt: int, error: BaseException, started_at: float) -> Optional[float]:
+        """Return the delay before retrying, or None if the call should fail.
+
+        Args:
+            attempt: Number of attempts made so far.
+            error: The error raised by the last attempt.
+            started_at: time.monotonic() value when the first attempt started.
+
+        Returns:
+            Delay in seconds, or None when the error is not retryable, the
+            attempt limit is reached or the delay would exceed the deadline.
+        """
+        if not self.is_retryable(error) or attempt >= self.max_attempts_for(error):
+            return None
+        delay = self.compute_delay(attempt, error)
+        if self.deadline is not None and time.monotonic() - started_at + delay > self.deadline:
+            return None
+        return delay
+
+
+def _record_retry(
+    metrics: Optional[ClientMetrics],
+    operation: str,
+    error: BaseException,
+    attempt: int,
+    delay: Optional[float],
+) -> None:
+    """Log and count a retry decision."""
+    if delay is None:
+        if metrics is not None and attempt > 1:
+            metrics.increment(f"{operation}.retries_exhausted")
+        return
+    logger.warning(
+        f"{operation} attempt {attempt} failed with {type(error).__name__}: {str(error)}. "
+        f"Retrying in {delay:.2f}s"
+    )
+    if metrics is not None:
+        metrics.increment(f"{operation}.retries")
+        metrics.increment(f"retries.{type(error).__name__}")
+
+
+def call_with_retry(
+    call: Callable[[], T],
+    policy: RetryPolicy,
+    metrics: Optional[ClientMetrics] = None,
+    operation: str = "request",
+) -> T:
+    """Call a function, retrying according to a policy.
+
+    Args:
+        call: Zero-argument function making the API call.
+        policy: Retry policy to apply.
+        metrics: Optional metrics to count retries in.
+        operation: Name used in logs and metric names.
+
+    Returns:
+        The value returned by call.
+    """
+    started_at = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return call()
+        except Exception as e:
+            delay = policy.next_delay(attempt, e, started_at)
+            _record_retry(metrics, operation, e, attempt, delay)
+            if delay is None:
+                raise
+        time.sleep(delay)
+
+
+async def acall_with_retry(
+    call: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    metrics: Optional[ClientMetrics] = None,
+    operation: str = "request",
+) -> T:
+    """Await a coroutine function, retrying according to a policy.
+
+    Args:
+        call: Zero-argument function returning an awaitable API call.
+        policy: Retry policy to apply.
+        metrics: Optional metrics to count retries in.
+        operation: Name used in logs and metric names.
+
+    Returns:
+        The value produced by call.
+    """
+    started_at = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await call()
+        except Exception as e:
+            delay = policy.next_delay(attempt, e, started_at)
+            _record_retry(metrics, operation, e, attempt, delay)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
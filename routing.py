@@ -0,0 +1,266 @@
+"""
+Latency-aware routing across OpenAI-compatible backends.
+
+A BackendRouter spreads requests over several backends serving the same API
+(Azure OpenAI v1 endpoints, regions, self-hosted servers). Each request picks
+two random healthy backends and goes to the one with the lower cost, where
+cost is the backend's EWMA latency times its requests in flight plus one
+("power of two choices"). Backends failing several times in a row are
+drained for a while and then given traffic again.
+
+Per-backend state is published in the client metrics: "routing.<name>.requests"
+and "routing.<name>.drained" counters, and "routing.<name>.latency" (EWMA in
+seconds) and "routing.<name>.in_flight" gauges.
+"""
+
+import time
+import random
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Sequence, TypeVar
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+from logger import get_logger
+from metrics import ClientMetrics
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Backend:
+    """An OpenAI-compatible endpoint.
+
+    Attributes:
+        name: Unique name used in logs and metric names.
+        base_url: API base URL, or None for the SDK default.
+        api_key: API key for this backend. Defaults to the client's key.
+        models: Models the backend serves, or None for any model.
+    """
+
+    name: str
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    models: Optional[FrozenSet[str]] = None
+
+    def __post_init__(self) -> None:
+        if self.models is not None:
+            object.__setattr__(self, "models", frozenset(self.models))
+
+    def serves(self, model: Optional[str]) -> bool:
+        """Return whether requests for model can be sent to this backend."""
+        return self.models is None or model is None or model in self.models
+
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    """How backends are scored and when they are drained.
+
+    Attributes:
+        ewma_alpha: Weight of the newest latency in the moving average.
+        failure_threshold: Consecutive failures after which a backend is
+            drained.
+        drain_duration: Seconds a drained backend receives no traffic.
+    """
+
+    ewma_alpha: float = 0.3
+    failure_threshold: int = 3
+    drain_duration: float = 30.0
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Return whether an error counts against the backend that raised it.
+
+    Timeouts, connection errors, rate limits and 5xx responses do; errors
+    caused by the request itself (e.g. bad requests) do not.
+    """
+    if isinstance(error, (APITimeoutError, APIConnectionError, RateLimitError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class _BackendState:
+    """Mutable routing state of one backend, guarded by the router's lock."""
+
+    __slots__ = ("latency", "in_flight", "failures", "drained_until")
+
+    def __init__(self) -> None:
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.failures = 0
+        self.drained_until = 0.0
+
+
+class BackendRouter:
+    """Routes requests to backends by EWMA latency and requests in flight.
+
+    Example:
+        router = BackendRouter([
+            Backend("east", "https://east.example.com/v1"),
+            Backend("west", "https://west.example.com/v1"),
+        ])
+        client = OpenAIClient(router=router)
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[Backend],
+        policy: Optional[RoutingPolicy] = None,
+        metrics: Optional[ClientMetrics] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        """Initialize the router.
+
+        Args:
+            backends: Backends to route between; names must be unique.
+            policy: Scoring and draining settings. Defaults to RoutingPolicy().
+            metrics: Metrics backend state is published in. Clients set this
+                to their own metrics if it is None.
+            rng: Random generator used to sample backends.
+
+        Raises:
+            ValueError: If no backends are given or names repeat.
+        """
+        if not backends:
+            raise ValueError("At least one backend is required")
+        names = [backend.name for backend in backends]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Backend names must be unique, got {names}")
+        self.backends = list(backends)
+        self.policy = policy if policy is not None else RoutingPolicy()
+        self.metrics = metrics
+        self._rng = rng if rng is not None else random.Random()
+        self._states = {backend.name: _BackendState() for backend in self.backends}
+        self._lock = threading.Lock()
+
+    def choose(self, model: Optional[str] = None, skip: Optional[Callable[[Backend], bool]] = None) -> Backend:
+        """Pick the backend for one request.
+
+        Drained backends, and those for which skip returns True, are avoided.
+        If every allowed backend is drained, one of them is still preferred
+        over a skipped one; skipped backends are only used when nothing else
+        serves the model.
+
+        Args:
+            model: Model the request is for.
+            skip: Optional predicate marking backends not to use right now,
+                e.g. because their circuit is open.
+
+        Returns:
+            The cheaper of two randomly sampled candidates.
+
+        Raises:
+            ValueError: If no backend serves the model.
+        """
+        serving = [backend for backend in self.backends if backend.serves(model)]
+        if not serving:
+            raise ValueError(f"No backend serves model {model}")
+        allowed = [backend for backend in serving if skip is None or not skip(backend)]
+        now = time.monotonic()
+        with self._lock:
+            candidates = [backend for backend in allowed if self._states[backend.name].drained_until <= now]
+            # A drained backend may still answer; a skipped one (open circuit) will not
+            candidates = candidates or allowed or serving
+            if len(candidates) == 1:
+                return candidates[0]
+            first, second = self._rng.sample(candidates, 2)
+            default_latency = min(
+                (state.latency for state in self._states.values() if state.latency is not None), default=1.0
+            )
+            if self._cost(second, default_latency) < self._cost(first, default_latency):
+                return second
+            return first
+
+    def call(self, backend: Backend, call: Callable[[], T]) -> T:
+        """Run call against backend, recording its latency and outcome."""
+        self._start(backend)
+        started_at = time.perf_counter()
+        try:
+            result = call()
+        except Exception as e:
+            self._finish(backend, time.perf_counter() - started_at, e)
+            raise
+        self._finish(backend, time.perf_counter() - started_at)
+        return result
+
+    async def acall(self, backend: Backend, call: Callable[[], Awaitable[T]]) -> T:
+        """Await call against backend, recording its latency and outcome."""
+        self._start(backend)
+        started_at = time.perf_counter()
+        try:
+            result = await call()
+        except BaseException as e:
+            self._finish(backend, time.perf_counter() - started_at, e)
+            raise
+        self._finish(backend, time.perf_counter() - started_at)
+        return result
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return the routing state of every backend by name."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "latency": state.latency,
+                    "in_flight": state.in_flight,
+                    "failures": state.failures,
+                    "healthy": state.drained_until <= now,
+                }
+                for name, state in self._states.items()
+            }
+
+    def _cost(self, backend: Backend, default_latency: float) -> float:
+        """Return a backend's expected latency scaled by its load.
+
+        Backends without a measurement yet are scored with the best measured
+        latency so they are tried soon.
+        """
+        state = self._states[backend.name]
+        latency = state.latency if state.latency is not None else default_latency
+        return latency * (state.in_flight + 1)
+
+    def _start(self, backend: Backend) -> None:
+        with self._lock:
+            state = self._states[backend.name]
+            state.in_flight += 1
+            in_flight = state.in_flight
+        if self.metrics is not None:
+            self.metrics.increment(f"routing.{backend.name}.requests")
+            self.metrics.set_gauge(f"routing.{backend.name}.in_flight", in_flight)
+
+    def _finish(self, backend: Backend, latency: float, error: Optional[BaseException] = None) -> None:
+        failed = error is not None and is_backend_failure(error)
+        drained = False
+        with self._lock:
+            state = self._states[backend.name]
+            state.in_flight -= 1
+            in_flight = state.in_flight
+            if failed and state.latency is not None:
+                # Fast failures must not make a backend look faster
+                latency = max(latency, state.latency)
+            if error is None or failed:
+                alpha = self.policy.ewma_alpha
+                state.latency = latency if state.latency is None else alpha * latency + (1 - alpha) * state.latency
+            if failed:
+                state.failures += 1
+                if state.failures >= self.policy.failure_threshold:
+                    state.drained_until = time.monotonic() + self.policy.drain_duration
+                    state.failures = 0
+                    drained = True
+            elif error is None:
+                state.failures = 0
+            ewma = state.latency
+
+        if drained:
+            logger.warning(
+                f"Draining backend {backend.name} for {self.policy.drain_duration:.0f}s "
+                f"after {self.policy.failure_threshold} consecutive failures"
+            )
+        if self.metrics is not None:
+            self.metrics.set_gauge(f"routing.{backend.name}.in_flight", in_flight)
+            if ewma is not None:
+                self.metrics.set_gauge(f"routing.{backend.name}.latency", ewma)
+            if drained:
+                self.metrics.increment(f"routing.{backend.name}.drained")
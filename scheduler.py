@@ -0,0 +1,287 @@
+"""
+Priority lanes and deadline-aware scheduling of requests.
+
+Interactive traffic and bulk backfills often share one client. Without
+scheduling, a backfill burst takes every connection and all rate limit
+capacity and user requests wait behind it. A RequestScheduler caps the
+attempts in flight and, whenever a slot frees up, hands it to the waiting
+request with the most urgent priority, earliest deadline first within a
+priority and first come first served among equals.
+
+Priority and deadline are set for a block of code with schedule() (or the
+priority and deadline arguments of chat_completion) and apply to every
+request made inside it, including fan-out calls:
+
+    with schedule(Priority.BULK):
+        client.chat_completion_many(backfill)
+
+    client.chat_completion(messages, priority=Priority.INTERACTIVE, deadline=5.0)
+
+A request whose deadline passes while it waits is dropped with
+DeadlineExceededError instead of spending rate limit quota on an answer
+nobody waits for any more. Deadlines are checked before every attempt, so
+they apply to retries as well, with or without a scheduler.
+
+Time spent queued is observed as "scheduler.<lane>.wait" and dropped
+requests are counted in "scheduler.<lane>.expired".
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from enum import IntEnum
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple, TypeVar
+
+from logger import get_logger
+from metrics import ClientMetrics
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """Request priority classes; lower values are served first."""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BULK = 2
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised instead of sending a request whose deadline has passed."""
+
+    def __init__(self, late_by: float):
+        self.late_by = late_by
+        super().__init__(f"Request deadline passed {late_by:.3f}s ago; not sending it")
+
+
+# (priority, absolute time.monotonic() deadline or None) of the current context
+_schedule: ContextVar[Tuple[int, Optional[float]]] = ContextVar(
+    "request_schedule", default=(Priority.NORMAL, None)
+)
+
+
+@contextmanager
+def schedule(priority: Optional[int] = None, deadline: Optional[float] = None) -> Iterator[None]:
+    """Set the priority and deadline of the requests made inside the block.
+
+    Nested blocks override the priority, and can only shorten the deadline.
+
+    Args:
+        priority: Priority class of the requests, or None to keep the
+            enclosing one (Priority.NORMAL by default).
+        deadline: Seconds from now after which requests that have not been
+            sent yet are dropped, or None for no (additional) deadline.
+    """
+    outer_priority, outer_deadline = _schedule.get()
+    absolute = time.monotonic() + deadline if deadline is not None else None
+    if outer_deadline is not None and (absolute is None or outer_deadline < absolute):
+        absolute = outer_deadline
+    token = _schedule.set((outer_priority if priority is None else priority, absolute))
+    try:
+        yield
+    finally:
+        _schedule.reset(token)
+
+
+def current_schedule() -> Tuple[int, Optional[float]]:
+    """Return the priority and absolute time.monotonic() deadline in effect."""
+    return _schedule.get()
+
+
+def check_deadline() -> None:
+    """Raise DeadlineExceededError if the current deadline has passed."""
+    deadline = _schedule.get()[1]
+    if deadline is not None:
+        late_by = time.monotonic() - deadline
+        if late_by >= 0:
+            raise DeadlineExceededError(late_by)
+
+
+def _lane(priority: int) -> str:
+    """Return the name of a priority class used in metric names."""
+    try:
+        return Priority(priority).name.lower()
+    except ValueError:
+        return f"priority_{priority}"
+
+
+class _Scheduler:
+    """Queue bookkeeping shared by the sync and async schedulers.
+
+    Queue entries are (priority, deadline, sequence) tuples, so the heap
+    orders them by priority, then earliest deadline, then arrival.
+    """
+
+    def __init__(self, max_in_flight: int = 8, metrics: Optional[ClientMetrics] = None):
+        """Initialize the scheduler.
+
+        Args:
+            max_in_flight: Attempts allowed in flight at once. Keep it small
+                enough that requests queue here rather than in the rate
+                limiter, or priorities have nothing to reorder.
+            metrics: Metrics queue waits and dropped requests are recorded
+                in. Clients set this to their own metrics if it is None.
+
+        Raises:
+            ValueError: If max_in_flight is less than 1.
+        """
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+        self.max_in_flight = max_in_flight
+        self.metrics = metrics
+        self._queue: List[Tuple[int, float, int]] = []
+        self._in_flight = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        """Attempts currently holding a slot."""
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a slot."""
+        return len(self._queue)
+
+    def _enqueue(self) -> Tuple[Tuple[int, float, int], Optional[float]]:
+        """Queue a request of the current context; called with the lock held."""
+        priority, deadline = _schedule.get()
+        entry = (priority, deadline if deadline is not None else float("inf"), next(self._sequence))
+        heapq.heappush(self._queue, entry)
+        return entry, deadline
+
+    def _may_start(self, entry: Tuple[int, float, int]) -> bool:
+        return self._queue[0] is entry and self._in_flight < self.max_in_flight
+
+    def _dequeue(self, entry: Tuple[int, float, int]) -> None:
+        if self._queue[0] is entry:
+            heapq.heappop(self._queue)
+        else:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+
+    def _record(self, priority: int, waited: float, expired: bool) -> None:
+        if expired:
+            logger.warning(f"Dropping {_lane(priority)} request: deadline passed after {waited:.3f}s in queue")
+        if self.metrics is not None:
+            self.metrics.observe(f"scheduler.{_lane(priority)}.wait", waited)
+            if expired:
+                self.metrics.increment(f"scheduler.{_lane(priority)}.expired")
+
+
+class RequestScheduler(_Scheduler):
+    """Thread-safe scheduler handing out attempt slots by priority and deadline.
+
+    Example:
+        client = OpenAIClient(scheduler=RequestScheduler(max_in_flight=8))
+        with schedule(Priority.BULK):
+            client.create_embeddings(corpus)
+    """
+
+    def __init__(self, max_in_flight: int = 8, metrics: Optional[ClientMetrics] = None):
+        super().__init__(max_in_flight, metrics)
+        self._condition = threading.Condition(self._lock)
+
+    def run(self, call: Callable[[], T]) -> T:
+        """Wait for a slot in priority order, then run call holding it.
+
+        Raises:
+            DeadlineExceededError: If the deadline passes before a slot is
+                free; call is not run.
+        """
+        queued_at = time.monotonic()
+        with self._condition:
+            entry, deadline = self._enqueue()
+            while not self._may_start(entry):
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            self._dequeue(entry)
+            now = time.monotonic()
+            expired = deadline is not None and now >= deadline
+            if not expired:
+                self._in_flight += 1
+            # The new head of the queue may be able to start as well
+            self._condition.notify_all()
+
+        self._record(entry[0], now - queued_at, expired)
+        if expired:
+            raise DeadlineExceededError(now - deadline)
+        try:
+            return call()
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+
+class AsyncRequestScheduler(_Scheduler):
+    """Scheduler handing out attempt slots to coroutines running in one event loop."""
+
+    def __init__(self, max_in_flight: int = 8, metrics: Optional[ClientMetrics] = None):
+        super().__init__(max_in_flight, metrics)
+        self._waiters: List[asyncio.Future] = []
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Wait for a slot in priority order, then await call holding it.
+
+        Raises:
+            DeadlineExceededError: If the deadline passes before a slot is
+                free; call is not awaited.
+        """
+        queued_at = time.monotonic()
+        with self._lock:
+            entry, deadline = self._enqueue()
+        try:
+            while True:
+                with self._lock:
+                    if self._may_start(entry):
+                        break
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        break
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Cancelled while queued: give up the place without taking a slot
+            with self._lock:
+                self._dequeue(entry)
+                self._notify()
+            raise
+
+        with self._lock:
+            self._dequeue(entry)
+            now = time.monotonic()
+            expired = deadline is not None and now >= deadline
+            if not expired:
+                self._in_flight += 1
+            self._notify()
+
+        self._record(entry[0], now - queued_at, expired)
+        if expired:
+            raise DeadlineExceededError(now - deadline)
+        try:
+            return await call()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._notify()
+
+    def _notify(self) -> None:
+        # Waiters re-check whether they are at the head, so waking all of them is safe
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
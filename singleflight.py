@@ -0,0 +1,188 @@
+"""
+Request coalescing for identical in-flight calls.
+
+When several callers make the same request at the same moment, only the
+first (the leader) calls the API; the others wait for its result and receive
+the same response (or exception). Nothing is kept once the call completes, so
+this only deduplicates calls that overlap in time; use a cache for repeats.
+"""
+
+import json
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(operation: str, request: Dict[str, Any]) -> str:
+    """Build the key identifying a request.
+
+    Args:
+        operation: Operation name, so different endpoints never share a key.
+        request: Keyword arguments of the request.
+
+    Returns:
+        Hex digest identifying the request.
+    """
+    canonical = json.dumps(
+        [operation, request], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SingleFlightStats:
+    """Counters for a single-flight group."""
+
+    calls: int = 0
+    shared: int = 0
+
+    @property
+    def saved_rate(self) -> float:
+        """Fraction of requests served by another caller's call."""
+        total = self.calls + self.shared
+        return self.shared / total if total else 0.0
+
+
+class _Call:
+    """An in-flight call and the outcome its waiters receive."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Thread-safe coalescing of identical concurrent calls.
+
+    Example:
+        group = SingleFlight()
+        response, shared = group.do(key, lambda: client.embeddings.create(...))
+    """
+
+    def __init__(self):
+        self.stats = SingleFlightStats()
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of calls currently in flight."""
+        return len(self._calls)
+
+    def do(self, key: str, call: Callable[[], T]) -> Tuple[T, bool]:
+        """Run call, or wait for the in-flight call with the same key.
+
+        Args:
+            key: Identifies the request, e.g. from request_key.
+            call: Zero-argument function making the request.
+
+        Returns:
+            (result, shared) where shared is True if the result came from
+            another caller's call.
+
+        Raises:
+            Exception: Whatever the leader's call raised.
+        """
+        with self._lock:
+            pending = self._calls.get(key)
+            if pending is None:
+                pending = self._calls[key] = _Call()
+                self.stats.calls += 1
+                leader = True
+            else:
+                self.stats.shared += 1
+                leader = False
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result, True
+
+        try:
+            pending.result = call()
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            pending.done.set()
+        return pending.result, False
+
+
+class _AsyncCall:
+    """A shared call running in its own task and the number of callers awaiting it."""
+
+    __slots__ = ("task", "callers")
+
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.callers = 0
+
+
+class AsyncSingleFlight:
+    """Coalescing of identical concurrent coroutine calls within an event loop.
+
+    The shared call runs in its own task, so cancelling any caller, the
+    leader included, leaves the others waiting for the result. The call is
+    cancelled only once every caller has been cancelled.
+    """
+
+    def __init__(self):
+        self.stats = SingleFlightStats()
+        self._calls: Dict[str, _AsyncCall] = {}
+
+    def __len__(self) -> int:
+        """Number of calls currently in flight."""
+        return len(self._calls)
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Await call, or wait for the in-flight call with the same key.
+
+        Args:
+            key: Identifies the request, e.g. from request_key.
+            call: Zero-argument function returning the request's awaitable.
+
+        Returns:
+            (result, shared) where shared is True if the result came from
+            another caller's call.
+
+        Raises:
+            Exception: Whatever the shared call raised.
+        """
+        flight = self._calls.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self._calls[key] = _AsyncCall(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(partial(self._finished, key, flight))
+            self.stats.calls += 1
+        else:
+            self.stats.shared += 1
+
+        flight.callers += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.callers -= 1
+            if flight.callers == 0 and not flight.task.done():
+                # Every caller was cancelled; nobody needs the result any more
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    def _finished(self, key: str, flight: _AsyncCall, task: "asyncio.Future") -> None:
+        self._forget(key, flight)
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller was cancelled
+            task.exception()
+
+    def _forget(self, key: str, flight: _AsyncCall) -> None:
+        if self._calls.get(key) is flight:
+            del self._calls[key]
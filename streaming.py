@@ -0,0 +1,325 @@
+"""
+Streaming chat completion wrappers.
+
+Wrap the SDK's chunk streams, yield content deltas as they arrive, assemble the
+final response (the same ChatResult chat_completion returns) and
+record time-to-first-token and generation throughput.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from logger import get_logger
+from metrics import ClientMetrics
+from results import ChatResult
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class StreamStats:
+    """Timing statistics for one streamed completion."""
+
+    time_to_first_token: Optional[float] = None
+    duration: Optional[float] = None
+    completion_tokens: Optional[int] = None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Completion tokens generated per second after the first token."""
+        if not self.completion_tokens or self.duration is None or self.time_to_first_token is None:
+            return None
+        generation_time = self.duration - self.time_to_first_token
+        return self.completion_tokens / generation_time if generation_time > 0 else None
+
+
+class _StreamAssembler:
+    """Accumulates chunks into a response dictionary and timing stats."""
+
+    def __init__(self, started_at: float, metrics: Optional[ClientMetrics], metric_prefix: str):
+        self.started_at = started_at
+        self.metrics = metrics
+        self.metric_prefix = metric_prefix
+        self.stats = StreamStats()
+        self.response: Optional[ChatResult] = None
+        self._header: Dict[str, Any] = {}
+        self._choices: Dict[int, Dict[str, Any]] = {}
+        self._content: Dict[int, List[str]] = {}
+        self._usage: Optional[Dict[str, int]] = None
+
+    def add(self, chunk: Any) -> List[str]:
+        """Consume one chunk and return the content deltas it carried."""
+        if not self._header:
+            self._header = {
+                "id": chunk.id,
+                "object": "chat.completion",
+                "created": chunk.created,
+                "model": chunk.model,
+            }
+        if getattr(chunk, "usage", None):
+            self._usage = {
+                "prompt_tokens": chunk.usage.prompt_tokens,
+                "completion_tokens": chunk.usage.completion_tokens,
+                "total_tokens": chunk.usage.total_tokens,
+            }
+
+        deltas = []
+        for choice in chunk.choices:
+            state = self._choices.setdefault(
+                choice.index,
+                {"index": choice.index, "message": {"role": "assistant", "content": None}, "finish_reason": None},
+            )
+            if choice.delta.role:
+                state["message"]["role"] = choice.delta.role
+            if choice.finish_reason:
+                state["finish_reason"] = choice.finish_reason
+            if choice.delta.content:
+                if self.stats.time_to_first_token is None:
+                    self.stats.time_to_first_token = time.perf_counter() - self.started_at
+                self._content.setdefault(choice.index, []).append(choice.delta.content)
+                deltas.append(choice.delta.content)
+        return deltas
+
+    def finish(self) -> None:
+        """Build the final response and record metrics."""
+        self.stats.duration = time.perf_counter() - self.started_at
+        for index, parts in self._content.items():
+            self._choices[index]["message"]["content"] = "".join(parts)
+        self.response = ChatResult.from_dict({
+            **self._header,
+            "choices": [self._choices[index] for index in sorted(self._choices)],
+            "usage": self._usage,
+        })
+        if self._usage:
+            self.stats.completion_tokens = self._usage["completion_tokens"]
+
+        if self.metrics is not None:
+            self.metrics.increment(f"{self.metric_prefix}.streams")
+            if self.stats.time_to_first_token is not None:
+                self.metrics.observe(f"{self.metric_prefix}.ttft", self.stats.time_to_first_token)
+            self.metrics.observe(f"{self.metric_prefix}.stream_duration", self.stats.duration)
+            if self.stats.tokens_per_second is not None:
+                self.metrics.observe(f"{self.metric_prefix}.tokens_per_second", self.stats.tokens_per_second)
+
+        logger.debug(
+            f"Streamed chat completion finished. TTFT: {self.stats.time_to_first_token}, "
+            f"tokens/sec: {self.stats.tokens_per_second}, usage: {self._usage}"
+        )
+
+
+def _has_content(chunk: Any) -> bool:
+    """Return whether a chunk carries generated content."""
+    return any(choice.delta.content for choice in chunk.choices)
+
+
+class PrefetchedChunks:
+    """A chunk stream whose leading chunks have already been read."""
+
+    def __init__(self, buffered: List[Any], rest: Iterator[Any], chunks: Any):
+        self._buffered = buffered
+        self._rest = rest
+        self._chunks = chunks
+
+    def __iter__(self) -> Iterator[Any]:
+        yield from self._buffered
+        yield from self._rest
+
+    def close(self) -> None:
+        """Close the underlying HTTP response."""
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def read_until_first_token(chunks: Any) -> PrefetchedChunks:
+    """Read a chunk stream up to the first chunk carrying content.
+
+    Used to hedge on time-to-first-token: the call only returns once the
+    model has started generating. The chunks read are replayed on iteration.
+
+    Args:
+        chunks: SDK chunk stream.
+
+    Returns:
+        PrefetchedChunks yielding every chunk of the stream.
+    """
+    buffered = []
+    prefetched = PrefetchedChunks(buffered, iter(chunks), chunks)
+    try:
+        for chunk in prefetched._rest:
+            buffered.append(chunk)
+            if _has_content(chunk):
+                break
+    except BaseException:
+        prefetched.close()
+        raise
+    return prefetched
+
+
+class AsyncPrefetchedChunks:
+    """An async chunk stream whose leading chunks have already been read."""
+
+    def __init__(self, buffered: List[Any], rest: AsyncIterator[Any], chunks: Any):
+        self._buffered = buffered
+        self._rest = rest
+        self._chunks = chunks
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        for chunk in self._buffered:
+            yield chunk
+        async for chunk in self._rest:
+            yield chunk
+
+    async def close(self) -> None:
+        """Close the underlying HTTP response."""
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            await close()
+
+
+async def aread_until_first_token(chunks: Any) -> AsyncPrefetchedChunks:
+    """Read an async chunk stream up to the first chunk carrying content.
+
+    Args:
+        chunks: SDK async chunk stream.
+
+    Returns:
+        AsyncPrefetchedChunks yielding every chunk of the stream.
+    """
+    buffered = []
+    prefetched = AsyncPrefetchedChunks(buffered, chunks.__aiter__(), chunks)
+    try:
+        async for chunk in prefetched._rest:
+            buffered.append(chunk)
+            if _has_content(chunk):
+                break
+    except BaseException:
+        await prefetched.close()
+        raise
+    return prefetched
+
+
+class ChatCompletionStream:
+    """Iterator over the content deltas of a streamed chat completion.
+
+    After iteration finishes, response holds the assembled ChatResult and stats
+    the timing statistics.
+    """
+
+    def __init__(
+        self,
+        chunks: Any,
+        started_at: float,
+        metrics: Optional[ClientMetrics] = None,
+        metric_prefix: str = "chat_completion",
+    ):
+        """Initialize the stream.
+
+        Args:
+            chunks: SDK chunk stream.
+            started_at: time.perf_counter() value when the request was sent.
+            metrics: Optional metrics to record TTFT and throughput in.
+            metric_prefix: Prefix for the recorded metric names.
+        """
+        self._chunks = chunks
+        self._assembler = _StreamAssembler(started_at, metrics, metric_prefix)
+
+    @property
+    def response(self) -> Optional[ChatResult]:
+        """Assembled response, available once the stream is exhausted."""
+        return self._assembler.response
+
+    @property
+    def stats(self) -> StreamStats:
+        """Timing statistics for the stream."""
+        return self._assembler.stats
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._chunks:
+                yield from self._assembler.add(chunk)
+        finally:
+            self.close()
+        self._assembler.finish()
+
+    def __enter__(self) -> "ChatCompletionStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the underlying HTTP response."""
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+    def until_done(self) -> ChatResult:
+        """Consume the rest of the stream and return the assembled response."""
+        for _ in self:
+            pass
+        return self.response
+
+
+class AsyncChatCompletionStream:
+    """Async iterator over the content deltas of a streamed chat completion.
+
+    After iteration finishes, response holds the assembled ChatResult and stats
+    the timing statistics.
+    """
+
+    def __init__(
+        self,
+        chunks: Any,
+        started_at: float,
+        metrics: Optional[ClientMetrics] = None,
+        metric_prefix: str = "chat_completion",
+    ):
+        """Initialize the stream.
+
+        Args:
+            chunks: SDK async chunk stream.
+            started_at: time.perf_counter() value when the request was sent.
+            metrics: Optional metrics to record TTFT and throughput in.
+            metric_prefix: Prefix for the recorded metric names.
+        """
+        self._chunks = chunks
+        self._assembler = _StreamAssembler(started_at, metrics, metric_prefix)
+
+    @property
+    def response(self) -> Optional[ChatResult]:
+        """Assembled response, available once the stream is exhausted."""
+        return self._assembler.response
+
+    @property
+    def stats(self) -> StreamStats:
+        """Timing statistics for the stream."""
+        return self._assembler.stats
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        try:
+            async for chunk in self._chunks:
+                for delta in self._assembler.add(chunk):
+                    yield delta
+        finally:
+            await self.close()
+        self._assembler.finish()
+
+    async def __aenter__(self) -> "AsyncChatCompletionStream":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the underlying HTTP response."""
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            await close()
+
+    async def until_done(self) -> ChatResult:
+        """Consume the rest of the stream and return the assembled response."""
+        async for _ in self:
+            pass
+        return self.response
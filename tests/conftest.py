@@ -3,6 +3,9 @@ Pytest configuration file.
 """
 
 import os
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
 import pytest
 from dotenv import load_dotenv
 
@@ -21,4 +24,60 @@ def openai_api_key():
 def mock_env_variables():
     """Set up environment variables for testing."""
     # We don't need to mock the API key since we want to use the real one
-    yield
\ No newline at end of file
+    yield
+
+
+class FakeClock:
+    """Monotonic clock that only advances when sleep is called."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(request):
+    """Patch the clock and sleep of the module under test with a FakeClock.
+
+    The module to patch is the fixture's parameter (indirect parametrization)
+    or, by default, the clock_module attribute of the test module:
+
+        clock_module = "routing"
+    """
+    module = getattr(request, "param", None) or request.module.clock_module
+    fake = FakeClock()
+    with patch(f"{module}.time.monotonic", fake.monotonic), patch(f"{module}.time.sleep", fake.sleep):
+        yield fake
+
+
+def make_completion(content="Test response", prompt_tokens=10, completion_tokens=20):
+    """Build an object shaped like an SDK ChatCompletion."""
+    return SimpleNamespace(
+        id="chatcmpl-test",
+        object="chat.completion",
+        created=1700000000,
+        model="gpt-4o",
+        choices=[
+            SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content=content),
+                finish_reason="stop",
+            )
+        ],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        ),
+    )
+
+
+def make_status_error(error_class, status_code, message="error", headers=None):
+    """Build an SDK APIStatusError subclass with a mocked HTTP response."""
+    response = MagicMock(status_code=status_code, headers=headers or {})
+    return error_class(message, response=response, body=None)
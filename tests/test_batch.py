@@ -0,0 +1,153 @@
+"""
+Tests for the batch module.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch import BatchItem, BatchReport, aiter_many, arun_many, iter_many, run_many
+from concurrency import AIMDPolicy, AdaptiveLimiter, AsyncAdaptiveLimiter
+
+
+def square(value, delay=0.0):
+    """Return value squared after an optional delay, failing for negatives."""
+    time.sleep(delay)
+    if value < 0:
+        raise ValueError("negative")
+    return value * value
+
+
+class TestRunMany:
+    """Test suite for the thread pool fan-out."""
+
+    def test_results_in_input_order_with_isolated_failures(self):
+        """Test results keep input order and failures are captured per item."""
+        requests = [{"value": 3, "delay": 0.03}, {"value": -1}, {"value": 2}]
+
+        report = run_many(square, requests, max_concurrency=3)
+
+        assert [item.index for item in report.items] == [0, 1, 2]
+        assert report.responses == [9, None, 4]
+        assert report.succeeded == 2
+        assert report.failed == 1
+        assert isinstance(report.errors[0].error, ValueError)
+        assert report.throughput > 0
+
+    def test_bounded_concurrency(self):
+        """Test no more than max_concurrency calls run at once."""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def tracked(value):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return value
+
+        run_many(tracked, [{"value": i} for i in range(10)], max_concurrency=2)
+
+        assert state["peak"] <= 2
+
+    def test_adaptive_limiter_bounds_concurrency(self):
+        """Test the limiter's limit replaces max_concurrency."""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+        limiter = AdaptiveLimiter(AIMDPolicy(initial_limit=3, max_limit=8))
+
+        def tracked(value):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return value
+
+        report = run_many(tracked, [{"value": i} for i in range(12)], max_concurrency=1, limiter=limiter)
+
+        assert report.responses == list(range(12))
+        assert 1 < state["peak"] <= 3
+        assert limiter.in_flight == 0
+
+    def test_iter_many_as_completed(self):
+        """Test items are yielded in completion order."""
+        requests = [{"value": 1, "delay": 0.05}, {"value": 2}]
+
+        indexes = [item.index for item in iter_many(square, requests, max_concurrency=2)]
+
+        assert indexes == [1, 0]
+        assert list(iter_many(square, [])) == []
+
+
+class TestArunMany:
+    """Test suite for the asyncio fan-out."""
+
+    def test_results_in_input_order_with_isolated_failures(self):
+        """Test async results keep input order and failures are captured."""
+        async def work(value, delay=0.0):
+            await asyncio.sleep(delay)
+            if value < 0:
+                raise ValueError("negative")
+            return value + 1
+
+        report = asyncio.run(arun_many(work, [{"value": 1, "delay": 0.02}, {"value": -1}, {"value": 5}]))
+
+        assert report.responses == [2, None, 6]
+        assert report.failed == 1
+
+    def test_adaptive_limiter_bounds_concurrency(self):
+        """Test async calls hold one of the limiter's slots each."""
+        state = {"active": 0, "peak": 0}
+
+        async def work(value):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            return value
+
+        async def main():
+            limiter = AsyncAdaptiveLimiter(AIMDPolicy(initial_limit=2))
+            return await arun_many(work, [{"value": i} for i in range(6)], limiter=limiter)
+
+        assert asyncio.run(main()).responses == list(range(6))
+        assert state["peak"] == 2
+
+    def test_aiter_many_as_completed(self):
+        """Test async items are yielded in completion order."""
+        async def work(value, delay=0.0):
+            await asyncio.sleep(delay)
+            return value
+
+        async def collect():
+            return [item.index async for item in aiter_many(work, [{"value": 1, "delay": 0.05}, {"value": 2}])]
+
+        assert asyncio.run(collect()) == [1, 0]
+
+
+class TestBatchReport:
+    """Test suite for BatchReport statistics."""
+
+    def test_summary(self):
+        """Test latency percentiles ignore failed items."""
+        report = BatchReport(
+            items=[
+                BatchItem(index=0, request={}, response="a", latency=1.0),
+                BatchItem(index=1, request={}, response="b", latency=3.0),
+                BatchItem(index=2, request={}, error=RuntimeError("x"), latency=100.0),
+            ],
+            elapsed=2.0,
+        )
+
+        summary = report.summary()
+        assert summary["throughput"] == 1.5
+        assert summary["latency"]["p50"] == 1.0
+        assert summary["latency"]["p99"] == 3.0
+        assert BatchReport().throughput == 0.0
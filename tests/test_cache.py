@@ -0,0 +1,298 @@
+"""
+Tests for the cache module.
+"""
+
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache import LRUCache, SQLiteCache, EmbeddingCache, ImageCache, ResponseCache, normalize_text
+from image_processing import ImagePreprocessConfig
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Return a path for a temporary SQLite cache database."""
+    return str(tmp_path / "cache.sqlite")
+
+
+class TestLRUCache:
+    """Test suite for LRUCache."""
+
+    def test_get_set(self):
+        """Test values round-trip and missing keys return None."""
+        cache = LRUCache()
+        cache.set("a", "value", size=5)
+
+        assert cache.get("a") == "value"
+        assert cache.get("missing") is None
+        assert cache.size_bytes == 5
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """Test the least recently used entry is evicted when over the byte limit."""
+        cache = LRUCache(max_bytes=10)
+        cache.set("a", "A", size=4)
+        cache.set("b", "B", size=4)
+        cache.get("a")
+        cache.set("c", "C", size=4)
+
+        assert cache.get("a") == "A"
+        assert cache.get("b") is None
+        assert cache.get("c") == "C"
+        assert cache.evictions == 1
+        assert cache.size_bytes == 8
+
+    def test_evicts_by_entry_count(self):
+        """Test the entry limit is enforced."""
+        cache = LRUCache(max_entries=2)
+        for key in "abc":
+            cache.set(key, key, size=1)
+
+        assert len(cache) == 2
+        assert cache.get("a") is None
+
+    def test_ttl_expiry(self):
+        """Test expired entries are treated as misses."""
+        cache = LRUCache(ttl=10)
+        cache.set("a", "A", size=1)
+
+        with patch("cache.time.time", return_value=time.time() + 11):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_oversized_value_not_stored(self):
+        """Test a value larger than the byte limit is ignored."""
+        cache = LRUCache(max_bytes=4)
+        cache.set("a", "A", size=5)
+
+        assert cache.get("a") is None
+
+
+class TestSQLiteCache:
+    """Test suite for SQLiteCache."""
+
+    def test_persists_across_instances(self, db_path):
+        """Test values are visible to a second instance on the same file."""
+        SQLiteCache(db_path).set("a", b"value")
+
+        other = SQLiteCache(db_path)
+        assert other.get("a") == b"value"
+        assert other.size_bytes == 5
+
+    def test_replace_updates_size(self, db_path):
+        """Test overwriting a key adjusts the stored byte count."""
+        cache = SQLiteCache(db_path)
+        cache.set("a", b"12345")
+        cache.set("a", b"12")
+
+        assert cache.size_bytes == 2
+        assert len(cache) == 1
+
+    def test_evicts_least_recently_used(self, db_path):
+        """Test entries are evicted by access time once over the byte limit."""
+        cache = SQLiteCache(db_path, max_bytes=10)
+        with patch("cache.time.time", side_effect=[1.0, 2.0, 3.0, 4.0]):
+            cache.set("a", b"aaaa")
+            cache.set("b", b"bbbb")
+            cache.get("a")
+            cache.set("c", b"cccc")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"aaaa"
+        assert cache.size_bytes == 8
+        assert cache.evictions == 1
+
+    def test_ttl_expiry(self, db_path):
+        """Test expired entries are deleted on read."""
+        cache = SQLiteCache(db_path, ttl=10)
+        cache.set("a", b"value")
+
+        with patch("cache.time.time", return_value=time.time() + 11):
+            assert cache.get("a") is None
+        assert cache.size_bytes == 0
+
+    def test_clear(self, db_path):
+        """Test clearing removes all entries."""
+        cache = SQLiteCache(db_path)
+        cache.set("a", b"value")
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.size_bytes == 0
+
+
+class TestEmbeddingCache:
+    """Test suite for EmbeddingCache."""
+
+    def test_key_normalization(self):
+        """Test keys ignore surrounding whitespace but include model and dimensions."""
+        key = EmbeddingCache.make_key("m", "hello")
+
+        assert EmbeddingCache.make_key("m", "  hello\n") == key
+        assert EmbeddingCache.make_key("other", "hello") != key
+        assert EmbeddingCache.make_key("m", "hello", dimensions=256) != key
+        assert normalize_text("café") == "café"
+
+    def test_round_trip_and_stats(self):
+        """Test embeddings round-trip at float32 precision and stats are counted."""
+        cache = EmbeddingCache()
+        assert cache.get("m", "hello") is None
+
+        cache.set("m", "hello", [0.5, -0.25])
+
+        assert cache.get("m", "hello") == [0.5, -0.25]
+        assert cache.get("m", "hello", as_numpy=True).dtype == np.float32
+        assert cache.stats.hits == 2
+        assert cache.stats.misses == 1
+        assert cache.stats.memory_hits == 2
+        assert cache.stats.hit_rate == pytest.approx(2 / 3)
+
+    def test_disk_tier_promotes_to_memory(self, db_path):
+        """Test a disk hit is served and promoted into the memory tier."""
+        EmbeddingCache.with_disk(db_path).set("m", "hello", np.array([1.0, 2.0], dtype=np.float32))
+
+        cache = EmbeddingCache.with_disk(db_path)
+        assert cache.get("m", "hello") == [1.0, 2.0]
+        assert cache.get("m", "hello") == [1.0, 2.0]
+        assert cache.stats.disk_hits == 1
+        assert cache.stats.memory_hits == 1
+
+    def test_clear(self, db_path):
+        """Test clearing empties both tiers."""
+        cache = EmbeddingCache.with_disk(db_path)
+        cache.set("m", "hello", [1.0])
+        cache.clear()
+
+        assert cache.get("m", "hello") is None
+        assert cache.evictions == 0
+
+
+class TestResponseCache:
+    """Test suite for ResponseCache."""
+
+    def test_key_is_canonical(self):
+        """Test keys ignore parameter order but not parameter values."""
+        a = ResponseCache.make_key({"model": "m", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]})
+        b = ResponseCache.make_key({"messages": [{"role": "user", "content": "hi"}], "temperature": 0, "model": "m"})
+        c = ResponseCache.make_key({"model": "m", "temperature": 0.5, "messages": [{"role": "user", "content": "hi"}]})
+
+        assert a == b
+        assert a != c
+
+    def test_should_cache_deterministic_only(self):
+        """Test only temperature 0 or seeded requests are cached by default."""
+        cache = ResponseCache()
+
+        assert cache.should_cache({"temperature": 0})
+        assert cache.should_cache({"temperature": 0.7, "seed": 1})
+        assert not cache.should_cache({"temperature": 0.7})
+        assert ResponseCache(deterministic_only=False).should_cache({"temperature": 0.7})
+
+    def test_fresh_and_stale(self):
+        """Test entries become stale after ttl and expire after ttl + stale_ttl."""
+        cache = ResponseCache(ttl=10, stale_ttl=20)
+        cache.set("k", {"id": "1"})
+
+        assert cache.get("k").stale is False
+        with patch("cache.time.time", return_value=time.time() + 15):
+            hit = cache.get("k")
+            assert hit.stale is True
+            assert hit.response == {"id": "1"}
+        with patch("cache.time.time", return_value=time.time() + 31):
+            assert cache.get("k") is None
+        assert cache.stats.hits == 2
+        assert cache.stale_hits == 1
+
+    def test_disk_backend(self, db_path):
+        """Test responses persist in a SQLite backend."""
+        ResponseCache(backend=SQLiteCache(db_path)).set("k", {"id": "1"})
+
+        assert ResponseCache(backend=SQLiteCache(db_path)).get("k").response == {"id": "1"}
+
+    def test_refresh_claim(self):
+        """Test only one caller can claim a refresh at a time."""
+        cache = ResponseCache()
+
+        assert cache.begin_refresh("k")
+        assert not cache.begin_refresh("k")
+        cache.end_refresh("k")
+        assert cache.begin_refresh("k")
+
+
+class TestImageCache:
+    """Test suite for ImageCache."""
+
+    def test_repeat_load_skips_read(self, tmp_path):
+        """Test an unchanged file is served without reading it again."""
+        path = tmp_path / "image.png"
+        path.write_bytes(b"\x89PNG\r\n\x1a\nimage")
+        cache = ImageCache()
+
+        first = cache.load(str(path))
+        with patch("builtins.open", side_effect=AssertionError("file was read")):
+            second = cache.load(str(path))
+
+        assert second is first
+        assert first.mime_type == "image/png"
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 1
+
+    def test_modified_file_is_reloaded(self, tmp_path):
+        """Test a changed modification time invalidates the path entry."""
+        path = tmp_path / "image.jpg"
+        path.write_bytes(b"\xff\xd8\xffold")
+        cache = ImageCache()
+        cache.load(str(path))
+
+        path.write_bytes(b"\xff\xd8\xffnew content")
+        os.utime(path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+
+        assert cache.load(str(path)).data == b"\xff\xd8\xffnew content"
+        assert cache.stats.misses == 2
+
+    def test_same_content_shares_entry(self, tmp_path):
+        """Test identical bytes under different paths hit the same entry."""
+        for name in ("a.jpg", "b.jpg"):
+            (tmp_path / name).write_bytes(b"\xff\xd8\xffsame")
+        cache = ImageCache()
+
+        cache.load(str(tmp_path / "a.jpg"))
+        cache.load(str(tmp_path / "b.jpg"))
+
+        assert cache.stats.hits == 1
+        assert len(cache.memory) == 1
+
+    def test_key_includes_preprocessing(self):
+        """Test different preprocessing settings get separate entries."""
+        assert ImageCache.make_key("abc") != ImageCache.make_key("abc", ImagePreprocessConfig())
+        assert ImageCache.make_key("abc", ImagePreprocessConfig(quality=70)) != ImageCache.make_key(
+            "abc", ImagePreprocessConfig(quality=80)
+        )
+
+    def test_load_many_prepares_duplicates_once(self, tmp_path):
+        """Test repeated sources within one call are prepared once."""
+        path = tmp_path / "image.jpg"
+        path.write_bytes(b"\xff\xd8\xffsame")
+        cache = ImageCache()
+
+        images = cache.load_many([str(path), b"\xff\xd8\xffsame", b"GIF89aother"])
+
+        assert images[0] is images[1]
+        assert images[2].mime_type == "image/gif"
+        assert cache.stats.misses == 2
+
+    def test_memory_accounting(self):
+        """Test the stored size covers the raw bytes and their encodings."""
+        cache = ImageCache(memory=LRUCache(max_bytes=200))
+
+        image = cache.prepare(b"\xff\xd8\xff" + b"x" * 27)
+
+        assert cache.size_bytes == len(image.data) + len(image.base64) + len(image.data_url)
+        cache.prepare(b"\xff\xd8\xff" + b"y" * 27)
+        assert cache.evictions == 1
+        assert cache.size_bytes <= 200
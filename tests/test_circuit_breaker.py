@@ -0,0 +1,248 @@
+"""
+Tests for the circuit_breaker module.
+"""
+
+import os
+import sys
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from openai import APITimeoutError, BadRequestError, InternalServerError
+from circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+)
+from metrics import ClientMetrics
+from openai_client import OpenAIClient, AsyncOpenAIClient
+from retry import RetryPolicy
+from tests.conftest import make_completion, make_status_error
+
+clock_module = "circuit_breaker"
+
+
+def fail():
+    """Raise an upstream failure."""
+    raise make_status_error(InternalServerError, 500)
+
+
+def make_breaker(**config):
+    """Build a breaker that opens after 2 failures in 4 calls."""
+    settings = {"window": 4, "min_calls": 2, "failure_rate_threshold": 0.5, "open_duration": 10.0}
+    settings.update(config)
+    return CircuitBreaker("gpt-4o", CircuitBreakerConfig(**settings), ClientMetrics())
+
+
+class TestCircuitBreakerConfig:
+    """Test suite for CircuitBreakerConfig."""
+
+    def test_is_failure(self):
+        """Test only upstream errors count as failures."""
+        config = CircuitBreakerConfig()
+
+        assert config.is_failure(make_status_error(InternalServerError, 503))
+        assert config.is_failure(APITimeoutError(request=MagicMock()))
+        assert not config.is_failure(make_status_error(BadRequestError, 400))
+        assert not config.is_failure(ValueError("bad input"))
+
+
+class TestCircuitBreaker:
+    """Test suite for CircuitBreaker."""
+
+    def test_opens_after_failure_rate(self, clock):
+        """Test the circuit opens once the failure rate reaches the threshold."""
+        breaker = make_breaker()
+
+        assert breaker.call(lambda: "ok") == "ok"
+        with pytest.raises(InternalServerError):
+            breaker.call(fail)
+        assert breaker.state == OPEN
+        assert breaker.metrics.gauge("circuit.gpt-4o.state") == 2
+        assert breaker.metrics.counter("circuit.gpt-4o.opened") == 1
+
+    def test_needs_min_calls(self, clock):
+        """Test a single failure does not open the circuit."""
+        breaker = make_breaker()
+
+        with pytest.raises(InternalServerError):
+            breaker.call(fail)
+        assert breaker.state == CLOSED
+        assert breaker.failure_rate == 1.0
+
+    def test_open_circuit_fails_fast(self, clock):
+        """Test calls are rejected without running while open."""
+        breaker = make_breaker(min_calls=1)
+        with pytest.raises(InternalServerError):
+            breaker.call(fail)
+        call = MagicMock()
+
+        with pytest.raises(CircuitOpenError) as excinfo:
+            breaker.call(call)
+
+        call.assert_not_called()
+        assert excinfo.value.retry_after == 10.0
+        assert breaker.metrics.counter("circuit.gpt-4o.rejected") == 1
+
+    def test_half_open_probe_closes_circuit(self, clock):
+        """Test a successful probe after open_duration closes the circuit."""
+        breaker = make_breaker(min_calls=1)
+        with pytest.raises(InternalServerError):
+            breaker.call(fail)
+
+        clock.now += 10
+        breaker.before_call()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "second probe")
+        breaker.record(False)
+
+        assert breaker.state == CLOSED
+        assert breaker.failure_rate == 0.0
+        assert breaker.metrics.gauge("circuit.gpt-4o.state") == 0
+
+    def test_failed_probe_reopens_circuit(self, clock):
+        """Test a failed probe opens the circuit again."""
+        breaker = make_breaker(min_calls=1)
+        with pytest.raises(InternalServerError):
+            breaker.call(fail)
+
+        clock.now += 10
+        with pytest.raises(InternalServerError):
+            breaker.call(fail)
+
+        assert breaker.state == OPEN
+        assert breaker.metrics.counter("circuit.gpt-4o.opened") == 2
+
+    def test_slow_calls_count_as_failures(self, clock):
+        """Test calls slower than slow_call_threshold open the circuit."""
+        breaker = make_breaker(slow_call_threshold=5.0)
+
+        def slow():
+            clock.now += 6
+            return "late"
+
+        assert breaker.call(slow) == "late"
+        assert breaker.call(slow) == "late"
+        assert breaker.state == OPEN
+
+    def test_client_errors_do_not_count(self, clock):
+        """Test bad requests leave the circuit closed."""
+        breaker = make_breaker()
+
+        for _ in range(4):
+            with pytest.raises(BadRequestError):
+                breaker.call(lambda: (_ for _ in ()).throw(make_status_error(BadRequestError, 400)))
+
+        assert breaker.state == CLOSED
+
+    def test_acall(self, clock):
+        """Test async calls go through the breaker."""
+        breaker = make_breaker(min_calls=1)
+
+        async def afail():
+            fail()
+
+        with pytest.raises(InternalServerError):
+            asyncio.run(breaker.acall(afail))
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(breaker.acall(afail))
+
+    def test_cancelled_probe_frees_its_slot(self, clock):
+        """Test a probe cancelled mid-call lets the next call probe instead of blocking the circuit."""
+        breaker = make_breaker(min_calls=1)
+        with pytest.raises(InternalServerError):
+            breaker.call(fail)
+        clock.now += 10
+
+        async def main():
+            probe = asyncio.create_task(breaker.acall(lambda: asyncio.sleep(10)))
+            await asyncio.sleep(0)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+        asyncio.run(main())
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.call(lambda: "ok") == "ok"
+        assert breaker.state == CLOSED
+
+
+class TestCircuitBreakerRegistry:
+    """Test suite for CircuitBreakerRegistry."""
+
+    def test_breakers_per_model_and_base_url(self):
+        """Test one breaker is kept per (base_url, model)."""
+        registry = CircuitBreakerRegistry()
+
+        assert registry.get("gpt-4o") is registry.get("gpt-4o")
+        assert registry.get("gpt-4o") is not registry.get("gpt-4o-mini")
+        assert registry.get("gpt-4o", "http://localhost/v1").name == "http://localhost/v1|gpt-4o"
+        assert registry.states() == {
+            "gpt-4o": CLOSED,
+            "gpt-4o-mini": CLOSED,
+            "http://localhost/v1|gpt-4o": CLOSED,
+        }
+
+
+class TestClientIntegration:
+    """Tests for circuit breakers in the client."""
+
+    def make_client(self, client_class=OpenAIClient, **kwargs):
+        """Build a client with a breaker that opens on the first failure."""
+        breakers = CircuitBreakerRegistry(CircuitBreakerConfig(min_calls=1, failure_rate_threshold=0.5))
+        client = client_class(
+            api_key="test-key",
+            retry_policy=RetryPolicy(max_attempts=1),
+            circuit_breakers=breakers,
+            **kwargs,
+        )
+        client.client = MagicMock()
+        return client
+
+    def test_open_circuit_fails_fast(self, clock):
+        """Test chat calls fail fast once the model's circuit is open."""
+        client = self.make_client()
+        client.client.chat.completions.create.side_effect = make_status_error(InternalServerError, 500)
+        messages = [{"role": "user", "content": "Hi"}]
+
+        with pytest.raises(InternalServerError):
+            client.chat_completion(messages=messages)
+        with pytest.raises(CircuitOpenError):
+            client.chat_completion(messages=messages)
+
+        assert client.client.chat.completions.create.call_count == 1
+        assert client.metrics.gauge("circuit.gpt-4o.state") == 2
+
+    def test_fallback_model_while_open(self, clock):
+        """Test chat requests go to the fallback model while the circuit is open."""
+        client = self.make_client(fallback_models={"gpt-4o": "gpt-4o-mini"})
+        client.circuit_breakers.get("gpt-4o").record(True)
+        client.client.chat.completions.create.return_value = make_completion("From fallback")
+
+        result = client.chat_completion(messages=[{"role": "user", "content": "Hi"}])
+
+        assert result.content == "From fallback"
+        assert client.client.chat.completions.create.call_args.kwargs["model"] == "gpt-4o-mini"
+        assert client.metrics.counter("chat_completion.fallbacks") == 1
+
+    def test_async_fallback_model_while_open(self, clock):
+        """Test async chat requests go to the fallback model while the circuit is open."""
+        client = self.make_client(AsyncOpenAIClient, fallback_models={"gpt-4o": "gpt-4o-mini"})
+        client.circuit_breakers.get("gpt-4o").record(True)
+
+        async def create(**kwargs):
+            return make_completion(kwargs["model"])
+
+        client.client.chat.completions.create.side_effect = create
+
+        result = asyncio.run(client.chat_completion(messages=[{"role": "user", "content": "Hi"}]))
+
+        assert result.content == "gpt-4o-mini"
@@ -0,0 +1,256 @@
+"""
+Tests for the concurrency module.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from openai import BadRequestError, RateLimitError
+from concurrency import AIMDPolicy, AdaptiveLimiter, AsyncAdaptiveLimiter
+from metrics import ClientMetrics
+from openai_client import OpenAIClient, AsyncOpenAIClient
+from retry import RetryPolicy
+from tests.conftest import make_completion, make_status_error
+
+
+def make_limiter(**policy):
+    """Build a limiter publishing into fresh metrics."""
+    return AdaptiveLimiter(AIMDPolicy(**policy), ClientMetrics())
+
+
+class TestAIMDLimit:
+    """Test suite for the limit arithmetic."""
+
+    def test_initial_limit_is_clamped(self):
+        """Test the initial limit respects the bounds."""
+        assert make_limiter(initial_limit=100, max_limit=10).limit == 10
+        assert make_limiter(initial_limit=0, min_limit=2).limit == 2
+
+    def test_additive_increase(self):
+        """Test the limit grows by about one per window of healthy samples."""
+        limiter = make_limiter(initial_limit=4)
+        limiter._in_flight = 4
+
+        for _ in range(4):
+            limiter.record(time.monotonic(), 0.1)
+
+        assert limiter.limit == 4
+        limiter.record(time.monotonic(), 0.1)
+        assert limiter.limit == 5
+        assert limiter.metrics.gauge("concurrency.limit") == 5
+
+    def test_no_growth_while_underused(self):
+        """Test the limit does not grow when few slots are in use."""
+        limiter = make_limiter(initial_limit=4)
+
+        for _ in range(20):
+            limiter.record(time.monotonic(), 0.1)
+
+        assert limiter.limit == 4
+
+    def test_growth_stops_at_max_limit(self):
+        """Test the limit never exceeds max_limit."""
+        limiter = make_limiter(initial_limit=2, max_limit=3)
+        limiter._in_flight = 3
+
+        for _ in range(50):
+            limiter.record(time.monotonic(), 0.1)
+
+        assert limiter.limit == 3
+
+    def test_multiplicative_decrease_on_rate_limit(self):
+        """Test a 429 halves the limit."""
+        limiter = make_limiter(initial_limit=16)
+
+        limiter.record(time.monotonic(), 0.1, make_status_error(RateLimitError, 429))
+
+        assert limiter.limit == 8
+        assert limiter.metrics.counter("concurrency.decreases") == 1
+
+    def test_one_decrease_per_round(self):
+        """Test attempts started before a decrease do not decrease the limit again."""
+        limiter = make_limiter(initial_limit=16)
+        started_at = time.monotonic()
+        error = make_status_error(RateLimitError, 429)
+
+        limiter.record(started_at, 0.1, error)
+        limiter.record(started_at, 0.1, error)
+        assert limiter.limit == 8
+
+        limiter.record(time.monotonic(), 0.1, error)
+        assert limiter.limit == 4
+
+    def test_decrease_stops_at_min_limit(self):
+        """Test the limit never drops below min_limit."""
+        limiter = make_limiter(initial_limit=2, min_limit=1)
+
+        for _ in range(5):
+            limiter.record(time.monotonic(), 0.1, make_status_error(RateLimitError, 429))
+
+        assert limiter.limit == 1
+
+    def test_latency_inflation_decreases(self):
+        """Test latencies well above the baseline count as overload."""
+        limiter = make_limiter(initial_limit=8, latency_alpha=1.0)
+
+        limiter.record(time.monotonic(), 0.1)
+        limiter.record(time.monotonic(), 0.15)
+        assert limiter.limit == 8
+
+        limiter.record(time.monotonic(), 0.5)
+        assert limiter.limit == 4
+
+    def test_request_errors_are_ignored(self):
+        """Test errors caused by the request leave the limit unchanged."""
+        limiter = make_limiter(initial_limit=8)
+
+        limiter.record(time.monotonic(), 0.1, make_status_error(BadRequestError, 400))
+
+        assert limiter.limit == 8
+        assert limiter.metrics.counter("concurrency.decreases") == 0
+
+
+class TestAdaptiveLimiter:
+    """Test suite for AdaptiveLimiter."""
+
+    def test_slots_block_at_limit(self):
+        """Test a caller waits for a slot once the limit is reached."""
+        limiter = make_limiter(initial_limit=1)
+        acquired = threading.Event()
+
+        def second():
+            with limiter:
+                acquired.set()
+
+        with limiter:
+            thread = threading.Thread(target=second)
+            thread.start()
+            assert not acquired.wait(0.05)
+        assert acquired.wait(1)
+        thread.join(1)
+        assert limiter.in_flight == 0
+
+    def test_measure(self):
+        """Test measure returns results and records failures."""
+        limiter = make_limiter(initial_limit=4)
+
+        assert limiter.measure(lambda: "ok") == "ok"
+        with pytest.raises(RateLimitError):
+            limiter.measure(lambda: (_ for _ in ()).throw(make_status_error(RateLimitError, 429)))
+
+        assert limiter.limit == 2
+
+
+class TestAsyncAdaptiveLimiter:
+    """Test suite for AsyncAdaptiveLimiter."""
+
+    def test_waiters_are_woken_on_release(self):
+        """Test tasks beyond the limit wait and run once slots free up."""
+        limiter = AsyncAdaptiveLimiter(AIMDPolicy(initial_limit=1))
+        order = []
+
+        async def work(name):
+            async with limiter:
+                order.append(f"start {name}")
+                await asyncio.sleep(0.01)
+                order.append(f"end {name}")
+
+        async def main():
+            await asyncio.gather(work("a"), work("b"))
+
+        asyncio.run(main())
+
+        assert order == ["start a", "end a", "start b", "end b"]
+
+    def test_cancelled_waiter(self):
+        """Test a cancelled waiter does not take a slot."""
+        limiter = AsyncAdaptiveLimiter(AIMDPolicy(initial_limit=1))
+
+        async def wait_for_slot():
+            async with limiter:
+                pass
+
+        async def main():
+            async with limiter:
+                waiter = asyncio.create_task(wait_for_slot())
+                await asyncio.sleep(0)
+                waiter.cancel()
+            await asyncio.sleep(0)
+            async with limiter:
+                return limiter.in_flight
+
+        assert asyncio.run(main()) == 1
+        assert limiter.in_flight == 0
+
+    def test_measure(self):
+        """Test async attempts adjust the limit."""
+        limiter = AsyncAdaptiveLimiter(AIMDPolicy(initial_limit=4))
+
+        async def ok():
+            return "ok"
+
+        async def fail():
+            raise make_status_error(RateLimitError, 429)
+
+        assert asyncio.run(limiter.measure(ok)) == "ok"
+        with pytest.raises(RateLimitError):
+            asyncio.run(limiter.measure(fail))
+
+        assert limiter.limit == 2
+
+
+class TestClientIntegration:
+    """Tests for clients with adaptive concurrency."""
+
+    def test_rate_limited_attempts_lower_the_limit(self):
+        """Test 429s seen by retried attempts lower the fan-out limit."""
+        client = OpenAIClient(
+            api_key="test-key",
+            retry_policy=RetryPolicy(base_delay=0),
+            adaptive_concurrency=AIMDPolicy(initial_limit=8),
+        )
+        client.client = MagicMock()
+        client.client.chat.completions.create.side_effect = [
+            make_status_error(RateLimitError, 429), make_completion("a"), make_completion("b"),
+        ]
+        requests = [{"messages": [{"role": "user", "content": "Hi"}]} for _ in range(2)]
+
+        report = client.chat_completion_many(requests)
+
+        assert report.succeeded == 2
+        assert client.concurrency_limiter.limit == 4
+        assert client.metrics.gauge("concurrency.limit") == 4
+
+    def test_async_embeddings_use_limiter(self):
+        """Test async embedding batches hold limiter slots."""
+        client = AsyncOpenAIClient(api_key="test-key", adaptive_concurrency=AIMDPolicy(initial_limit=2))
+        peak = {"active": 0, "max": 0}
+
+        async def embed_batch(batch, model, params):
+            peak["active"] += 1
+            peak["max"] = max(peak["max"], peak["active"])
+            await asyncio.sleep(0.01)
+            peak["active"] -= 1
+            return [[1.0] for _ in batch]
+
+        client._embed_batch = embed_batch
+
+        result = asyncio.run(client.create_embeddings(["a", "b", "c", "d"], max_inputs=1, max_concurrency=4))
+
+        assert result == [[1.0]] * 4
+        assert peak["max"] == 2
+
+    def test_embeddings_use_limiter(self):
+        """Test sync embedding batches hold limiter slots."""
+        client = OpenAIClient(api_key="test-key", adaptive_concurrency=AIMDPolicy(initial_limit=1))
+        client._embed_batch = MagicMock(side_effect=lambda batch, model, params: [[1.0] for _ in batch])
+
+        assert client.create_embeddings(["a", "b"], max_inputs=1) == [[1.0], [1.0]]
+        assert client._embed_batch.call_count == 2
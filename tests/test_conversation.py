@@ -0,0 +1,169 @@
+"""
+Tests for the conversation module.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conversation import Conversation, DropOldest, SlidingWindow, SummarizeOlder, SUMMARY_PREFIX
+from tokens import REPLY_PRIMING_TOKENS, TOKENS_PER_MESSAGE, TokenCounter
+
+
+@pytest.fixture(autouse=True)
+def word_tiktoken():
+    """Count one token per word so budgets are easy to reason about."""
+    fake = MagicMock()
+    fake.encoding_name_for_model.return_value = "words"
+    fake.get_encoding.return_value = SimpleNamespace(encode=lambda text, disallowed_special=(): text.split())
+    with patch("tokens.tiktoken", fake):
+        yield fake
+
+
+def reply(content):
+    """Build a chat_completion response dictionary."""
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def words(n):
+    """Return n words of text."""
+    return " ".join(["word"] * n)
+
+
+@pytest.fixture
+def client():
+    """Mock client answering every request with "ok"."""
+    client = MagicMock(spec=["chat_completion"])
+    client.chat_completion.return_value = reply("ok")
+    return client
+
+
+class TestConversation:
+    """Test suite for Conversation."""
+
+    def test_incremental_token_count(self, client):
+        """Test the running count matches a full recount."""
+        conversation = Conversation(client, system_prompt="be brief")
+        conversation.add("user", words(10))
+        conversation.add("assistant", words(5))
+
+        counter = TokenCounter()
+        assert conversation.prompt_tokens == counter.count_messages(conversation.messages, "gpt-4o")
+        assert conversation.prompt_tokens == (
+            (TOKENS_PER_MESSAGE + 1 + 2) + (TOKENS_PER_MESSAGE + 1 + 10) + (TOKENS_PER_MESSAGE + 1 + 5)
+            + REPLY_PRIMING_TOKENS
+        )
+
+    def test_send_records_reply(self, client):
+        """Test send appends the user message and the assistant reply."""
+        conversation = Conversation(client, model="gpt-4o-mini")
+
+        conversation.send("hello", temperature=0)
+
+        assert [message["role"] for message in conversation.messages] == ["user", "assistant"]
+        kwargs = client.chat_completion.call_args.kwargs
+        assert kwargs["model"] == "gpt-4o-mini"
+        assert kwargs["temperature"] == 0
+
+    def test_failed_send_leaves_history_unchanged(self, client):
+        """Test a failed request does not keep the unsent user message."""
+        conversation = Conversation(client, system_prompt="rules")
+        conversation.send("hello")
+        before = (list(conversation.messages), conversation.prompt_tokens)
+        client.chat_completion.side_effect = RuntimeError("circuit open")
+
+        with pytest.raises(RuntimeError):
+            conversation.send("again")
+
+        assert (conversation.messages, conversation.prompt_tokens) == before
+        client.chat_completion.side_effect = None
+        conversation.send("again")
+        sent = client.chat_completion.call_args.kwargs["messages"]
+        assert [message["content"] for message in sent].count("again") == 1
+
+    def test_drop_oldest_preserves_system(self, client):
+        """Test the oldest turns go first and the system prompt stays."""
+        conversation = Conversation(client, system_prompt="rules", max_prompt_tokens=60)
+        for _ in range(3):
+            conversation.add("user", words(10))
+            conversation.add("assistant", words(10))
+
+        conversation.send(words(10))
+
+        sent = client.chat_completion.call_args.kwargs["messages"]
+        assert sent[0]["content"] == "rules"
+        assert TokenCounter().count_messages(sent, "gpt-4o") <= 60
+        assert sent[-1]["content"] == words(10)
+
+    def test_no_compaction_under_budget(self, client):
+        """Test the history is left alone while it fits."""
+        conversation = Conversation(client, max_prompt_tokens=1000)
+        conversation.add("user", "a")
+        conversation.add("assistant", "b")
+
+        conversation.compact()
+
+        assert len(conversation) == 2
+
+    def test_unknown_model_disables_compaction(self, client):
+        """Test no budget is derived for a model with unknown context window."""
+        assert Conversation(client, model="custom").max_prompt_tokens is None
+
+    def test_default_budget_of_newer_models(self, client):
+        """Test gpt-4.1 conversations get gpt-4.1's budget, not gpt-4's."""
+        assert Conversation(client, model="gpt-4.1").max_prompt_tokens > 1_000_000
+        assert Conversation(client, model="gpt-4").max_prompt_tokens < 8_192
+
+    def test_sliding_window(self, client):
+        """Test only the most recent messages are kept."""
+        conversation = Conversation(client, system_prompt="rules", strategy=SlidingWindow(max_messages=2))
+        for index in range(5):
+            conversation.add("user", f"question {index}")
+
+        conversation.compact()
+
+        assert [message["content"] for message in conversation.messages] == ["rules", "question 3", "question 4"]
+
+    def test_summarize_older(self, client):
+        """Test older turns are replaced by a summary from the cheaper model."""
+        summarizer = MagicMock(spec=["chat_completion"])
+        summarizer.chat_completion.return_value = reply("they talked")
+        strategy = SummarizeOlder(summarizer, model="gpt-4o-mini", keep_recent=2)
+        conversation = Conversation(client, system_prompt="rules", max_prompt_tokens=50, strategy=strategy)
+        for _ in range(3):
+            conversation.add("user", words(10))
+            conversation.add("assistant", words(10))
+
+        conversation.compact()
+
+        roles = [message["role"] for message in conversation.messages]
+        assert roles == ["system", "system", "user", "assistant"]
+        assert conversation.messages[1]["content"] == SUMMARY_PREFIX + "they talked"
+        assert summarizer.chat_completion.call_args.kwargs["model"] == "gpt-4o-mini"
+        assert conversation.prompt_tokens <= 50
+
+    def test_summaries_are_folded(self, client):
+        """Test an earlier summary is summarized again rather than kept."""
+        summarizer = MagicMock(spec=["chat_completion"])
+        summarizer.chat_completion.return_value = reply("new summary")
+        messages = [
+            {"role": "system", "content": SUMMARY_PREFIX + "old summary"},
+            {"role": "user", "content": words(20)},
+            {"role": "user", "content": "latest"},
+        ]
+
+        compacted = SummarizeOlder(summarizer, keep_recent=1).compact(messages, 20, lambda m: len(m["content"].split()))
+
+        transcript = summarizer.chat_completion.call_args.kwargs["messages"][1]["content"]
+        assert "old summary" in transcript
+        assert [message["content"] for message in compacted] == [SUMMARY_PREFIX + "new summary", "latest"]
+
+    def test_drop_oldest_keeps_last_message(self):
+        """Test the last message survives even when it alone is over budget."""
+        messages = [{"role": "user", "content": "a"}, {"role": "user", "content": "b"}]
+
+        assert DropOldest().compact(messages, 0, lambda message: 5) == [messages[1]]
@@ -0,0 +1,195 @@
+"""
+Tests for the embedding micro-batcher.
+"""
+
+import os
+import sys
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+import numpy as np
+import pytest
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_batcher import AsyncEmbeddingBatcher, EmbeddingBatcher
+from metrics import ClientMetrics
+from openai_client import OpenAIClient, AsyncOpenAIClient
+
+
+def length_embeddings(texts, model, as_numpy=False):
+    """Embed each text as [len(text)]."""
+    vectors = [[float(len(text))] for text in texts]
+    return np.asarray(vectors, dtype=np.float32) if as_numpy else vectors
+
+
+def make_client(create_embeddings):
+    """Build a stand-in client with metrics and a create_embeddings mock."""
+    return SimpleNamespace(metrics=ClientMetrics(), create_embeddings=create_embeddings)
+
+
+class TestEmbeddingBatcher:
+    """Tests for EmbeddingBatcher."""
+
+    def embed_concurrently(self, batcher, texts, **kwargs):
+        """Call embed from one thread per text and return results in text order."""
+        results = [None] * len(texts)
+
+        def run(index):
+            results[index] = batcher.embed(texts[index], **kwargs)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(texts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_full_batch_is_sent_at_once(self):
+        """Test concurrent calls are combined into one request."""
+        client = make_client(MagicMock(side_effect=length_embeddings))
+        batcher = EmbeddingBatcher(client, max_batch_size=4, max_delay=5)
+
+        results = self.embed_concurrently(batcher, ["a", "bb", "ccc", "dddd"], model="m")
+
+        assert results == [[1.0], [2.0], [3.0], [4.0]]
+        client.create_embeddings.assert_called_once()
+        assert sorted(client.create_embeddings.call_args.args[0]) == ["a", "bb", "ccc", "dddd"]
+        assert client.metrics.counter("embedding_batch.batches") == 1
+        assert client.metrics.counter("embedding_batch.inputs") == 4
+
+    def test_partial_batch_is_sent_after_delay(self):
+        """Test a lone call is sent once max_delay has passed."""
+        client = make_client(MagicMock(side_effect=length_embeddings))
+        batcher = EmbeddingBatcher(client, max_batch_size=64, max_delay=0.01)
+
+        assert batcher.embed("abc", model="m") == [3.0]
+        client.create_embeddings.assert_called_once_with(["abc"], model="m", as_numpy=False)
+
+    def test_repeated_texts_are_sent_once(self):
+        """Test identical texts in a batch share one input."""
+        client = make_client(MagicMock(side_effect=length_embeddings))
+        batcher = EmbeddingBatcher(client, max_batch_size=3, max_delay=5)
+
+        results = self.embed_concurrently(batcher, ["a", "a", "bb"], model="m")
+
+        assert results == [[1.0], [1.0], [2.0]]
+        assert sorted(client.create_embeddings.call_args.args[0]) == ["a", "bb"]
+
+    def test_numpy_rows(self):
+        """Test as_numpy callers receive their row of the batch matrix."""
+        client = make_client(MagicMock(side_effect=length_embeddings))
+        batcher = EmbeddingBatcher(client, max_batch_size=2, max_delay=5)
+
+        results = self.embed_concurrently(batcher, ["a", "bb"], model="m", as_numpy=True)
+
+        assert [result.tolist() for result in results] == [[1.0], [2.0]]
+
+    def test_error_is_raised_for_every_caller(self):
+        """Test a failed batch raises its error in every caller."""
+        client = make_client(MagicMock(side_effect=RuntimeError("boom")))
+        batcher = EmbeddingBatcher(client, max_batch_size=2, max_delay=5)
+        errors = []
+
+        def run(text):
+            try:
+                batcher.embed(text, model="m")
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(text,)) for text in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(errors) == 2
+
+
+class TestAsyncEmbeddingBatcher:
+    """Tests for AsyncEmbeddingBatcher."""
+
+    def test_full_batch_is_sent_at_once(self):
+        """Test concurrent calls are combined into one request."""
+        client = make_client(AsyncMock(side_effect=length_embeddings))
+        batcher = AsyncEmbeddingBatcher(client, max_batch_size=3, max_delay=5)
+
+        async def main():
+            return await asyncio.gather(*(batcher.embed(text, model="m") for text in ["a", "bb", "a"]))
+
+        assert asyncio.run(main()) == [[1.0], [2.0], [1.0]]
+        client.create_embeddings.assert_awaited_once_with(["a", "bb"], model="m", as_numpy=False)
+
+    def test_partial_batch_is_sent_after_delay(self):
+        """Test calls arriving within max_delay share a request."""
+        client = make_client(AsyncMock(side_effect=length_embeddings))
+        batcher = AsyncEmbeddingBatcher(client, max_batch_size=64, max_delay=0.01)
+
+        async def main():
+            return await asyncio.gather(batcher.embed("a", model="m"), batcher.embed("bb", model="m"))
+
+        assert asyncio.run(main()) == [[1.0], [2.0]]
+        client.create_embeddings.assert_awaited_once()
+
+    def test_error_is_raised_for_every_caller(self):
+        """Test a failed batch raises its error in every caller."""
+        client = make_client(AsyncMock(side_effect=RuntimeError("boom")))
+        batcher = AsyncEmbeddingBatcher(client, max_batch_size=2, max_delay=5)
+
+        async def main():
+            return await asyncio.gather(
+                batcher.embed("a", model="m"), batcher.embed("b", model="m"), return_exceptions=True
+            )
+
+        assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+    def test_cancelled_caller_does_not_affect_batch(self):
+        """Test the other callers still get their vectors if one is cancelled."""
+        client = make_client(AsyncMock(side_effect=length_embeddings))
+        batcher = AsyncEmbeddingBatcher(client, max_batch_size=64, max_delay=0.01)
+
+        async def main():
+            cancelled = asyncio.create_task(batcher.embed("a", model="m"))
+            kept = asyncio.create_task(batcher.embed("bb", model="m"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            return await kept
+
+        assert asyncio.run(main()) == [2.0]
+
+
+class TestClientIntegration:
+    """Tests for create_embedding with batching enabled."""
+
+    def test_create_embedding_uses_batcher(self):
+        """Test create_embedding routes through the batcher when enabled."""
+        client = OpenAIClient(api_key="test-key", embedding_batch_delay=0.01)
+        client.client = MagicMock()
+        client.client.embeddings.create.side_effect = lambda model, input: SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)],
+            usage=SimpleNamespace(prompt_tokens=len(input), total_tokens=len(input)),
+        )
+
+        assert client.create_embedding("abc", model="m") == [3.0]
+        client.client.embeddings.create.assert_called_once_with(model="m", input=["abc"])
+        assert client.metrics.counter("embedding_batch.batches") == 1
+
+    @pytest.mark.parametrize("client_class", [OpenAIClient, AsyncOpenAIClient])
+    def test_batching_disabled_by_default(self, client_class):
+        """Test no batcher is created unless a delay is given."""
+        assert client_class(api_key="test-key").embedding_batcher is None
+
+    def test_async_create_embedding_uses_batcher(self):
+        """Test async create_embedding calls are batched."""
+        client = AsyncOpenAIClient(api_key="test-key", embedding_batch_delay=0.01)
+        client.create_embeddings = AsyncMock(side_effect=length_embeddings)
+
+        async def main():
+            return await asyncio.gather(
+                client.create_embedding("a", model="m"), client.create_embedding("bb", model="m")
+            )
+
+        assert asyncio.run(main()) == [[1.0], [2.0]]
+        client.create_embeddings.assert_awaited_once()
@@ -0,0 +1,24 @@
+"""
+Tests for the fast_json module.
+"""
+
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fast_json
+
+
+class TestFastJson:
+    """Test suite for fast JSON decoding."""
+
+    def test_loads_bytes_and_text(self):
+        """Test bytes and text decode to the same value."""
+        assert fast_json.loads(b'{"a": [1, 2.5, null]}') == {"a": [1, 2.5, None]}
+        assert fast_json.loads('{"a": "\\u00e9"}') == {"a": "é"}
+
+    def test_falls_back_to_json(self):
+        """Test the standard library decoder is used without orjson."""
+        with patch("fast_json.orjson", None):
+            assert fast_json.loads(b'{"ok": true}') == {"ok": True}
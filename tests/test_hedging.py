@@ -0,0 +1,272 @@
+"""
+Tests for hedged requests.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hedging import HedgeBudget, Hedger, HedgingPolicy
+from metrics import ClientMetrics
+from openai_client import OpenAIClient, AsyncOpenAIClient
+
+
+def make_hedger(latency=0.02, samples=20, **policy):
+    """Build a hedger whose metrics already hold samples latencies."""
+    metrics = ClientMetrics()
+    for _ in range(samples):
+        metrics.observe("op.latency", latency)
+    return Hedger(HedgingPolicy(min_delay=0.01, **policy), metrics)
+
+
+def slow_then_fast(slow=0.5, result="slow", fast_result="fast"):
+    """Return a call whose first invocation is slow and later ones are fast."""
+    calls = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        if first:
+            time.sleep(slow)
+            return result
+        return fast_result
+
+    call.calls = calls
+    return call
+
+
+@pytest.fixture
+def make_completion_response():
+    """Return a factory for SDK-shaped chat completions."""
+    def make(content):
+        return SimpleNamespace(
+            id="chatcmpl-test",
+            object="chat.completion",
+            created=1700000000,
+            model="gpt-4o",
+            choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content),
+                                     finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2),
+        )
+    return make
+
+
+class TestHedgeBudget:
+    """Tests for HedgeBudget."""
+
+    def test_budget_limits_hedges(self):
+        """Test hedges are limited to the burst plus the earned ratio."""
+        budget = HedgeBudget(ratio=0.5, burst=1)
+
+        assert budget.try_spend()
+        assert not budget.try_spend()
+        budget.deposit()
+        assert not budget.try_spend()
+        budget.deposit()
+        assert budget.try_spend()
+
+    def test_deposits_are_capped(self):
+        """Test the budget never exceeds its burst."""
+        budget = HedgeBudget(ratio=1.0, burst=2)
+        for _ in range(10):
+            budget.deposit()
+
+        assert budget.tokens == 2
+
+
+class TestHedger:
+    """Tests for Hedger."""
+
+    def test_delay_needs_samples(self):
+        """Test no hedging delay is given until enough latencies are observed."""
+        assert make_hedger(samples=5).delay("op.latency") is None
+        assert make_hedger(latency=0.2).delay("op.latency") == 0.2
+        assert make_hedger(latency=0.001).delay("op.latency") == 0.01
+
+    def test_fast_call_is_not_hedged(self):
+        """Test a call finishing before the delay runs once."""
+        hedger = make_hedger(latency=1.0)
+        call = MagicMock(return_value="result")
+
+        assert hedger.run("op", call, "op.latency") == "result"
+        assert call.call_count == 1
+        assert hedger.metrics.counter("op.hedges") == 0
+
+    def test_slow_call_is_hedged(self):
+        """Test a slow call is duplicated and the faster result returned."""
+        hedger = make_hedger()
+        call = slow_then_fast()
+        discarded = []
+
+        assert hedger.run("op", call, "op.latency", discard=discarded.append) == "fast"
+        assert hedger.metrics.counter("op.hedges") == 1
+        assert hedger.metrics.counter("op.hedge_wins") == 1
+        time.sleep(0.6)
+        assert discarded == ["slow"]
+
+    def test_no_hedge_without_budget(self):
+        """Test a slow call is waited for when the budget is spent."""
+        hedger = make_hedger(burst=0)
+        call = slow_then_fast(slow=0.05)
+
+        assert hedger.run("op", call, "op.latency") == "slow"
+        assert len(call.calls) == 1
+
+    def test_failed_hedge_falls_back_to_primary(self):
+        """Test the primary's result is used when the hedge fails."""
+        hedger = make_hedger()
+        calls = []
+
+        def call():
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.1)
+                return "primary"
+            raise RuntimeError("hedge failed")
+
+        assert hedger.run("op", call, "op.latency") == "primary"
+        assert hedger.metrics.counter("op.hedge_wins") == 0
+
+    def test_all_failures_raise_primary_error(self):
+        """Test the primary's error is raised when every attempt fails."""
+        hedger = make_hedger()
+        calls = []
+
+        def call():
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.05)
+                raise ValueError("primary")
+            raise RuntimeError("hedge")
+
+        with pytest.raises(ValueError):
+            hedger.run("op", call, "op.latency")
+
+    def test_async_slow_call_is_hedged_and_loser_cancelled(self):
+        """Test the async loser is cancelled once the hedge wins."""
+        hedger = make_hedger()
+        cancelled = []
+        calls = []
+
+        async def call():
+            calls.append(1)
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    cancelled.append(1)
+                    raise
+                return "slow"
+            return "fast"
+
+        async def main():
+            result = await hedger.arun("op", call, "op.latency")
+            await asyncio.sleep(0)
+            return result
+
+        assert asyncio.run(main()) == "fast"
+        assert cancelled == [1]
+        assert hedger.metrics.counter("op.hedge_wins") == 1
+
+    def test_async_fast_call_is_not_hedged(self):
+        """Test an async call finishing before the delay runs once."""
+        hedger = make_hedger(latency=1.0)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            return "result"
+
+        assert asyncio.run(hedger.arun("op", call, "op.latency")) == "result"
+        assert len(calls) == 1
+
+    def test_async_all_failures_raise_primary_error(self):
+        """Test the primary's error is raised when every async attempt fails."""
+        hedger = make_hedger()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(0.05)
+                raise ValueError("primary")
+            raise RuntimeError("hedge")
+
+        with pytest.raises(ValueError):
+            asyncio.run(hedger.arun("op", call, "op.latency"))
+
+
+class TestClientIntegration:
+    """Tests for hedged chat completions."""
+
+    def test_chat_completion_is_hedged(self, make_completion_response):
+        """Test a slow chat completion is answered by its hedge."""
+        client = OpenAIClient(api_key="test-key", hedging=HedgingPolicy(min_samples=1, min_delay=0.01))
+        client.client = MagicMock()
+        client.metrics.observe("chat_completion.latency", 0.01)
+        responses = iter([("Slow", 0.5), ("Fast", 0)])
+
+        def create(**kwargs):
+            content, delay = next(responses)
+            time.sleep(delay)
+            return make_completion_response(content)
+
+        client.client.chat.completions.create.side_effect = create
+
+        result = client.chat_completion(messages=[{"role": "user", "content": "Hi"}])
+
+        assert result.content == "Fast"
+        assert client.metrics.counter("chat_completion.hedges") == 1
+        assert client.metrics.counter("chat_completion.requests") == 2
+
+    def test_async_stream_is_hedged_on_first_token(self, make_completion_response):
+        """Test a stream slow to produce its first token is replaced by its hedge."""
+        client = AsyncOpenAIClient(api_key="test-key", hedging=HedgingPolicy(min_samples=1, min_delay=0.01))
+        client.client = MagicMock()
+        client.metrics.observe("chat_completion.ttft", 0.01)
+        closed = []
+
+        def chunk(content):
+            return SimpleNamespace(
+                id="chatcmpl-test", created=1700000000, model="gpt-4o", usage=None,
+                choices=[SimpleNamespace(index=0, delta=SimpleNamespace(role=None, content=content),
+                                         finish_reason=None)],
+            )
+
+        class Stream:
+            def __init__(self, name, delay):
+                self.name, self.delay = name, delay
+
+            async def __aiter__(self):
+                yield chunk(None)
+                await asyncio.sleep(self.delay)
+                yield chunk(self.name)
+
+            async def close(self):
+                closed.append(self.name)
+
+        streams = iter([Stream("slow", 1), Stream("fast", 0)])
+
+        async def create(**kwargs):
+            return next(streams)
+
+        client.client.chat.completions.create.side_effect = create
+
+        async def main():
+            stream = await client.stream_chat_completion(messages=[{"role": "user", "content": "Hi"}])
+            return [delta async for delta in stream]
+
+        assert asyncio.run(main()) == ["fast"]
+        assert client.metrics.counter("chat_completion_stream.hedge_wins") == 1
+        assert "slow" in closed
+
@@ -0,0 +1,274 @@
+"""
+Tests for the shared HTTP connection pools.
+"""
+
+import os
+import sys
+import asyncio
+import pytest
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_pool
+from http_pool import ClientRegistry, PoolConfig
+from openai_client import OpenAIClient, AsyncOpenAIClient
+
+
+class TestPoolConfig:
+    """Tests for PoolConfig."""
+
+    def test_client_kwargs(self):
+        """Test the settings are turned into httpx limits and timeouts."""
+        kwargs = PoolConfig(max_connections=10, max_keepalive_connections=4, keepalive_expiry=15.0,
+                            connect_timeout=2.0, timeout=30.0).client_kwargs()
+
+        assert kwargs["limits"].max_connections == 10
+        assert kwargs["limits"].max_keepalive_connections == 4
+        assert kwargs["limits"].keepalive_expiry == 15.0
+        assert kwargs["timeout"].connect == 2.0
+        assert kwargs["timeout"].read == 30.0
+        assert kwargs["http2"] is False
+
+
+class TestClientRegistry:
+    """Tests for ClientRegistry."""
+
+    def test_reuses_client_per_key_and_base_url(self):
+        """Test one client is shared per (api_key, base_url)."""
+        registry = ClientRegistry()
+
+        first = registry.http_client("key-a")
+        assert registry.http_client("key-a") is first
+        assert registry.http_client("key-b") is not first
+        assert registry.http_client("key-a", "http://localhost:8000/v1") is not first
+        assert len(registry) == 3
+        registry.close()
+
+    def test_applies_config(self):
+        """Test created clients use the registry's pool settings."""
+        registry = ClientRegistry(PoolConfig(timeout=42.0))
+
+        assert registry.http_client("key").timeout.read == 42.0
+        registry.close()
+
+    def test_recreates_closed_client(self):
+        """Test a client closed elsewhere is replaced."""
+        registry = ClientRegistry()
+        first = registry.http_client("key")
+        first.close()
+
+        assert registry.http_client("key") is not first
+        registry.close()
+
+    def test_close(self):
+        """Test close closes sync clients and forgets all clients."""
+        registry = ClientRegistry()
+        client = registry.http_client("key")
+        registry.async_http_client("key")
+
+        registry.close()
+
+        assert client.is_closed
+        assert len(registry) == 0
+
+    def test_async_clients_are_per_event_loop(self):
+        """Test async clients are shared within a loop but not across loops."""
+        registry = ClientRegistry()
+
+        async def get_twice():
+            return registry.async_http_client("key"), registry.async_http_client("key")
+
+        first, second = asyncio.run(get_twice())
+        other, _ = asyncio.run(get_twice())
+
+        assert first is second
+        assert other is not first
+
+        async def get_and_close():
+            client = registry.async_http_client("key")
+            await registry.aclose()
+            return client
+
+        assert asyncio.run(get_and_close()).is_closed
+
+    def test_pools_of_closed_loops_are_forgotten(self):
+        """Test pools are not kept once their event loop has closed."""
+        registry = ClientRegistry()
+
+        async def get():
+            return registry.async_http_client("key")
+
+        for _ in range(3):
+            asyncio.run(get())
+
+        assert len(registry) == 0
+
+    def test_client_created_outside_loop_uses_running_loop(self):
+        """Test a client requested outside a loop sends through the pool of the loop running at request time."""
+        registry = ClientRegistry()
+        client = registry.async_http_client("key")
+        loop_pools = []
+
+        async def send():
+            pool = registry.async_http_client("key")
+            pool._transport = http_pool.httpx.MockTransport(lambda request: http_pool.httpx.Response(204))
+            loop_pools.append(pool)
+            return await client.send(client.build_request("GET", "http://api.test/"))
+
+        assert [asyncio.run(send()).status_code for _ in range(2)] == [204, 204]
+        assert loop_pools[0] is not loop_pools[1]
+        assert registry.async_http_client("key") is client
+
+    def test_reset_after_fork(self):
+        """Test registries forget their clients in a forked child."""
+        registry = ClientRegistry()
+        client = registry.http_client("key")
+
+        http_pool._reset_after_fork()
+
+        assert len(registry) == 0
+        assert not client.is_closed
+        assert registry.http_client("key") is not client
+        client.close()
+        registry.close()
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+    def test_child_process_gets_new_pool(self):
+        """Test a forked child does not reuse the parent's client."""
+        registry = ClientRegistry()
+        parent_client = registry.http_client("key")
+        read_fd, write_fd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover - runs in the child
+            shared = registry.http_client("key") is parent_client
+            os.write(write_fd, b"1" if shared else b"0")
+            os._exit(0)
+
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        registry.close()
+
+        assert result == b"0"
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+    def test_client_created_before_fork_uses_child_pool(self):
+        """Test an OpenAIClient built before os.fork() sends through the child's pool."""
+        registry = ClientRegistry()
+        client = OpenAIClient(api_key="key", http_pool=registry)
+        registry.http_client("key")._transport = http_pool.httpx.MockTransport(
+            lambda request: http_pool.httpx.Response(500)
+        )
+        read_fd, write_fd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover - runs in the child
+            registry.http_client("key")._transport = http_pool.httpx.MockTransport(
+                lambda request: http_pool.httpx.Response(204)
+            )
+            sdk_http = client.client._client
+            response = sdk_http.send(sdk_http.build_request("GET", "http://api.test/"))
+            os.write(write_fd, b"1" if response.status_code == 204 else b"0")
+            os._exit(0)
+
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        registry.close()
+
+        assert result == b"1"
+
+    def test_listen_for_headers(self):
+        """Test response headers reach the listener only inside listen_for_headers."""
+        registry = ClientRegistry()
+        client = registry.http_client("key")
+        client._transport = http_pool.httpx.MockTransport(
+            lambda request: http_pool.httpx.Response(200, headers={"x-ratelimit-remaining-requests": "7"})
+        )
+        seen = []
+
+        with http_pool.listen_for_headers(lambda headers: seen.append(headers["x-ratelimit-remaining-requests"])):
+            client.get("https://api.test/v1/models")
+        client.get("https://api.test/v1/models")
+
+        assert seen == ["7"]
+        registry.close()
+
+    def test_async_listen_for_headers(self):
+        """Test async clients report headers to the listener of the calling task."""
+        registry = ClientRegistry()
+        seen = []
+
+        def listener(headers):
+            seen.append(headers["x-ratelimit-remaining-tokens"])
+
+        async def main():
+            client = registry.async_http_client("key")
+            client._transport = http_pool.httpx.MockTransport(
+                lambda request: http_pool.httpx.Response(200, headers={"x-ratelimit-remaining-tokens": "9"})
+            )
+            with http_pool.listen_for_headers(listener):
+                await client.get("https://api.test/v1/models")
+            await registry.aclose()
+
+        asyncio.run(main())
+
+        assert seen == ["9"]
+
+
+class TestClientIntegration:
+    """Tests for OpenAIClient's use of the registry."""
+
+    def test_clients_share_connection_pool(self):
+        """Test clients with the same key and base URL share one HTTP client."""
+        registry = ClientRegistry()
+
+        first = OpenAIClient(api_key="test-key", http_pool=registry)
+        second = OpenAIClient(api_key="test-key", http_pool=registry)
+        other = OpenAIClient(api_key="test-key", base_url="http://localhost:8000/v1", http_pool=registry)
+
+        assert first.client._client is second.client._client
+        assert other.client._client is not first.client._client
+        assert str(other.client.base_url) == "http://localhost:8000/v1/"
+        registry.close()
+
+    def test_async_clients_share_connection_pool(self):
+        """Test async clients created in the same loop share one HTTP client."""
+        registry = ClientRegistry()
+
+        async def create():
+            return (
+                AsyncOpenAIClient(api_key="test-key", http_pool=registry),
+                AsyncOpenAIClient(api_key="test-key", http_pool=registry),
+            )
+
+        first, second = asyncio.run(create())
+
+        assert first.client._client is second.client._client
+        asyncio.run(registry.aclose())
+
+    def test_closing_a_client_keeps_shared_pool_open(self):
+        """Test closing one async client leaves the pool other clients use open."""
+        registry = ClientRegistry()
+
+        async def main():
+            first = AsyncOpenAIClient(api_key="test-key", http_pool=registry)
+            second = AsyncOpenAIClient(api_key="test-key", http_pool=registry)
+            async with first:
+                pass
+            closed = second.client._client.is_closed
+            await registry.aclose()
+            return closed, second.client._client.is_closed
+
+        assert asyncio.run(main()) == (False, True)
+
+    def test_default_registry(self):
+        """Test clients use the process-wide registry by default."""
+        client = OpenAIClient(api_key="test-key")
+
+        assert client.http_pool is http_pool.default_registry
+        assert client.client._client is http_pool.default_registry.process_http_client("test-key")
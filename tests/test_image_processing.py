@@ -0,0 +1,140 @@
+"""
+Tests for the image_processing module.
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_processing import (
+    ImagePreprocessConfig,
+    PreparedImage,
+    detect_mime_type,
+    estimate_image_tokens,
+    prepare_image,
+    prepare_images,
+    read_image_source,
+    target_size,
+)
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def make_image(size, mode="RGB", format="PNG"):
+    """Encode a noisy test image so re-encoding cannot trivially shrink it."""
+    image = Image.effect_noise(size, 64).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class TestImageProcessing:
+    """Test suite for image preparation."""
+
+    def test_detect_mime_type(self):
+        """Test formats are detected from magic bytes."""
+        assert detect_mime_type(b"\xff\xd8\xff\xe0rest") == "image/jpeg"
+        assert detect_mime_type(b"\x89PNG\r\n\x1a\nrest") == "image/png"
+        assert detect_mime_type(b"GIF89arest") == "image/gif"
+        assert detect_mime_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+        assert detect_mime_type(b"unknown") == "image/jpeg"
+
+    def test_target_size(self):
+        """Test the high-detail scaling rules."""
+        assert target_size(4096, 8192) == (768, 1536)
+        assert target_size(4000, 3000) == (1024, 768)
+        assert target_size(600, 400) == (600, 400)
+
+    def test_estimate_image_tokens(self):
+        """Test token estimates per detail level."""
+        assert estimate_image_tokens(4000, 3000, "low") == 85
+        assert estimate_image_tokens(4000, 3000) == 85 + 170 * 4
+        assert estimate_image_tokens(500, 500) == 85 + 170
+
+    def test_prepare_without_config_keeps_bytes(self):
+        """Test images pass through unchanged without a config."""
+        data = make_image((10, 10))
+
+        prepared = prepare_image(data)
+
+        assert prepared.data == data
+        assert prepared.mime_type == "image/png"
+        assert prepared.detail == "high"
+
+    def test_prepare_downscales_large_image(self):
+        """Test large images are resized and re-encoded as JPEG."""
+        data = make_image((1600, 1200))
+
+        prepared = prepare_image(data, ImagePreprocessConfig())
+
+        assert (prepared.width, prepared.height) == (1024, 768)
+        assert prepared.detail == "high"
+        assert prepared.mime_type == "image/jpeg"
+        assert len(prepared.data) < len(data)
+        assert Image.open(io.BytesIO(prepared.data)).size == (1024, 768)
+
+    def test_prepare_small_image_uses_low_detail(self):
+        """Test small images are sent with low detail."""
+        prepared = prepare_image(make_image((300, 200)), ImagePreprocessConfig())
+
+        assert prepared.detail == "low"
+        assert (prepared.width, prepared.height) == (300, 200)
+
+    def test_prepare_forced_low_detail_fits_tile(self):
+        """Test a forced low detail level shrinks the image to one tile."""
+        prepared = prepare_image(make_image((1024, 768)), ImagePreprocessConfig(detail="low"))
+
+        assert prepared.detail == "low"
+        assert (prepared.width, prepared.height) == (512, 384)
+
+    def test_prepare_keeps_transparency(self):
+        """Test images with alpha are re-encoded as PNG."""
+        prepared = prepare_image(make_image((1600, 800), mode="RGBA"), ImagePreprocessConfig())
+
+        assert prepared.mime_type == "image/png"
+        assert Image.open(io.BytesIO(prepared.data)).mode == "RGBA"
+
+    def test_prepare_keeps_smaller_original(self):
+        """Test the original is kept when re-encoding would not shrink it."""
+        data = make_image((600, 600), format="JPEG")
+
+        prepared = prepare_image(data, ImagePreprocessConfig(quality=100))
+
+        assert prepared.data == data
+        assert prepared.mime_type == "image/jpeg"
+
+    def test_read_image_source(self, tmp_path):
+        """Test paths, bytes and file-like objects are read."""
+        path = tmp_path / "image.png"
+        path.write_bytes(b"data")
+
+        assert read_image_source(str(path)) == b"data"
+        assert read_image_source(path) == b"data"
+        assert read_image_source(bytearray(b"data")) == b"data"
+        assert read_image_source(io.BytesIO(b"data")) == b"data"
+
+    def test_prepare_images_in_processes(self):
+        """Test parallel preprocessing keeps input order."""
+        images = [make_image((1600, 1200)), make_image((300, 200))]
+
+        prepared = prepare_images(images, ImagePreprocessConfig(), max_workers=2)
+
+        assert [(image.width, image.height) for image in prepared] == [(1024, 768), (300, 200)]
+
+    def test_prepare_images_without_config(self):
+        """Test images are wrapped inline when no preprocessing is requested."""
+        prepared = prepare_images([b"GIF89a", b"\xff\xd8\xff"])
+
+        assert [image.mime_type for image in prepared] == ["image/gif", "image/jpeg"]
+
+    def test_content_part(self):
+        """Test the image_url content part carries the MIME type and detail."""
+        part = PreparedImage(data=b"abc", mime_type="image/png", detail="low").content_part()
+
+        assert part == {
+            "type": "image_url",
+            "image_url": {"url": "data:image/png;base64,YWJj", "detail": "low"},
+        }
@@ -0,0 +1,205 @@
+"""
+Tests for the key_pool module.
+"""
+
+import os
+import sys
+import json
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from openai import RateLimitError
+import http_pool
+from http_pool import ClientRegistry
+from key_pool import ApiKey, KeyPool
+from metrics import ClientMetrics
+from openai_client import OpenAIClient, AsyncOpenAIClient
+
+clock_module = "key_pool"
+
+
+def make_pool(*names):
+    """Build a pool of keys named after their last characters."""
+    return KeyPool([ApiKey(f"sk-{name}", name=name) for name in names], ClientMetrics())
+
+
+def rate_headers(requests=None, tokens=None, reset="1s"):
+    """Build x-ratelimit-* headers with the given remaining requests and tokens."""
+    headers = {"x-ratelimit-limit-requests": "100", "x-ratelimit-limit-tokens": "10000"}
+    if requests is not None:
+        headers.update({"x-ratelimit-remaining-requests": str(requests), "x-ratelimit-reset-requests": reset})
+    if tokens is not None:
+        headers.update({"x-ratelimit-remaining-tokens": str(tokens), "x-ratelimit-reset-tokens": reset})
+    return headers
+
+
+class TestApiKey:
+    """Test suite for ApiKey."""
+
+    def test_default_name_hides_key(self):
+        """Test keys are named by their last characters and never printed in full."""
+        key = ApiKey("sk-secret-abcd", organization="org-1")
+
+        assert key.name == "key-abcd"
+        assert "secret" not in repr(key)
+
+
+class TestKeyPool:
+    """Test suite for KeyPool."""
+
+    def test_requires_unique_keys(self):
+        """Test an empty pool or repeated names are rejected."""
+        with pytest.raises(ValueError):
+            KeyPool([])
+        with pytest.raises(ValueError):
+            KeyPool(["sk-1-abcd", "sk-2-abcd"])
+
+    def test_unknown_keys_are_tried_first(self, clock):
+        """Test a key without headers is preferred over one with known limits."""
+        pool = make_pool("a", "b")
+        pool.update(pool.keys[0], rate_headers(requests=90, tokens=9000))
+
+        assert pool.choose().name == "b"
+
+    def test_most_request_headroom(self, clock):
+        """Test the key with the most requests left is chosen."""
+        pool = make_pool("a", "b")
+        pool.update(pool.keys[0], rate_headers(requests=10, tokens=9000))
+        pool.update(pool.keys[1], rate_headers(requests=50, tokens=9000))
+
+        assert pool.choose(tokens=10).name == "b"
+
+    def test_token_headroom_for_large_requests(self, clock):
+        """Test a large request goes to the key with the most tokens left."""
+        pool = make_pool("a", "b")
+        pool.update(pool.keys[0], rate_headers(requests=90, tokens=2000))
+        pool.update(pool.keys[1], rate_headers(requests=10, tokens=8000))
+
+        assert pool.choose(tokens=1000).name == "b"
+        assert pool.choose(tokens=1).name == "a"
+
+    def test_in_flight_work_is_subtracted(self, clock):
+        """Test requests in flight on a key count against its headroom."""
+        pool = make_pool("a", "b")
+        pool.update(pool.keys[0], rate_headers(requests=10))
+        pool.update(pool.keys[1], rate_headers(requests=8))
+
+        pool._start(pool.keys[0], 0)
+        pool._start(pool.keys[0], 0)
+        pool._start(pool.keys[0], 0)
+
+        assert pool.choose().name == "b"
+        assert pool.snapshot()["a"]["in_flight"] == 3
+
+    def test_limit_is_restored_after_reset(self, clock):
+        """Test a key is assumed to have its full limit once its reset time passes."""
+        pool = make_pool("a")
+        pool.update(pool.keys[0], rate_headers(requests=0, tokens=0, reset="6m0s"))
+
+        assert pool.snapshot()["a"]["remaining_requests"] == 0
+
+        clock.now += 360
+        assert pool.snapshot()["a"] == {"remaining_requests": 100, "remaining_tokens": 10000, "in_flight": 0}
+
+    def test_update_publishes_gauges(self, clock):
+        """Test remaining requests and tokens are published as gauges."""
+        pool = make_pool("a")
+
+        pool.update(pool.keys[0], {**rate_headers(requests=5, tokens=500), "x-ratelimit-limit-tokens": "n/a"})
+
+        assert pool.metrics.gauge("keys.a.remaining_requests") == 5
+        assert pool.metrics.gauge("keys.a.remaining_tokens") == 500
+
+    def test_call_reads_response_headers(self, clock):
+        """Test headers of responses received during a call update the key."""
+        pool = make_pool("a")
+
+        def call():
+            assert pool.snapshot()["a"]["in_flight"] == 1
+            http_pool._report_headers(MagicMock(headers=rate_headers(requests=42)))
+            return "ok"
+
+        assert pool.call(pool.keys[0], 10, call) == "ok"
+        assert pool.snapshot()["a"]["remaining_requests"] == 42
+        assert pool.snapshot()["a"]["in_flight"] == 0
+        assert pool.metrics.counter("keys.a.requests") == 1
+
+    def test_acall_releases_key_on_rate_limit(self, clock):
+        """Test a rate limited async call is re-raised and no longer counted in flight."""
+        pool = make_pool("a")
+        error = RateLimitError("slow down", response=MagicMock(status_code=429, headers={}), body=None)
+
+        async def call():
+            http_pool._report_headers(MagicMock(headers=rate_headers(requests=0)))
+            raise error
+
+        with pytest.raises(RateLimitError):
+            asyncio.run(pool.acall(pool.keys[0], 10, call))
+
+        assert pool.snapshot()["a"] == {"remaining_requests": 0, "remaining_tokens": float("inf"), "in_flight": 0}
+
+
+def serve_completions(remaining):
+    """Return an httpx handler answering chat requests with per-key remaining requests."""
+    def handler(request):
+        key = request.headers["authorization"].split()[-1]
+        body = {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 1700000000,
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": key}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+        return http_pool.httpx.Response(
+            200, content=json.dumps(body), headers=rate_headers(requests=remaining[key])
+        )
+    return handler
+
+
+class TestClientIntegration:
+    """Tests for clients using a key pool."""
+
+    def test_requests_go_to_key_with_most_headroom(self):
+        """Test rate limit headers from real HTTP responses steer later requests."""
+        registry = ClientRegistry()
+        pool = KeyPool(["sk-key-aaaa", "sk-key-bbbb"])
+        client = OpenAIClient(key_pool=pool, http_pool=registry)
+        transport = http_pool.httpx.MockTransport(serve_completions({"sk-key-aaaa": 5, "sk-key-bbbb": 50}))
+        for key in pool.keys:
+            registry.http_client(key.key)._transport = transport
+        messages = [{"role": "user", "content": "Hi"}]
+
+        answers = [client.chat_completion(messages=messages).content for _ in range(3)]
+
+        assert client.api_key == "sk-key-aaaa"
+        assert answers == ["sk-key-aaaa", "sk-key-bbbb", "sk-key-bbbb"]
+        assert client.metrics.gauge("keys.key-aaaa.remaining_requests") == 5
+        registry.close()
+
+    def test_async_client_uses_key_pool(self):
+        """Test async requests are sent with pooled keys and organizations."""
+        registry = ClientRegistry()
+        pool = KeyPool([ApiKey("sk-key-aaaa", organization="org-a"), "sk-key-bbbb"])
+        seen = []
+        handler = serve_completions({"sk-key-aaaa": 5, "sk-key-bbbb": 50})
+
+        def record(request):
+            seen.append(request.headers.get("openai-organization"))
+            return handler(request)
+
+        async def main():
+            client = AsyncOpenAIClient(key_pool=pool, http_pool=registry)
+            for key in pool.keys:
+                registry.async_http_client(key.key)._transport = http_pool.httpx.MockTransport(record)
+            async with client:
+                return [
+                    (await client.chat_completion(messages=[{"role": "user", "content": "Hi"}])).content
+                    for _ in range(2)
+                ]
+
+        assert asyncio.run(main()) == ["sk-key-aaaa", "sk-key-bbbb"]
+        assert seen == ["org-a", None]
@@ -0,0 +1,56 @@
+"""
+Tests for the metrics module.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import ClientMetrics, percentile
+
+
+class TestMetrics:
+    """Test suite for ClientMetrics."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        assert percentile([], 50) is None
+
+    def test_counters(self):
+        """Test counters accumulate."""
+        metrics = ClientMetrics()
+        metrics.increment("requests")
+        metrics.increment("requests", 2)
+
+        assert metrics.counter("requests") == 3
+        assert metrics.counter("missing") == 0
+
+    def test_observation_window(self):
+        """Test only the most recent observations are kept."""
+        metrics = ClientMetrics(window=3)
+        for value in [10.0, 1.0, 2.0, 3.0]:
+            metrics.observe("latency", value)
+
+        assert metrics.values("latency") == [1.0, 2.0, 3.0]
+        assert metrics.percentile("latency", 100) == 3.0
+
+    def test_snapshot_and_reset(self):
+        """Test snapshot summarizes counters and observations."""
+        metrics = ClientMetrics()
+        metrics.increment("requests")
+        metrics.set_gauge("state", 2)
+        metrics.observe("latency", 0.5)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"] == {"requests": 1}
+        assert snapshot["gauges"] == {"state": 2}
+        assert snapshot["observations"]["latency"]["p50"] == 0.5
+
+        metrics.reset()
+        assert metrics.snapshot() == {"counters": {}, "gauges": {}, "observations": {}}
+        assert metrics.gauge("state") is None
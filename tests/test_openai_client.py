@@ -2,15 +2,74 @@
 Tests for the OpenAI client.
 """
 
+import io
 import os
 import json
+import time
 import base64
-from unittest.mock import patch, mock_open
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch, mock_open, MagicMock, AsyncMock
+import numpy as np
 import pytest
 
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from openai_client import OpenAIClient
+from openai import BadRequestError, RateLimitError
+from openai_client import OpenAIClient, AsyncOpenAIClient, _batch_embedding_inputs
+from cache import EmbeddingCache, ImageCache, ResponseCache
+from retry import RetryPolicy
+from rate_limiter import RateLimit, RateLimiter
+from tokens import ContextWindowExceededError
+from results import ChatResult
+from singleflight import AsyncSingleFlight, SingleFlight
+from scheduler import AsyncRequestScheduler, RequestScheduler
+from image_processing import ImagePreprocessConfig, PreparedImage, prepare_images
+from tests.conftest import make_completion, make_status_error
+
+
+def make_raw_response(body):
+    """Build an object shaped like an SDK raw (with_raw_response) response."""
+    return SimpleNamespace(content=json.dumps(body).encode("utf-8"))
+
+
+RAW_COMPLETION = {
+    "id": "chatcmpl-raw",
+    "object": "chat.completion",
+    "created": 1700000000,
+    "model": "gpt-4o",
+    "choices": [
+        {"index": 0, "message": {"role": "assistant", "content": "Fast", "refusal": None}, "finish_reason": "stop"},
+    ],
+    "usage": {
+        "prompt_tokens": 5,
+        "completion_tokens": 1,
+        "total_tokens": 6,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    },
+}
+
+
+def make_embedding_response(vectors):
+    """Build an object shaped like an SDK CreateEmbeddingResponse."""
+    return SimpleNamespace(
+        data=[SimpleNamespace(index=i, embedding=v) for i, v in enumerate(vectors)],
+        usage=SimpleNamespace(prompt_tokens=len(vectors), total_tokens=len(vectors)),
+    )
+
+
+def echo_embeddings(model, input):
+    """Embedding side effect returning [len(text)] per input, in reverse order."""
+    vectors = [[float(len(text))] for text in input]
+    response = make_embedding_response(vectors)
+    response.data.reverse()
+    return response
+
+
+def encode_vector(values):
+    """Encode a vector the way the API does for encoding_format="base64"."""
+    return base64.b64encode(np.asarray(values, dtype=np.float32).tobytes()).decode("ascii")
 
 
 @pytest.fixture
@@ -19,6 +78,25 @@ def client(openai_api_key):
     return OpenAIClient(api_key=openai_api_key)
 
 
+@pytest.fixture
+def mock_client():
+    """Create an OpenAI client whose SDK client is a mock."""
+    client = OpenAIClient(api_key="test-key")
+    client.client = MagicMock()
+    return client
+
+
+@pytest.fixture
+def async_mock_client():
+    """Create an async OpenAI client whose SDK client is a mock."""
+    client = AsyncOpenAIClient(api_key="test-key")
+    client.client = MagicMock()
+    client.client.chat.completions.create = AsyncMock()
+    client.client.embeddings.create = AsyncMock()
+    client.client.close = AsyncMock()
+    return client
+
+
 @pytest.fixture
 def test_messages():
     """Return sample messages for testing."""
@@ -108,4 +186,694 @@ class TestOpenAIClient:
             client.chat_with_image(
                 messages=test_messages,
                 image_path="nonexistent.jpg"
-            )
\ No newline at end of file
+            )
+
+
+class TestOpenAIClientMocked:
+    """Mock-based tests for OpenAIClient."""
+
+    def test_rejects_components_of_the_other_client(self):
+        """Test sync and async single flight groups and schedulers are not interchangeable."""
+        with pytest.raises(TypeError, match="AsyncRequestScheduler"):
+            AsyncOpenAIClient(api_key="test-key", scheduler=RequestScheduler())
+        with pytest.raises(TypeError, match="AsyncSingleFlight"):
+            AsyncOpenAIClient(api_key="test-key", single_flight=SingleFlight())
+        with pytest.raises(TypeError, match="SingleFlight"):
+            OpenAIClient(api_key="test-key", single_flight=AsyncSingleFlight())
+        with pytest.raises(TypeError, match="RequestScheduler"):
+            OpenAIClient(api_key="test-key", scheduler=AsyncRequestScheduler())
+
+    def test_chat_completion_converts_response(self, mock_client, test_messages):
+        """Test the SDK response is converted to a dictionary."""
+        mock_client.client.chat.completions.create.return_value = make_completion("Hi there")
+
+        result = mock_client.chat_completion(messages=test_messages, temperature=0)
+
+        assert result["choices"][0]["message"]["content"] == "Hi there"
+        assert result["usage"]["total_tokens"] == 30
+        kwargs = mock_client.client.chat.completions.create.call_args.kwargs
+        assert kwargs["messages"] == test_messages
+        assert kwargs["temperature"] == 0
+
+    @patch("retry.time.sleep")
+    def test_chat_completion_retries_rate_limit(self, mock_sleep, mock_client, test_messages):
+        """Test a rate limited request is retried and counted in metrics."""
+        mock_client.client.chat.completions.create.side_effect = [
+            make_status_error(RateLimitError, 429, headers={"retry-after": "1"}),
+            make_completion("After retry"),
+        ]
+
+        result = mock_client.chat_completion(messages=test_messages)
+
+        assert result["choices"][0]["message"]["content"] == "After retry"
+        mock_sleep.assert_called_once_with(1.0)
+        assert mock_client.metrics.counter("chat_completion.retries") == 1
+        assert mock_client.metrics.counter("chat_completion.requests") == 1
+
+    def test_sdk_retries_disabled(self):
+        """Test the SDK's built-in retries are disabled in favour of the retry policy."""
+        client = OpenAIClient(api_key="test-key", retry_policy=RetryPolicy(max_attempts=2))
+
+        assert client.client.max_retries == 0
+        assert client.retry_policy.max_attempts == 2
+
+    def test_rate_limiter_reconciles_usage(self, mock_client, test_messages):
+        """Test requests acquire rate limit capacity and reconcile with actual usage."""
+        mock_client.rate_limiter = RateLimiter(default=RateLimit(requests_per_minute=100, tokens_per_minute=10_000))
+        mock_client.client.chat.completions.create.return_value = make_completion()
+
+        with patch.object(mock_client.rate_limiter, "reconcile", wraps=mock_client.rate_limiter.reconcile) as reconcile:
+            mock_client.chat_completion(messages=test_messages, max_tokens=500)
+
+        reservation, actual = reconcile.call_args.args
+        assert reservation.model == "gpt-4o"
+        assert reservation.tokens > 500
+        assert actual == 30
+
+    def test_chat_completion_response_cache(self, mock_client, test_messages):
+        """Test deterministic completions are served from the response cache."""
+        mock_client.response_cache = ResponseCache()
+        mock_client.client.chat.completions.create.return_value = make_completion("Cached")
+
+        first = mock_client.chat_completion(messages=test_messages, temperature=0)
+        second = mock_client.chat_completion(messages=test_messages, temperature=0)
+        mock_client.chat_completion(messages=test_messages, temperature=0, use_cache=False)
+        mock_client.chat_completion(messages=test_messages, temperature=0.7)
+
+        assert first == second
+        assert isinstance(second, ChatResult)
+        assert mock_client.client.chat.completions.create.call_count == 3
+        assert mock_client.response_cache.stats.hits == 1
+
+    def test_chat_completion_return_raw(self, mock_client, test_messages):
+        """Test return_raw hands back the SDK object and skips the cache."""
+        mock_client.response_cache = ResponseCache()
+        raw = make_completion()
+        mock_client.client.chat.completions.create.return_value = raw
+
+        result = mock_client.chat_completion(messages=test_messages, temperature=0, return_raw=True)
+
+        assert result is raw
+        assert mock_client.response_cache.stats.writes == 0
+
+    def test_chat_completion_seed_passed(self, mock_client, test_messages):
+        """Test the seed is only sent when set."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+
+        mock_client.chat_completion(messages=test_messages)
+        assert "seed" not in mock_client.client.chat.completions.create.call_args.kwargs
+
+        mock_client.chat_completion(messages=test_messages, seed=42)
+        assert mock_client.client.chat.completions.create.call_args.kwargs["seed"] == 42
+
+    def test_chat_completion_stale_while_revalidate(self, mock_client, test_messages):
+        """Test a stale entry is returned and refreshed in the background."""
+        mock_client.response_cache = ResponseCache(ttl=0, stale_ttl=60)
+        mock_client.client.chat.completions.create.side_effect = [
+            make_completion("Old"), make_completion("New")
+        ]
+
+        mock_client.chat_completion(messages=test_messages, temperature=0)
+        with patch("openai_client.threading.Thread") as mock_thread:
+            stale = mock_client.chat_completion(messages=test_messages, temperature=0)
+            target = mock_thread.call_args.kwargs["target"]
+            target(*mock_thread.call_args.kwargs["args"])
+
+        assert stale["choices"][0]["message"]["content"] == "Old"
+        fresh = mock_client.response_cache.get(mock_client.response_cache.make_key(
+            mock_client.client.chat.completions.create.call_args.kwargs
+        ))
+        assert fresh.response["choices"][0]["message"]["content"] == "New"
+
+    def test_chat_completion_many(self, mock_client, test_messages):
+        """Test fan-out returns ordered results and isolates failures."""
+        def create(**kwargs):
+            content = kwargs["messages"][-1]["content"]
+            if content == "fail":
+                raise ValueError("bad request")
+            return make_completion(content.upper())
+
+        mock_client.client.chat.completions.create.side_effect = create
+        requests = [
+            {"messages": [{"role": "user", "content": text}]}
+            for text in ["one", "fail", "three"]
+        ]
+
+        report = mock_client.chat_completion_many(requests, max_concurrency=2)
+
+        assert [r and r["choices"][0]["message"]["content"] for r in report.responses] == ["ONE", None, "THREE"]
+        assert report.failed == 1
+        assert set(report.latency_percentiles()) == {"p50", "p95", "p99"}
+        completed = list(mock_client.iter_chat_completion_many(requests, max_concurrency=2))
+        assert sorted(item.index for item in completed) == [0, 1, 2]
+
+    def test_stream_chat_completion(self, mock_client, test_messages):
+        """Test streaming requests usage and records time to first token."""
+        mock_client.client.chat.completions.create.return_value = iter([
+            SimpleNamespace(
+                id="chatcmpl-test", created=1700000000, model="gpt-4o", usage=None,
+                choices=[SimpleNamespace(index=0, delta=SimpleNamespace(role="assistant", content="Hi"),
+                                         finish_reason="stop")],
+            )
+        ])
+
+        stream = mock_client.stream_chat_completion(messages=test_messages)
+
+        assert list(stream) == ["Hi"]
+        assert stream.response["choices"][0]["message"]["content"] == "Hi"
+        kwargs = mock_client.client.chat.completions.create.call_args.kwargs
+        assert kwargs["stream"] is True
+        assert kwargs["stream_options"] == {"include_usage": True}
+        assert len(mock_client.metrics.values("chat_completion.ttft")) == 1
+
+    def test_chat_with_image_attaches_image(self, mock_client, test_messages):
+        """Test the image is attached to the last message."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+
+        with patch("builtins.open", mock_open(read_data=b"image_data")):
+            mock_client.chat_with_image(messages=test_messages, image_path="test.jpg")
+
+        kwargs = mock_client.client.chat.completions.create.call_args.kwargs
+        last = kwargs["messages"][-1]
+        assert kwargs["messages"][0] == test_messages[0]
+        assert last["content"][0] == {"type": "text", "text": "Hello, how are you?"}
+        expected = base64.b64encode(b"image_data").decode("utf-8")
+        assert last["content"][1]["image_url"]["url"].endswith(expected)
+
+    def test_chat_with_image_detects_format(self, mock_client, test_messages):
+        """Test the data URL uses the image's real MIME type."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+
+        with patch("builtins.open", mock_open(read_data=b"\x89PNG\r\n\x1a\ndata")):
+            mock_client.chat_with_image(messages=test_messages, image_path="test.png")
+
+        kwargs = mock_client.client.chat.completions.create.call_args.kwargs
+        assert kwargs["messages"][-1]["content"][1]["image_url"]["url"].startswith("data:image/png;base64,")
+
+    def test_chat_with_image_preprocess(self, mock_client, test_messages):
+        """Test preprocessing settings are applied before upload."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+        prepared = PreparedImage(data=b"small", mime_type="image/jpeg", detail="low")
+
+        with patch("builtins.open", mock_open(read_data=b"image_data")), \
+                patch("openai_client.prepare_images", return_value=[prepared]) as mock_prepare:
+            mock_client.chat_with_image(
+                messages=test_messages,
+                image_path="test.jpg",
+                preprocess=ImagePreprocessConfig(),
+            )
+
+        mock_prepare.assert_called_once_with([b"image_data"], ImagePreprocessConfig(), None)
+        kwargs = mock_client.client.chat.completions.create.call_args.kwargs
+        assert kwargs["messages"][-1]["content"][1] == prepared.content_part()
+
+    def test_chat_with_image_uses_image_cache(self, mock_client, test_messages, tmp_path):
+        """Test repeat questions about one image encode it only once."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+        mock_client.image_cache = ImageCache()
+        path = tmp_path / "photo.jpg"
+        path.write_bytes(b"\xff\xd8\xffphoto")
+
+        with patch("cache.prepare_images", wraps=prepare_images) as mock_prepare:
+            for _ in range(3):
+                mock_client.chat_with_image(messages=test_messages, image_path=str(path))
+
+        assert mock_prepare.call_count == 1
+        assert mock_client.image_cache.stats.hits == 2
+
+    def test_chat_completion_clamps_max_tokens(self, mock_client):
+        """Test max_tokens is clamped to the model's remaining context window."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+
+        mock_client.chat_completion(
+            messages=[{"role": "user", "content": "Hello"}],
+            model="gpt-4",
+            max_tokens=100_000,
+        )
+
+        max_tokens = mock_client.client.chat.completions.create.call_args.kwargs["max_tokens"]
+        assert 8000 < max_tokens < 8192
+
+    def test_chat_completion_rejects_long_prompt(self, mock_client):
+        """Test an over-long prompt is rejected without calling the API."""
+        with pytest.raises(ContextWindowExceededError):
+            mock_client.chat_completion(messages=[{"role": "user", "content": "x " * 50_000}], model="gpt-4")
+
+        mock_client.client.chat.completions.create.assert_not_called()
+
+    def test_chat_completion_gpt_4_1_uses_its_own_window(self, mock_client):
+        """Test a gpt-4.1 prompt longer than gpt-4's window is sent with max_tokens intact."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+
+        mock_client.chat_completion(
+            messages=[{"role": "user", "content": "x " * 9_000}],
+            model="gpt-4.1",
+            max_tokens=20_000,
+        )
+
+        assert mock_client.client.chat.completions.create.call_args.kwargs["max_tokens"] == 20_000
+
+    def test_chat_completion_without_context_window_check(self, mock_client):
+        """Test check_context_window=False sends the request unchanged."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+        mock_client.check_context_window = False
+
+        mock_client.chat_completion(
+            messages=[{"role": "user", "content": "x " * 50_000}],
+            model="gpt-4",
+            max_tokens=100_000,
+        )
+
+        assert mock_client.client.chat.completions.create.call_args.kwargs["max_tokens"] == 100_000
+
+    def test_chat_with_images_attaches_all_sources(self, mock_client, test_messages, tmp_path):
+        """Test paths, bytes and file-like images are attached in order."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+        path = tmp_path / "first.png"
+        path.write_bytes(b"\x89PNG\r\n\x1a\nfirst")
+
+        mock_client.chat_with_images(
+            messages=test_messages,
+            images=[str(path), b"GIF89asecond", io.BytesIO(b"\xff\xd8\xffthird")],
+        )
+
+        content = mock_client.client.chat.completions.create.call_args.kwargs["messages"][-1]["content"]
+        assert content[0]["type"] == "text"
+        urls = [part["image_url"]["url"] for part in content[1:]]
+        assert [url.split(";")[0] for url in urls] == ["data:image/png", "data:image/gif", "data:image/jpeg"]
+
+    def test_iter_chat_with_image_directory(self, mock_client, test_messages, tmp_path):
+        """Test every image in a directory gets its own request."""
+        mock_client.client.chat.completions.create.return_value = make_completion()
+        for name in ("b.jpg", "a.png", "notes.txt"):
+            (tmp_path / name).write_bytes(b"\xff\xd8\xffdata")
+
+        items = list(mock_client.iter_chat_with_image_directory(
+            messages=test_messages, directory=str(tmp_path), max_concurrency=2, temperature=0,
+        ))
+
+        assert sorted(os.path.basename(item.request["image_path"]) for item in items) == ["a.png", "b.jpg"]
+        assert all(item.ok for item in items)
+        assert mock_client.client.chat.completions.create.call_args.kwargs["temperature"] == 0
+
+    def test_create_embeddings_preserves_order(self, mock_client):
+        """Test batched embeddings are returned in input order."""
+        mock_client.client.embeddings.create.side_effect = echo_embeddings
+        texts = ["a" * n for n in range(1, 8)]
+
+        result = mock_client.create_embeddings(texts, max_inputs=3)
+
+        assert result == [[float(n)] for n in range(1, 8)]
+        assert mock_client.client.embeddings.create.call_count == 3
+
+    def test_fast_parse_chat_completion(self, mock_client, test_messages):
+        """Test the fast path decodes the raw body without the SDK models."""
+        mock_client.fast_parse = True
+        mock_client.client.chat.completions.with_raw_response.create.return_value = make_raw_response(RAW_COMPLETION)
+
+        result = mock_client.chat_completion(messages=test_messages)
+
+        assert isinstance(result, ChatResult)
+        assert result.content == "Fast"
+        assert result.usage.total_tokens == 6
+        mock_client.client.chat.completions.create.assert_not_called()
+
+    def test_fast_parse_reconciles_rate_limit(self, mock_client, test_messages):
+        """Test usage from a raw body still corrects the rate limit reservation."""
+        mock_client.fast_parse = True
+        mock_client.rate_limiter = MagicMock()
+        mock_client.client.chat.completions.with_raw_response.create.return_value = make_raw_response(RAW_COMPLETION)
+
+        mock_client.chat_completion(messages=test_messages)
+
+        assert mock_client.rate_limiter.reconcile.call_args.args[1] == 6
+
+    def test_fast_parse_embeddings(self, mock_client):
+        """Test the fast path requests float embeddings and keeps input order."""
+        mock_client.fast_parse = True
+        body = {"data": [{"index": 1, "embedding": [2.0]}, {"index": 0, "embedding": [1.0]}], "usage": {}}
+        mock_client.client.embeddings.with_raw_response.create.return_value = make_raw_response(body)
+
+        result = mock_client.create_embeddings(["a", "bb"])
+
+        assert result == [[1.0], [2.0]]
+        kwargs = mock_client.client.embeddings.with_raw_response.create.call_args.kwargs
+        assert kwargs["encoding_format"] == "float"
+
+    def test_create_embeddings_empty(self, mock_client):
+        """Test no request is made for an empty input list."""
+        assert mock_client.create_embeddings([]) == []
+        mock_client.client.embeddings.create.assert_not_called()
+
+    def test_create_embeddings_splits_rejected_batch(self, mock_client):
+        """Test a batch rejected by the API is split and retried."""
+        def create(model, input):
+            if len(input) > 2:
+                raise make_status_error(BadRequestError, 400, "too many tokens")
+            return echo_embeddings(model, input)
+
+        mock_client.client.embeddings.create.side_effect = create
+
+        result = mock_client.create_embeddings(["a", "bb", "ccc", "dddd"])
+
+        assert result == [[1.0], [2.0], [3.0], [4.0]]
+
+    def test_create_embeddings_other_bad_request_is_not_split(self, mock_client):
+        """Test a bad request unrelated to size fails at once instead of being split."""
+        mock_client.client.embeddings.create.side_effect = make_status_error(
+            BadRequestError, 400, "The model `no-such-model` does not exist"
+        )
+
+        with pytest.raises(BadRequestError):
+            mock_client.create_embeddings(["a", "bb", "ccc", "dddd"], model="no-such-model")
+
+        assert mock_client.client.embeddings.create.call_count == 1
+
+    def test_create_embedding_as_numpy(self, mock_client):
+        """Test base64 embeddings are decoded into a float32 array."""
+        mock_client.client.embeddings.create.return_value = make_embedding_response(
+            [encode_vector([0.5, -1.0, 2.0])]
+        )
+
+        result = mock_client.create_embedding(text="Hello", as_numpy=True)
+
+        assert result.dtype == np.float32
+        assert result.tolist() == [0.5, -1.0, 2.0]
+        kwargs = mock_client.client.embeddings.create.call_args.kwargs
+        assert kwargs["encoding_format"] == "base64"
+
+    def test_create_embeddings_as_numpy(self, mock_client):
+        """Test batched base64 embeddings are decoded into one matrix in input order."""
+        def create(model, input, encoding_format):
+            response = make_embedding_response([encode_vector([len(t), 1.0]) for t in input])
+            response.data.reverse()
+            return response
+
+        mock_client.client.embeddings.create.side_effect = create
+
+        result = mock_client.create_embeddings(["a", "bb", "ccc"], max_inputs=2, as_numpy=True)
+
+        assert result.shape == (3, 2)
+        assert result[:, 0].tolist() == [1.0, 2.0, 3.0]
+
+    def test_create_embeddings_as_numpy_empty(self, mock_client):
+        """Test an empty input list gives an empty matrix."""
+        assert mock_client.create_embeddings([], as_numpy=True).shape == (0, 0)
+
+    def test_create_embedding_uses_cache(self, mock_client):
+        """Test a cached embedding is served without an API call."""
+        mock_client.embedding_cache = EmbeddingCache()
+        mock_client.client.embeddings.create.return_value = make_embedding_response([[0.5, 0.25]])
+
+        first = mock_client.create_embedding(text="Hello")
+        second = mock_client.create_embedding(text="Hello ")
+
+        assert first == second == [0.5, 0.25]
+        assert mock_client.client.embeddings.create.call_count == 1
+
+    def test_create_embeddings_only_fetches_misses(self, mock_client):
+        """Test batched embeddings only request texts missing from the cache."""
+        mock_client.embedding_cache = EmbeddingCache()
+        mock_client.embedding_cache.set("text-embedding-3-large", "bb", [20.0])
+        mock_client.client.embeddings.create.side_effect = echo_embeddings
+
+        result = mock_client.create_embeddings(["a", "bb", "ccc"])
+
+        assert result == [[1.0], [20.0], [3.0]]
+        kwargs = mock_client.client.embeddings.create.call_args.kwargs
+        assert kwargs["input"] == ["a", "ccc"]
+        assert mock_client.embedding_cache.get("text-embedding-3-large", "ccc") == [3.0]
+
+    def test_create_embeddings_as_numpy_with_cache(self, mock_client):
+        """Test cached rows and fetched rows are merged into one matrix."""
+        mock_client.embedding_cache = EmbeddingCache()
+        mock_client.embedding_cache.set("text-embedding-3-large", "a", [7.0, 7.0])
+        mock_client.client.embeddings.create.side_effect = lambda model, input, encoding_format: (
+            make_embedding_response([encode_vector([len(t), 1.0]) for t in input])
+        )
+
+        result = mock_client.create_embeddings(["a", "bb"], as_numpy=True)
+
+        assert result.tolist() == [[7.0, 7.0], [2.0, 1.0]]
+
+    def test_batch_embedding_inputs_token_budget(self):
+        """Test batches are cut when the token budget would be exceeded."""
+        texts = ["x" * 30, "x" * 30, "x" * 30]
+
+        assert _batch_embedding_inputs(texts, max_inputs=10, max_tokens=20) == [(0, 2), (2, 3)]
+        assert _batch_embedding_inputs(texts, max_inputs=1, max_tokens=1000) == [(0, 1), (1, 2), (2, 3)]
+        assert _batch_embedding_inputs(["x" * 300], max_inputs=10, max_tokens=5) == [(0, 1)]
+
+    def test_single_flight_coalesces_embeddings(self, mock_client):
+        """Test identical concurrent embedding requests share one API call."""
+        mock_client.single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def create(**kwargs):
+            started.set()
+            release.wait(5)
+            return make_embedding_response([[0.5]])
+
+        mock_client.client.embeddings.create.side_effect = create
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(mock_client.create_embedding("Hello")))]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=lambda: results.append(mock_client.create_embedding("Hello"))))
+        threads[1].start()
+        while mock_client.single_flight.stats.shared < 1:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert results == [[0.5], [0.5]]
+        assert mock_client.client.embeddings.create.call_count == 1
+        assert mock_client.metrics.counter("embedding.requests") == 1
+        assert mock_client.metrics.counter("embedding.coalesced") == 1
+
+    def test_single_flight_only_coalesces_deterministic_chat(self, mock_client, test_messages):
+        """Test sampled chat requests are never shared."""
+        mock_client.single_flight = MagicMock(wraps=SingleFlight())
+        mock_client.client.chat.completions.create.return_value = make_completion()
+
+        mock_client.chat_completion(messages=test_messages, temperature=0.7)
+        assert mock_client.single_flight.do.call_count == 0
+
+        mock_client.chat_completion(messages=test_messages, temperature=0)
+        mock_client.chat_completion(messages=test_messages, seed=7)
+        assert mock_client.single_flight.do.call_count == 2
+
+
+class TestAsyncOpenAIClient:
+    """Mock-based tests for AsyncOpenAIClient."""
+
+    def test_init_missing_api_key(self):
+        """Test missing API key raises ValueError."""
+        with patch.dict(os.environ, {}, clear=True):
+            with pytest.raises(ValueError):
+                AsyncOpenAIClient()
+
+    def test_chat_completion(self, async_mock_client, test_messages):
+        """Test awaitable chat completion."""
+        async_mock_client.client.chat.completions.create.return_value = make_completion("Async")
+
+        result = asyncio.run(async_mock_client.chat_completion(messages=test_messages))
+
+        assert result["choices"][0]["message"]["content"] == "Async"
+        assert result["usage"]["prompt_tokens"] == 10
+
+    def test_chat_completion_stale_while_revalidate(self, async_mock_client, test_messages):
+        """Test a stale entry is returned and refreshed by a background task."""
+        async_mock_client.response_cache = ResponseCache(ttl=0, stale_ttl=60)
+        async_mock_client.client.chat.completions.create.side_effect = [
+            make_completion("Old"), make_completion("New")
+        ]
+
+        async def run():
+            await async_mock_client.chat_completion(messages=test_messages, temperature=0)
+            stale = await async_mock_client.chat_completion(messages=test_messages, temperature=0)
+            await asyncio.gather(*async_mock_client._background_tasks)
+            return stale
+
+        stale = asyncio.run(run())
+
+        assert stale["choices"][0]["message"]["content"] == "Old"
+        assert async_mock_client.client.chat.completions.create.await_count == 2
+
+    def test_chat_completion_many(self, async_mock_client):
+        """Test async fan-out returns results in input order."""
+        async def create(**kwargs):
+            return make_completion(kwargs["messages"][-1]["content"])
+
+        async_mock_client.client.chat.completions.create.side_effect = create
+        requests = [{"messages": [{"role": "user", "content": text}]} for text in ["a", "b", "c"]]
+
+        async def run():
+            report = await async_mock_client.chat_completion_many(requests, max_concurrency=2)
+            items = [item async for item in async_mock_client.iter_chat_completion_many(requests)]
+            return report, items
+
+        report, items = asyncio.run(run())
+
+        assert [r["choices"][0]["message"]["content"] for r in report.responses] == ["a", "b", "c"]
+        assert len(items) == 3
+
+    def test_stream_chat_completion(self, async_mock_client, test_messages):
+        """Test awaitable streaming yields content deltas."""
+        async def chunks():
+            yield SimpleNamespace(
+                id="chatcmpl-test", created=1700000000, model="gpt-4o", usage=None,
+                choices=[SimpleNamespace(index=0, delta=SimpleNamespace(role=None, content="Hi"),
+                                         finish_reason="stop")],
+            )
+
+        async_mock_client.client.chat.completions.create.return_value = chunks()
+
+        async def run():
+            stream = await async_mock_client.stream_chat_completion(messages=test_messages)
+            return [delta async for delta in stream], stream.response
+
+        deltas, response = asyncio.run(run())
+
+        assert deltas == ["Hi"]
+        assert response["choices"][0]["message"]["content"] == "Hi"
+
+    def test_create_embedding(self, async_mock_client):
+        """Test awaitable embedding creation."""
+        async_mock_client.client.embeddings.create.return_value = make_embedding_response([[0.1, 0.2]])
+
+        result = asyncio.run(async_mock_client.create_embedding(text="Hello"))
+
+        assert result == [0.1, 0.2]
+
+    def test_single_flight_coalesces_chat(self, async_mock_client, test_messages):
+        """Test identical concurrent deterministic chat requests share one API call."""
+        async_mock_client.single_flight = AsyncSingleFlight()
+
+        async def create(**kwargs):
+            await asyncio.sleep(0.01)
+            return make_completion("Shared")
+
+        async_mock_client.client.chat.completions.create.side_effect = create
+
+        async def main():
+            return await asyncio.gather(*(
+                async_mock_client.chat_completion(messages=test_messages, temperature=0) for _ in range(3)
+            ))
+
+        results = asyncio.run(main())
+
+        assert [result.content for result in results] == ["Shared"] * 3
+        assert async_mock_client.client.chat.completions.create.call_count == 1
+        assert async_mock_client.metrics.counter("chat_completion.coalesced") == 2
+
+    def test_create_embeddings(self, async_mock_client):
+        """Test awaitable batched embeddings preserve order."""
+        async_mock_client.client.embeddings.create.side_effect = echo_embeddings
+
+        result = asyncio.run(async_mock_client.create_embeddings(["a", "bb", "ccc"], max_inputs=2))
+
+        assert result == [[1.0], [2.0], [3.0]]
+        assert async_mock_client.client.embeddings.create.await_count == 2
+
+    def test_create_embeddings_other_bad_request_is_not_split(self, async_mock_client):
+        """Test an invalid model fails with one request instead of splitting the batch."""
+        async_mock_client.client.embeddings.create.side_effect = make_status_error(
+            BadRequestError, 400, "The model `no-such-model` does not exist"
+        )
+
+        with pytest.raises(BadRequestError):
+            asyncio.run(async_mock_client.create_embeddings(["a"] * 512, model="no-such-model"))
+
+        assert async_mock_client.client.embeddings.create.await_count == 1
+
+    def test_fast_parse_chat_completion(self, async_mock_client, test_messages):
+        """Test the async fast path decodes the raw body."""
+        async_mock_client.fast_parse = True
+        async_mock_client.client.chat.completions.with_raw_response.create = AsyncMock(
+            return_value=make_raw_response(RAW_COMPLETION)
+        )
+
+        result = asyncio.run(async_mock_client.chat_completion(messages=test_messages))
+
+        assert result.content == "Fast"
+
+    def test_fast_parse_embedding_as_numpy(self, async_mock_client):
+        """Test the async fast path keeps base64 output for numpy arrays."""
+        async_mock_client.fast_parse = True
+        body = {"data": [{"index": 0, "embedding": encode_vector([0.5, 1.5])}]}
+        async_mock_client.client.embeddings.with_raw_response.create = AsyncMock(
+            return_value=make_raw_response(body)
+        )
+
+        result = asyncio.run(async_mock_client.create_embedding(text="Hello", as_numpy=True))
+
+        assert result.tolist() == [0.5, 1.5]
+        kwargs = async_mock_client.client.embeddings.with_raw_response.create.call_args.kwargs
+        assert kwargs["encoding_format"] == "base64"
+
+    def test_create_embedding_as_numpy(self, async_mock_client):
+        """Test awaitable embedding decoded into a numpy array."""
+        async_mock_client.client.embeddings.create.return_value = make_embedding_response(
+            [encode_vector([0.25, 0.75])]
+        )
+
+        result = asyncio.run(async_mock_client.create_embedding(text="Hello", as_numpy=True))
+
+        assert result.tolist() == [0.25, 0.75]
+
+    def test_chat_with_image(self, async_mock_client, test_messages):
+        """Test awaitable chat with image."""
+        async_mock_client.client.chat.completions.create.return_value = make_completion()
+
+        with patch("builtins.open", mock_open(read_data=b"image_data")):
+            result = asyncio.run(
+                async_mock_client.chat_with_image(messages=test_messages, image_path="test.jpg")
+            )
+
+        assert "choices" in result
+        kwargs = async_mock_client.client.chat.completions.create.call_args.kwargs
+        assert kwargs["messages"][-1]["content"][1]["type"] == "image_url"
+
+    def test_iter_chat_with_image_directory(self, async_mock_client, test_messages, tmp_path):
+        """Test the async directory mode streams one item per image."""
+        async_mock_client.client.chat.completions.create.return_value = make_completion()
+        for name in ("a.jpg", "b.jpg"):
+            (tmp_path / name).write_bytes(b"\xff\xd8\xffdata")
+
+        async def collect():
+            stream = async_mock_client.iter_chat_with_image_directory(
+                messages=test_messages, directory=str(tmp_path)
+            )
+            return [item async for item in stream]
+
+        items = asyncio.run(collect())
+
+        assert len(items) == 2
+        assert all(item.ok for item in items)
+
+    def test_chat_with_image_file_not_found(self, async_mock_client, test_messages):
+        """Test missing image file raises FileNotFoundError."""
+        with pytest.raises(FileNotFoundError):
+            asyncio.run(
+                async_mock_client.chat_with_image(messages=test_messages, image_path="nonexistent.jpg")
+            )
+
+    def test_async_context_manager_leaves_shared_pool_open(self, async_mock_client):
+        """Test leaving the context manager waits for background work but keeps the shared pool open."""
+        finished = []
+
+        async def refresh():
+            await asyncio.sleep(0.01)
+            finished.append(True)
+
+        async def run():
+            async with async_mock_client as client:
+                assert client is async_mock_client
+                async_mock_client._background_tasks.add(asyncio.create_task(refresh()))
+
+        asyncio.run(run())
+        assert finished == [True]
+        async_mock_client.client.close.assert_not_awaited()
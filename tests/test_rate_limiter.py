@@ -0,0 +1,85 @@
+"""
+Tests for the rate_limiter module.
+"""
+
+import os
+import sys
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rate_limiter import RateLimit, RateLimiter, TokenBucket
+
+clock_module = "rate_limiter"
+
+
+class TestTokenBucket:
+    """Test suite for TokenBucket."""
+
+    def test_refill_and_wait_time(self, clock):
+        """Test tokens refill continuously up to capacity."""
+        bucket = TokenBucket.per_minute(60)
+        bucket.take(60)
+
+        assert bucket.wait_time(1) == pytest.approx(1.0)
+        clock.sleep(30)
+        assert bucket.wait_time(30) == 0.0
+        clock.sleep(120)
+        bucket.refill()
+        assert bucket.tokens == 60
+
+    def test_oversized_request_is_clamped(self, clock):
+        """Test a request larger than the capacity only waits for a full bucket."""
+        bucket = TokenBucket.per_minute(10)
+
+        assert bucket.wait_time(100) == 0.0
+
+
+class TestRateLimiter:
+    """Test suite for RateLimiter."""
+
+    def test_blocks_on_requests_per_minute(self, clock):
+        """Test the request bucket delays requests once exhausted."""
+        limiter = RateLimiter(default=RateLimit(requests_per_minute=2))
+
+        assert limiter.acquire("gpt-4o").waited == 0
+        assert limiter.acquire("gpt-4o").waited == 0
+        reservation = limiter.acquire("gpt-4o")
+        assert reservation.waited == pytest.approx(30.0)
+
+    def test_blocks_on_tokens_per_minute(self, clock):
+        """Test the token bucket delays large requests."""
+        limiter = RateLimiter(per_model={"gpt-4o": RateLimit(tokens_per_minute=600)})
+
+        limiter.acquire("gpt-4o", tokens=600)
+        assert limiter.acquire("gpt-4o", tokens=100).waited == pytest.approx(10.0)
+        assert limiter.acquire("other-model", tokens=10_000).waited == 0
+
+    def test_reconcile_returns_unused_tokens(self, clock):
+        """Test overestimated tokens are given back and underestimates are charged."""
+        limiter = RateLimiter(default=RateLimit(tokens_per_minute=1000))
+
+        reservation = limiter.acquire("m", tokens=800)
+        limiter.reconcile(reservation, actual_tokens=200)
+        assert limiter.acquire("m", tokens=800).waited == 0
+
+        reservation = limiter.acquire("m", tokens=100)
+        limiter.reconcile(reservation, actual_tokens=400)
+        _, token_bucket = limiter._buckets_for("m")
+        assert token_bucket.tokens == pytest.approx(-300)
+
+    def test_acquire_async(self, clock):
+        """Test the async variant awaits instead of blocking."""
+        limiter = RateLimiter(default=RateLimit(requests_per_minute=1))
+        limiter.acquire("m")
+
+        async def advance(seconds):
+            clock.sleep(seconds)
+
+        with patch("rate_limiter.asyncio.sleep", new=AsyncMock(side_effect=advance)) as mock_sleep:
+            reservation = asyncio.run(limiter.acquire_async("m"))
+
+        assert reservation.waited == pytest.approx(60.0)
+        mock_sleep.assert_awaited_once()
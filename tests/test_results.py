@@ -0,0 +1,93 @@
+"""
+Tests for the results module.
+"""
+
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results import ChatResult, Usage
+
+RESPONSE = {
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 1700000000,
+    "model": "gpt-4o",
+    "choices": [
+        {"index": 0, "message": {"role": "assistant", "content": "Hi"}, "finish_reason": "stop"},
+    ],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+}
+
+
+def sdk_completion():
+    """Build an object shaped like an SDK ChatCompletion matching RESPONSE."""
+    return SimpleNamespace(
+        id="chatcmpl-test",
+        object="chat.completion",
+        created=1700000000,
+        model="gpt-4o",
+        choices=[
+            SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content="Hi"),
+                finish_reason="stop",
+            )
+        ],
+        usage=SimpleNamespace(prompt_tokens=3, completion_tokens=1, total_tokens=4),
+    )
+
+
+class TestChatResult:
+    """Test suite for ChatResult."""
+
+    def test_from_completion_matches_dict_shape(self):
+        """Test the converted result compares equal to the response dictionary."""
+        result = ChatResult.from_completion(sdk_completion())
+
+        assert result == RESPONSE
+        assert result["choices"][0]["message"]["content"] == "Hi"
+        assert result.choices[0].message.content == result.content == "Hi"
+        assert result.usage.total_tokens == 4
+
+    def test_dict_round_trip(self):
+        """Test to_dict produces JSON-serializable data from_dict accepts."""
+        result = ChatResult.from_dict(RESPONSE)
+
+        data = result.to_dict()
+
+        assert type(data["choices"][0]["message"]) is dict
+        assert json.loads(json.dumps(data)) == RESPONSE
+        assert ChatResult.from_dict(data) == result
+
+    def test_not_json_serializable_without_to_dict(self):
+        """Test results must be converted with to_dict before json.dumps."""
+        result = ChatResult.from_dict(RESPONSE)
+
+        with pytest.raises(TypeError):
+            json.dumps(result)
+        assert json.loads(json.dumps(result.to_dict())) == RESPONSE
+
+    def test_mapping_interface(self):
+        """Test the dict-compatible view."""
+        result = ChatResult.from_dict({**RESPONSE, "usage": None})
+
+        assert list(result) == ["id", "object", "created", "model", "choices", "usage"]
+        assert len(result) == 6
+        assert result.get("usage") is None
+        assert result.get("missing", "default") == "default"
+        assert "choices" in result
+        with pytest.raises(KeyError):
+            result["missing"]
+
+    def test_slotted(self):
+        """Test results carry no per-instance dictionary."""
+        usage = Usage(1, 2, 3)
+
+        assert not hasattr(usage, "__dict__")
+        with pytest.raises(AttributeError):
+            usage.extra = 1
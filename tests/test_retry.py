@@ -0,0 +1,159 @@
+"""
+Tests for the retry module.
+"""
+
+import os
+import sys
+import time
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+import pytest
+from openai import BadRequestError, InternalServerError, RateLimitError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import ClientMetrics
+from retry import (
+    RetryPolicy,
+    acall_with_retry,
+    call_with_retry,
+    parse_reset_duration,
+    retry_after_from_headers,
+)
+from tests.conftest import make_status_error
+
+
+def flaky(failures, result="ok"):
+    """Return a function that raises each failure in turn, then returns result."""
+    failures = list(failures)
+
+    def call():
+        if failures:
+            raise failures.pop(0)
+        return result
+
+    return call
+
+
+class TestHeaders:
+    """Test suite for rate limit header parsing."""
+
+    def test_parse_reset_duration(self):
+        """Test OpenAI reset duration formats."""
+        assert parse_reset_duration("1s") == 1.0
+        assert parse_reset_duration("6m0s") == 360.0
+        assert parse_reset_duration("20ms") == pytest.approx(0.02)
+        assert parse_reset_duration("1h2m3.5s") == pytest.approx(3723.5)
+        assert parse_reset_duration("soon") is None
+
+    def test_retry_after_from_headers(self):
+        """Test header precedence and formats."""
+        assert retry_after_from_headers({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+        assert retry_after_from_headers({"retry-after": "3"}) == 3.0
+        assert retry_after_from_headers(
+            {"x-ratelimit-reset-requests": "2s", "x-ratelimit-reset-tokens": "500ms"}
+        ) == 2.0
+        assert retry_after_from_headers({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+        assert retry_after_from_headers({}) is None
+        assert retry_after_from_headers(None) is None
+
+
+class TestRetryPolicy:
+    """Test suite for RetryPolicy."""
+
+    def test_is_retryable(self):
+        """Test transient errors are retried and client errors are not."""
+        policy = RetryPolicy()
+
+        assert policy.is_retryable(make_status_error(RateLimitError, 429))
+        assert policy.is_retryable(make_status_error(InternalServerError, 503))
+        assert not policy.is_retryable(make_status_error(BadRequestError, 400))
+        assert not policy.is_retryable(ValueError("bad"))
+
+    def test_max_attempts_by_error(self):
+        """Test per error class attempt limits."""
+        policy = RetryPolicy(max_attempts=5, max_attempts_by_error={RateLimitError: 2})
+
+        assert policy.max_attempts_for(make_status_error(RateLimitError, 429)) == 2
+        assert policy.max_attempts_for(make_status_error(InternalServerError, 500)) == 5
+
+    def test_compute_delay_full_jitter(self):
+        """Test delays are drawn from [0, base * 2**(attempt - 1)] capped at max_delay."""
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+        error = make_status_error(InternalServerError, 500)
+
+        with patch("retry.random.uniform", side_effect=lambda low, high: high) as uniform:
+            assert policy.compute_delay(1, error) == 1.0
+            assert policy.compute_delay(3, error) == 4.0
+            assert policy.compute_delay(10, error) == 5.0
+        assert uniform.call_args.args[0] == 0
+
+    def test_compute_delay_honors_retry_after(self):
+        """Test the server's requested delay is a lower bound."""
+        policy = RetryPolicy(base_delay=0.1)
+        error = make_status_error(RateLimitError, 429, headers={"retry-after": "3"})
+
+        assert policy.compute_delay(1, error) == 3.0
+        assert RetryPolicy(base_delay=0.1, respect_retry_after=False).compute_delay(1, error) <= 0.1
+
+    def test_next_delay_respects_deadline(self):
+        """Test no retry is scheduled past the total deadline."""
+        policy = RetryPolicy(deadline=1.0)
+        error = make_status_error(RateLimitError, 429, headers={"retry-after": "5"})
+
+        assert policy.next_delay(1, error, started_at=time.monotonic()) is None
+        assert RetryPolicy(deadline=None).next_delay(1, error, started_at=time.monotonic()) == 5.0
+
+
+class TestCallWithRetry:
+    """Test suite for call_with_retry and acall_with_retry."""
+
+    @patch("retry.time.sleep")
+    def test_retries_then_succeeds(self, mock_sleep):
+        """Test transient failures are retried and counted."""
+        metrics = ClientMetrics()
+        call = flaky([make_status_error(RateLimitError, 429), make_status_error(InternalServerError, 500)])
+
+        result = call_with_retry(call, RetryPolicy(), metrics, "chat_completion")
+
+        assert result == "ok"
+        assert mock_sleep.call_count == 2
+        assert metrics.counter("chat_completion.retries") == 2
+        assert metrics.counter("retries.RateLimitError") == 1
+
+    @patch("retry.time.sleep")
+    def test_gives_up_after_max_attempts(self, mock_sleep):
+        """Test the last error is raised once attempts are exhausted."""
+        metrics = ClientMetrics()
+        call = flaky([make_status_error(RateLimitError, 429)] * 3)
+
+        with pytest.raises(RateLimitError):
+            call_with_retry(call, RetryPolicy(max_attempts=2), metrics, "embedding")
+
+        assert mock_sleep.call_count == 1
+        assert metrics.counter("embedding.retries_exhausted") == 1
+
+    @patch("retry.time.sleep")
+    def test_non_retryable_raises_immediately(self, mock_sleep):
+        """Test non-retryable errors are not retried."""
+        call = flaky([make_status_error(BadRequestError, 400)])
+
+        with pytest.raises(BadRequestError):
+            call_with_retry(call, RetryPolicy())
+
+        mock_sleep.assert_not_called()
+
+    def test_async_retries_then_succeeds(self):
+        """Test the async variant retries transient failures."""
+        failures = [make_status_error(RateLimitError, 429)]
+
+        async def call():
+            if failures:
+                raise failures.pop(0)
+            return "ok"
+
+        with patch("retry.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            result = asyncio.run(acall_with_retry(call, RetryPolicy()))
+
+        assert result == "ok"
+        assert mock_sleep.call_count == 1
@@ -0,0 +1,263 @@
+"""
+Tests for the routing module.
+"""
+
+import os
+import sys
+import random
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from openai import APITimeoutError, BadRequestError, InternalServerError, RateLimitError
+from circuit_breaker import CircuitBreakerConfig, CircuitBreakerRegistry
+from metrics import ClientMetrics
+from openai_client import OpenAIClient, AsyncOpenAIClient
+from retry import RetryPolicy
+from routing import Backend, BackendRouter, RoutingPolicy, is_backend_failure
+from tests.conftest import make_completion, make_status_error
+
+clock_module = "routing"
+
+
+def make_router(*names, **policy):
+    """Build a seeded router over backends with the given names."""
+    backends = [Backend(name, f"http://{name}.test/v1") for name in names]
+    return BackendRouter(backends, RoutingPolicy(**policy), ClientMetrics(), rng=random.Random(0))
+
+
+def fail():
+    """Raise an upstream failure."""
+    raise make_status_error(InternalServerError, 500)
+
+
+class TestBackend:
+    """Test suite for Backend."""
+
+    def test_serves(self):
+        """Test a backend only serves its listed models."""
+        backend = Backend("vllm", "http://localhost:8000/v1", models=["llama-3"])
+
+        assert backend.models == frozenset({"llama-3"})
+        assert backend.serves("llama-3")
+        assert not backend.serves("gpt-4o")
+        assert Backend("openai").serves("gpt-4o")
+
+
+class TestIsBackendFailure:
+    """Test suite for is_backend_failure."""
+
+    def test_upstream_errors_count(self):
+        """Test only errors caused by the backend count against it."""
+        assert is_backend_failure(make_status_error(InternalServerError, 503))
+        assert is_backend_failure(make_status_error(RateLimitError, 429))
+        assert is_backend_failure(APITimeoutError(request=MagicMock()))
+        assert not is_backend_failure(make_status_error(BadRequestError, 400))
+
+
+class TestBackendRouter:
+    """Test suite for BackendRouter."""
+
+    def test_requires_unique_backends(self):
+        """Test an empty pool or repeated names are rejected."""
+        with pytest.raises(ValueError):
+            BackendRouter([])
+        with pytest.raises(ValueError):
+            BackendRouter([Backend("a"), Backend("a")])
+
+    def test_prefers_lower_latency(self):
+        """Test the backend with the lower EWMA latency is chosen."""
+        router = make_router("fast", "slow")
+        router._states["fast"].latency = 0.1
+        router._states["slow"].latency = 1.0
+
+        assert {router.choose().name for _ in range(10)} == {"fast"}
+
+    def test_prefers_fewer_in_flight(self):
+        """Test load outweighs a small latency advantage."""
+        router = make_router("a", "b")
+        router._states["a"].latency = 0.1
+        router._states["a"].in_flight = 4
+        router._states["b"].latency = 0.2
+
+        assert router.choose().name == "b"
+
+    def test_unmeasured_backend_is_tried(self):
+        """Test a backend without measurements scores as the best known latency."""
+        router = make_router("known", "new")
+        router._states["known"].latency = 0.5
+        router._states["known"].in_flight = 1
+
+        assert router.choose().name == "new"
+
+    def test_ewma(self):
+        """Test latencies are averaged with ewma_alpha."""
+        router = make_router("a", ewma_alpha=0.5)
+        backend = router.backends[0]
+
+        router.call(backend, lambda: "ok")
+        router._states["a"].latency = 1.0
+        router._start(backend)
+        router._finish(backend, 3.0)
+
+        assert router.snapshot()["a"]["latency"] == 2.0
+        assert router.metrics.gauge("routing.a.latency") == 2.0
+        assert router.metrics.counter("routing.a.requests") == 2
+
+    def test_fast_failures_do_not_lower_latency(self):
+        """Test a quick error does not make a backend look faster."""
+        router = make_router("a")
+        router._states["a"].latency = 1.0
+
+        with pytest.raises(InternalServerError):
+            router.call(router.backends[0], fail)
+
+        assert router.snapshot()["a"]["latency"] == 1.0
+
+    def test_filters_by_model(self):
+        """Test only backends serving the model are chosen."""
+        router = BackendRouter([Backend("openai", models=["gpt-4o"]), Backend("vllm", models=["llama-3"])])
+
+        assert router.choose("llama-3").name == "vllm"
+        with pytest.raises(ValueError):
+            router.choose("claude")
+
+    def test_skip(self):
+        """Test skipped backends are avoided while others are available."""
+        router = make_router("a", "b")
+
+        assert {router.choose(skip=lambda backend: backend.name == "a").name for _ in range(10)} == {"b"}
+        assert router.choose(skip=lambda backend: True).name in {"a", "b"}
+
+    def test_drained_backend_preferred_over_skipped(self, clock):
+        """Test a drained backend is used before one skipped for an open circuit."""
+        router = make_router("drained", "skipped")
+        router._states["drained"].drained_until = clock.now + 30
+
+        chosen = {router.choose(skip=lambda backend: backend.name == "skipped").name for _ in range(10)}
+
+        assert chosen == {"drained"}
+
+    def test_drains_failing_backend(self, clock):
+        """Test a backend is drained after consecutive failures and returns later."""
+        router = make_router("bad", "good", failure_threshold=2, drain_duration=10.0)
+        bad = router.backends[0]
+
+        for _ in range(2):
+            with pytest.raises(InternalServerError):
+                router.call(bad, fail)
+
+        assert not router.snapshot()["bad"]["healthy"]
+        assert router.metrics.counter("routing.bad.drained") == 1
+        assert {router.choose().name for _ in range(10)} == {"good"}
+
+        clock.now += 10
+        assert router.snapshot()["bad"]["healthy"]
+
+    def test_success_resets_failures(self, clock):
+        """Test failures must be consecutive to drain a backend."""
+        router = make_router("a", failure_threshold=2)
+        backend = router.backends[0]
+
+        with pytest.raises(InternalServerError):
+            router.call(backend, fail)
+        router.call(backend, lambda: "ok")
+        with pytest.raises(InternalServerError):
+            router.call(backend, fail)
+
+        assert router.snapshot()["a"]["healthy"]
+
+    def test_client_errors_do_not_drain(self, clock):
+        """Test bad requests do not count against a backend."""
+        router = make_router("a", failure_threshold=1)
+
+        with pytest.raises(BadRequestError):
+            router.call(router.backends[0], lambda: (_ for _ in ()).throw(make_status_error(BadRequestError, 400)))
+
+        assert router.snapshot()["a"] == {"latency": None, "in_flight": 0, "failures": 0, "healthy": True}
+
+    def test_acall(self, clock):
+        """Test async calls are tracked like sync ones."""
+        router = make_router("a", failure_threshold=1)
+
+        async def afail():
+            fail()
+
+        async def ok():
+            return "ok"
+
+        assert asyncio.run(router.acall(router.backends[0], ok)) == "ok"
+        with pytest.raises(InternalServerError):
+            asyncio.run(router.acall(router.backends[0], afail))
+        assert not router.snapshot()["a"]["healthy"]
+
+
+class TestClientIntegration:
+    """Tests for routed clients."""
+
+    def make_client(self, client_class=OpenAIClient, **kwargs):
+        """Build a client routing between two backends with mocked SDK clients."""
+        router = make_router("east", "west", failure_threshold=1)
+        client = client_class(api_key="test-key", router=router, **kwargs)
+        for name in client.backend_clients:
+            client.backend_clients[name] = MagicMock()
+        return client
+
+    def test_backend_clients(self):
+        """Test an SDK client is built per backend with its own base URL and key."""
+        router = BackendRouter([Backend("east", "http://east.test/v1", api_key="east-key"), Backend("west")])
+        client = OpenAIClient(api_key="test-key", router=router)
+
+        assert str(client.backend_clients["east"].base_url) == "http://east.test/v1/"
+        assert client.backend_clients["east"].api_key == "east-key"
+        assert client.backend_clients["west"].api_key == "test-key"
+        assert router.metrics is client.metrics
+
+    def test_retry_goes_to_another_backend(self):
+        """Test a failed attempt drains its backend and the retry uses the other one."""
+        client = self.make_client(retry_policy=RetryPolicy(max_attempts=2, base_delay=0))
+        clients = client.backend_clients
+        for name, sdk in clients.items():
+            sdk.chat.completions.create.return_value = make_completion(name)
+        first = client.router.choose().name
+        client.router._rng = random.Random(0)
+        clients[first].chat.completions.create.side_effect = make_status_error(InternalServerError, 500)
+
+        result = client.chat_completion(messages=[{"role": "user", "content": "Hi"}])
+
+        assert result.content != first
+        assert client.router.metrics.counter(f"routing.{first}.drained") == 1
+
+    def test_open_circuit_backend_is_skipped(self):
+        """Test a backend whose circuit is open for the model gets no traffic."""
+        breakers = CircuitBreakerRegistry(CircuitBreakerConfig(min_calls=1))
+        client = self.make_client(circuit_breakers=breakers)
+        breakers.get("gpt-4o", "http://east.test/v1").record(True)
+        for name, sdk in client.backend_clients.items():
+            sdk.chat.completions.create.return_value = make_completion(name)
+
+        results = {client.chat_completion(messages=[{"role": "user", "content": "Hi"}]).content for _ in range(5)}
+
+        assert results == {"west"}
+
+    def test_async_client_routes(self):
+        """Test async calls are routed and shared backend pools are left open on close."""
+        client = AsyncOpenAIClient(api_key="test-key", router=make_router("east", "west"))
+        for name in client.backend_clients:
+            sdk = client.backend_clients[name] = AsyncMock()
+            sdk.embeddings.create.return_value = SimpleNamespace(
+                data=[SimpleNamespace(index=0, embedding=[1.0])],
+                usage=SimpleNamespace(prompt_tokens=1, total_tokens=1),
+            )
+
+        async def main():
+            async with client:
+                return await client.create_embedding("Hi")
+
+        assert asyncio.run(main()) == [1.0]
+        assert sum(client.router.metrics.counter(f"routing.{name}.requests") for name in ("east", "west")) == 1
+        for sdk in client.backend_clients.values():
+            sdk.close.assert_not_awaited()
@@ -0,0 +1,297 @@
+"""
+Tests for the scheduler module.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import ClientMetrics
+from openai_client import OpenAIClient, AsyncOpenAIClient
+from rate_limiter import RateLimiter, RateLimit
+from scheduler import (
+    AsyncRequestScheduler,
+    DeadlineExceededError,
+    Priority,
+    RequestScheduler,
+    check_deadline,
+    current_schedule,
+    schedule,
+)
+from tests.conftest import make_completion
+
+
+def queue_behind(scheduler, requests, order, hold=0.0):
+    """Hold the scheduler's only slot until every request is queued, then release it.
+
+    Args:
+        scheduler: RequestScheduler with max_in_flight=1.
+        requests: (name, priority, deadline) of the requests to queue.
+        order: List the names are appended to as the requests run.
+        hold: Seconds to keep the slot after the requests are queued.
+
+    Returns:
+        Errors raised by the requests, by name.
+    """
+    release = threading.Event()
+    errors = {}
+
+    def queued(name, priority, deadline):
+        with schedule(priority, deadline):
+            try:
+                scheduler.run(lambda: order.append(name))
+            except DeadlineExceededError as e:
+                errors[name] = e
+
+    holder = threading.Thread(target=scheduler.run, args=(release.wait,))
+    holder.start()
+    while scheduler.in_flight == 0:
+        time.sleep(0.001)
+    threads = []
+    for request in requests:
+        thread = threading.Thread(target=queued, args=request)
+        thread.start()
+        threads.append(thread)
+        # Queue in a known order so arrival ties are deterministic
+        while scheduler.queued < len(threads):
+            time.sleep(0.001)
+    time.sleep(hold)
+    release.set()
+    for thread in [holder, *threads]:
+        thread.join(2)
+    return errors
+
+
+class TestSchedule:
+    """Test suite for the schedule context."""
+
+    def test_defaults(self):
+        """Test requests are normal priority without a deadline by default."""
+        assert current_schedule() == (Priority.NORMAL, None)
+        check_deadline()
+
+    def test_nesting(self):
+        """Test inner blocks override the priority but never extend the deadline."""
+        with schedule(Priority.BULK, deadline=10):
+            outer_deadline = current_schedule()[1]
+            with schedule(Priority.INTERACTIVE, deadline=60):
+                assert current_schedule() == (Priority.INTERACTIVE, outer_deadline)
+            with schedule(deadline=1):
+                priority, deadline = current_schedule()
+                assert priority == Priority.BULK
+                assert deadline < outer_deadline
+        assert current_schedule() == (Priority.NORMAL, None)
+
+    def test_check_deadline(self):
+        """Test a passed deadline raises DeadlineExceededError."""
+        with schedule(deadline=0):
+            with pytest.raises(DeadlineExceededError) as exc_info:
+                check_deadline()
+
+        assert exc_info.value.late_by >= 0
+        assert isinstance(exc_info.value, TimeoutError)
+
+
+class TestRequestScheduler:
+    """Test suite for RequestScheduler."""
+
+    def test_rejects_invalid_capacity(self):
+        """Test max_in_flight must allow at least one attempt."""
+        with pytest.raises(ValueError):
+            RequestScheduler(max_in_flight=0)
+
+    def test_runs_immediately_with_free_slot(self):
+        """Test a call with a free slot runs and releases it."""
+        scheduler = RequestScheduler(max_in_flight=2, metrics=ClientMetrics())
+
+        assert scheduler.run(lambda: "ok") == "ok"
+        assert scheduler.in_flight == 0
+        assert len(scheduler.metrics.values("scheduler.normal.wait")) == 1
+
+    def test_priority_order(self):
+        """Test interactive requests run before bulk requests queued earlier."""
+        scheduler = RequestScheduler(max_in_flight=1)
+        order = []
+
+        queue_behind(scheduler, [
+            ("bulk", Priority.BULK, None),
+            ("normal", Priority.NORMAL, None),
+            ("interactive", Priority.INTERACTIVE, None),
+        ], order)
+
+        assert order == ["interactive", "normal", "bulk"]
+
+    def test_earliest_deadline_first(self):
+        """Test requests of one priority run by deadline, then by arrival."""
+        scheduler = RequestScheduler(max_in_flight=1)
+        order = []
+
+        queue_behind(scheduler, [
+            ("none", Priority.NORMAL, None),
+            ("late", Priority.NORMAL, 60),
+            ("soon", Priority.NORMAL, 30),
+            ("none-2", Priority.NORMAL, None),
+        ], order)
+
+        assert order == ["soon", "late", "none", "none-2"]
+
+    def test_expired_requests_are_dropped(self):
+        """Test a request whose deadline passes in the queue is not run."""
+        scheduler = RequestScheduler(max_in_flight=1, metrics=ClientMetrics())
+        order = []
+
+        errors = queue_behind(scheduler, [
+            ("expired", Priority.INTERACTIVE, 0.01),
+            ("bulk", Priority.BULK, None),
+        ], order, hold=0.05)
+
+        assert order == ["bulk"]
+        assert set(errors) == {"expired"}
+        assert scheduler.metrics.counter("scheduler.interactive.expired") == 1
+        assert scheduler.queued == 0
+        assert scheduler.in_flight == 0
+
+    def test_custom_priority_lane(self):
+        """Test priorities outside the Priority classes get their own lane."""
+        scheduler = RequestScheduler(metrics=ClientMetrics())
+
+        with schedule(priority=5):
+            scheduler.run(lambda: None)
+
+        assert len(scheduler.metrics.values("scheduler.priority_5.wait")) == 1
+
+
+class TestAsyncRequestScheduler:
+    """Test suite for AsyncRequestScheduler."""
+
+    def test_priority_and_deadline_order(self):
+        """Test queued tasks run by priority, dropping the expired one."""
+        scheduler = AsyncRequestScheduler(max_in_flight=1, metrics=ClientMetrics())
+        order = []
+
+        async def request(name, priority, deadline=None):
+            with schedule(priority, deadline):
+                async def call():
+                    order.append(name)
+                    await asyncio.sleep(0.02)
+                try:
+                    await scheduler.run(call)
+                except DeadlineExceededError:
+                    order.append(f"{name} expired")
+
+        async def main():
+            first = asyncio.create_task(request("first", Priority.NORMAL))
+            await asyncio.sleep(0)
+            await asyncio.gather(
+                request("bulk", Priority.BULK),
+                request("expired", Priority.INTERACTIVE, 0.005),
+                request("interactive", Priority.INTERACTIVE, 10),
+            )
+            await first
+
+        asyncio.run(main())
+
+        assert order == ["first", "expired expired", "interactive", "bulk"]
+        assert scheduler.metrics.counter("scheduler.interactive.expired") == 1
+        assert scheduler.in_flight == 0
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Test a cancelled task gives up its place without taking a slot."""
+        scheduler = AsyncRequestScheduler(max_in_flight=1)
+
+        async def hold():
+            await asyncio.sleep(0.01)
+
+        async def main():
+            holder = asyncio.create_task(scheduler.run(hold))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(scheduler.run(hold))
+            await asyncio.sleep(0)
+            assert scheduler.queued == 1
+            waiter.cancel()
+            await holder
+            return await scheduler.run(AsyncMock(return_value="ok"))
+
+        assert asyncio.run(main()) == "ok"
+        assert scheduler.queued == 0
+        assert scheduler.in_flight == 0
+
+
+class TestClientIntegration:
+    """Tests for clients with a scheduler."""
+
+    def test_deadline_argument_drops_request(self):
+        """Test a chat request past its deadline is never sent."""
+        client = OpenAIClient(api_key="test-key")
+        client.client = MagicMock()
+
+        with pytest.raises(DeadlineExceededError):
+            client.chat_completion(messages=[{"role": "user", "content": "Hi"}], deadline=0)
+
+        client.client.chat.completions.create.assert_not_called()
+        assert client.metrics.counter("chat_completion.expired") == 1
+
+    def test_scheduler_records_priority(self):
+        """Test attempts go through the scheduler with the call's priority."""
+        scheduler = RequestScheduler(max_in_flight=2)
+        client = OpenAIClient(api_key="test-key", scheduler=scheduler)
+        client.client = MagicMock()
+        client.client.chat.completions.create.return_value = make_completion("Hello")
+
+        result = client.chat_completion(messages=[{"role": "user", "content": "Hi"}], priority=Priority.INTERACTIVE)
+
+        assert result.content == "Hello"
+        assert scheduler.metrics is client.metrics
+        assert len(client.metrics.values("scheduler.interactive.wait")) == 1
+
+    def test_fan_out_keeps_priority(self):
+        """Test requests of a fan-out call inherit the caller's schedule."""
+        client = OpenAIClient(api_key="test-key", scheduler=RequestScheduler())
+        client.client = MagicMock()
+        client.client.chat.completions.create.return_value = make_completion("Hello")
+        requests = [{"messages": [{"role": "user", "content": "Hi"}]} for _ in range(3)]
+
+        with schedule(Priority.BULK):
+            report = client.chat_completion_many(requests)
+
+        assert report.succeeded == 3
+        assert len(client.metrics.values("scheduler.bulk.wait")) == 3
+
+    def test_rate_limit_wait_past_deadline_returns_tokens(self):
+        """Test a request whose deadline passes waiting for rate capacity gives its reservation back."""
+        limiter = RateLimiter(per_model={"gpt-4o": RateLimit(requests_per_minute=6000, tokens_per_minute=1_000_000)})
+        client = OpenAIClient(api_key="test-key", rate_limiter=limiter)
+        client.client = MagicMock()
+        reservation = SimpleNamespace(model="gpt-4o", tokens=100, waited=0.5)
+        limiter.acquire = MagicMock(side_effect=lambda model, tokens: time.sleep(0.02) or reservation)
+        limiter.reconcile = MagicMock()
+
+        with pytest.raises(DeadlineExceededError):
+            client.chat_completion(messages=[{"role": "user", "content": "Hi"}], deadline=0.01)
+
+        limiter.reconcile.assert_called_once_with(reservation, 0)
+        client.client.chat.completions.create.assert_not_called()
+
+    def test_async_client_uses_scheduler(self):
+        """Test async attempts are scheduled and expired streams are not opened."""
+        client = AsyncOpenAIClient(api_key="test-key", scheduler=AsyncRequestScheduler())
+        client.client = AsyncMock()
+        client.client.chat.completions.create.return_value = make_completion("Hello")
+        messages = [{"role": "user", "content": "Hi"}]
+
+        async def main():
+            result = await client.chat_completion(messages=messages, priority=Priority.BULK)
+            with pytest.raises(DeadlineExceededError):
+                await client.stream_chat_completion(messages=messages, deadline=0)
+            return result
+
+        assert asyncio.run(main()).content == "Hello"
+        assert len(client.metrics.values("scheduler.bulk.wait")) == 1
+        assert client.metrics.counter("chat_completion_stream.expired") == 1
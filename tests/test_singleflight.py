@@ -0,0 +1,221 @@
+"""
+Tests for request coalescing.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import pytest
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import AsyncSingleFlight, SingleFlight, SingleFlightStats, request_key
+
+
+class TestRequestKey:
+    """Tests for request_key."""
+
+    def test_key_ignores_argument_order(self):
+        """Test keys depend on the request content, not dictionary order."""
+        assert request_key("embedding", {"model": "m", "input": "x"}) == request_key(
+            "embedding", {"input": "x", "model": "m"}
+        )
+
+    def test_key_differs_by_operation_and_content(self):
+        """Test different operations or arguments give different keys."""
+        key = request_key("embedding", {"input": "x"})
+
+        assert request_key("chat_completion", {"input": "x"}) != key
+        assert request_key("embedding", {"input": "y"}) != key
+
+
+class TestSingleFlightStats:
+    """Tests for SingleFlightStats."""
+
+    def test_saved_rate(self):
+        """Test the saved rate is the fraction of shared results."""
+        assert SingleFlightStats().saved_rate == 0.0
+        assert SingleFlightStats(calls=1, shared=3).saved_rate == 0.75
+
+
+class TestSingleFlight:
+    """Tests for SingleFlight."""
+
+    def test_concurrent_calls_share_one_call(self):
+        """Test callers arriving while a call is in flight receive its result."""
+        group = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "result"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(group.do("key", call)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(group.do("key", call))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while group.stats.shared < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert sorted(results) == [("result", False)] + [("result", True)] * 3
+        assert group.stats.calls == 1 and group.stats.shared == 3
+        assert len(group) == 0
+
+    def test_sequential_calls_are_not_shared(self):
+        """Test nothing is kept once a call completes."""
+        group = SingleFlight()
+
+        assert group.do("key", lambda: 1) == (1, False)
+        assert group.do("key", lambda: 2) == (2, False)
+        assert group.stats.calls == 2
+
+    def test_error_is_raised_for_every_caller(self):
+        """Test waiters receive the leader's exception."""
+        group = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def call():
+            started.set()
+            release.wait(5)
+            raise RuntimeError("boom")
+
+        def run():
+            try:
+                group.do("key", call)
+            except RuntimeError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=run)
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=run)
+        follower.start()
+        while group.stats.shared < 1:
+            time.sleep(0.001)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        assert len(errors) == 2
+        assert len(group) == 0
+
+
+class TestAsyncSingleFlight:
+    """Tests for AsyncSingleFlight."""
+
+    def test_concurrent_calls_share_one_call(self):
+        """Test concurrent coroutines share one call."""
+        group = AsyncSingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def main():
+            return await asyncio.gather(*(group.do("key", call) for _ in range(4)))
+
+        results = asyncio.run(main())
+
+        assert len(calls) == 1
+        assert results == [("result", False)] + [("result", True)] * 3
+        assert group.stats.shared == 3
+        assert len(group) == 0
+
+    def test_error_is_raised_for_every_caller(self):
+        """Test waiters receive the leader's exception."""
+        group = AsyncSingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def main():
+            return await asyncio.gather(*(group.do("key", call) for _ in range(2)), return_exceptions=True)
+
+        results = asyncio.run(main())
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    def test_cancelled_waiter_does_not_cancel_call(self):
+        """Test cancelling a waiter leaves the shared call running."""
+        group = AsyncSingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.02)
+            return "result"
+
+        async def main():
+            leader = asyncio.create_task(group.do("key", call))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(group.do("key", call))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            return await leader, waiter
+
+        result, waiter = asyncio.run(main())
+
+        assert result == ("result", False)
+        assert waiter.cancelled()
+
+    def test_cancelled_leader_does_not_cancel_waiters(self):
+        """Test waiters still get the result when the leader is cancelled."""
+        group = AsyncSingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.02)
+            return "result"
+
+        async def main():
+            leader = asyncio.create_task(group.do("key", call))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(group.do("key", call))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        assert asyncio.run(main()) == ("result", True)
+        assert len(group) == 0
+
+    def test_call_cancelled_with_last_caller(self):
+        """Test the shared call is cancelled once every caller is cancelled."""
+        group = AsyncSingleFlight()
+        finished = []
+
+        async def call():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                finished.append("cancelled")
+                raise
+
+        async def main():
+            callers = [asyncio.create_task(group.do("key", call)) for _ in range(2)]
+            await asyncio.sleep(0)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(main())
+        assert finished == ["cancelled"]
+        assert len(group) == 0
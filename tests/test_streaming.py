@@ -0,0 +1,161 @@
+"""
+Tests for the streaming module.
+"""
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock, AsyncMock
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import ClientMetrics
+from streaming import (
+    ChatCompletionStream,
+    AsyncChatCompletionStream,
+    StreamStats,
+    read_until_first_token,
+    aread_until_first_token,
+)
+
+
+def make_chunk(content=None, role=None, finish_reason=None, usage=None, choices=True):
+    """Build an object shaped like an SDK ChatCompletionChunk."""
+    return SimpleNamespace(
+        id="chatcmpl-test",
+        created=1700000000,
+        model="gpt-4o",
+        choices=[
+            SimpleNamespace(
+                index=0,
+                delta=SimpleNamespace(role=role, content=content),
+                finish_reason=finish_reason,
+            )
+        ] if choices else [],
+        usage=usage,
+    )
+
+
+def make_chunks():
+    """Return a typical chunk sequence ending with a usage-only chunk."""
+    return [
+        make_chunk(role="assistant", content=""),
+        make_chunk(content="Hello"),
+        make_chunk(content=" world"),
+        make_chunk(finish_reason="stop"),
+        make_chunk(
+            choices=False,
+            usage=SimpleNamespace(prompt_tokens=5, completion_tokens=2, total_tokens=7),
+        ),
+    ]
+
+
+class AsyncChunks:
+    """Async iterable over chunks with an awaitable close."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.close = AsyncMock()
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class TestChatCompletionStream:
+    """Test suite for ChatCompletionStream."""
+
+    def test_yields_deltas_and_assembles_response(self):
+        """Test deltas are yielded and the final response is assembled."""
+        metrics = ClientMetrics()
+        stream = ChatCompletionStream(make_chunks(), started_at=0.0, metrics=metrics)
+
+        assert list(stream) == ["Hello", " world"]
+        assert stream.response["choices"][0]["message"] == {"role": "assistant", "content": "Hello world"}
+        assert stream.response["choices"][0]["finish_reason"] == "stop"
+        assert stream.response["usage"]["total_tokens"] == 7
+        assert stream.response["object"] == "chat.completion"
+        assert stream.stats.time_to_first_token is not None
+        assert stream.stats.completion_tokens == 2
+        assert metrics.counter("chat_completion.streams") == 1
+        assert len(metrics.values("chat_completion.ttft")) == 1
+
+    def test_until_done_and_close(self):
+        """Test until_done consumes the stream and closes the response."""
+        chunks = MagicMock()
+        chunks.__iter__.return_value = iter(make_chunks())
+
+        stream = ChatCompletionStream(chunks, started_at=0.0)
+        response = stream.until_done()
+
+        assert response["choices"][0]["message"]["content"] == "Hello world"
+        chunks.close.assert_called()
+
+    def test_tokens_per_second(self):
+        """Test throughput excludes the time to first token."""
+        assert StreamStats(time_to_first_token=1.0, duration=3.0, completion_tokens=10).tokens_per_second == 5.0
+        assert StreamStats(time_to_first_token=1.0, duration=1.0, completion_tokens=10).tokens_per_second is None
+        assert StreamStats().tokens_per_second is None
+
+
+class TestAsyncChatCompletionStream:
+    """Test suite for AsyncChatCompletionStream."""
+
+    def test_yields_deltas_and_assembles_response(self):
+        """Test async deltas are yielded and the response is assembled."""
+        chunks = AsyncChunks(make_chunks())
+        stream = AsyncChatCompletionStream(chunks, started_at=0.0)
+
+        async def collect():
+            return [delta async for delta in stream]
+
+        assert asyncio.run(collect()) == ["Hello", " world"]
+        assert stream.response["choices"][0]["message"]["content"] == "Hello world"
+        assert stream.stats.completion_tokens == 2
+        chunks.close.assert_awaited()
+
+
+class TestReadUntilFirstToken:
+    """Test suite for read_until_first_token and aread_until_first_token."""
+
+    def test_reads_to_first_content_and_replays(self):
+        """Test chunks up to the first content are read and replayed in order."""
+        chunks = make_chunks()
+        consumed = []
+
+        def source():
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+        prefetched = read_until_first_token(source())
+
+        assert consumed == chunks[:2]
+        assert list(prefetched) == chunks
+
+    def test_closes_stream_on_error(self):
+        """Test the stream is closed if reading the first token fails."""
+        def reset():
+            yield make_chunk(role="assistant", content="")
+            raise RuntimeError("connection reset")
+
+        chunks = MagicMock()
+        chunks.__iter__.return_value = reset()
+
+        with pytest.raises(RuntimeError):
+            read_until_first_token(chunks)
+        chunks.close.assert_called_once()
+
+    def test_async_reads_to_first_content_and_replays(self):
+        """Test async chunks are prefetched, replayed and closed."""
+        chunks = AsyncChunks(make_chunks())
+
+        async def main():
+            prefetched = await aread_until_first_token(chunks)
+            replayed = [chunk async for chunk in prefetched]
+            await prefetched.close()
+            return replayed
+
+        assert asyncio.run(main()) == chunks.chunks
+        chunks.close.assert_awaited_once()
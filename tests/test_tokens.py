@@ -0,0 +1,179 @@
+"""
+Tests for the tokens module.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tokens import (
+    ContextWindowExceededError,
+    REPLY_PRIMING_TOKENS,
+    TOKENS_PER_MESSAGE,
+    TokenCounter,
+    context_window,
+    estimate_request_tokens,
+    estimate_tokens,
+    fit_request,
+    trim_messages,
+)
+
+
+@pytest.fixture
+def word_tiktoken():
+    """Patch tiktoken with an encoding that counts one token per word."""
+    fake = MagicMock()
+    fake.encoding_name_for_model.return_value = "words"
+    fake.get_encoding.return_value = SimpleNamespace(encode=lambda text, disallowed_special=(): text.split())
+    with patch("tokens.tiktoken", fake):
+        yield fake
+
+
+def message(role, words):
+    """Build a message whose content is the given number of words."""
+    return {"role": role, "content": " ".join(["word"] * words)}
+
+
+class TestTokenCounting:
+    """Test suite for TokenCounter."""
+
+    def test_context_window_prefix_match(self):
+        """Test model names match the longest known prefix."""
+        assert context_window("gpt-4o-2024-08-06") == 128_000
+        assert context_window("gpt-4-32k-0613") == 32_768
+        assert context_window("gpt-4-0613") == 8_192
+        assert context_window("my-fine-tune") is None
+
+    def test_context_window_prefix_ends_at_dash(self):
+        """Test newer families are not matched by a shorter prefix such as gpt-4."""
+        assert context_window("gpt-4.1") == 1_047_576
+        assert context_window("gpt-4.1-mini-2025-04-14") == 1_047_576
+        assert context_window("gpt-4.5-preview") == 128_000
+        assert context_window("gpt-4-vision-preview") == 128_000
+        assert context_window("o1-mini") == 128_000
+        assert context_window("gpt-4x") is None
+
+    def test_heuristic_without_tiktoken(self):
+        """Test the character estimate is used when tiktoken is missing."""
+        with patch("tokens.tiktoken", None):
+            counter = TokenCounter()
+
+            assert counter.count_text("a" * 10, "gpt-4o") == estimate_tokens("a" * 10) == 3
+
+    def test_unloadable_encoding_falls_back(self):
+        """Test an encoding that fails to load falls back to the estimate once."""
+        fake = MagicMock()
+        fake.encoding_name_for_model.return_value = "o200k_base"
+        fake.get_encoding.side_effect = OSError("offline")
+        with patch("tokens.tiktoken", fake):
+            counter = TokenCounter()
+            counter.count_text("abcd", "gpt-4o")
+            assert counter.count_text("abcd", "gpt-4o") == 1
+
+        assert fake.get_encoding.call_count == 1
+
+    def test_count_messages_includes_overhead(self, word_tiktoken):
+        """Test message and reply priming overhead is counted."""
+        counter = TokenCounter()
+        messages = [message("system", 5), {"role": "user", "content": "two words", "name": "bob"}]
+
+        expected = (TOKENS_PER_MESSAGE + 1 + 5) + (TOKENS_PER_MESSAGE + 1 + 2 + 1 + 1) + REPLY_PRIMING_TOKENS
+        assert counter.count_messages(messages, "gpt-4o") == expected
+
+    def test_message_counts_are_cached(self, word_tiktoken):
+        """Test repeated messages are tokenized only once."""
+        counter = TokenCounter()
+        encoding = word_tiktoken.get_encoding.return_value
+        encoding.encode = MagicMock(side_effect=lambda text, disallowed_special=(): text.split())
+
+        counter.count_message(message("user", 3), "gpt-4o")
+        calls = encoding.encode.call_count
+        counter.count_message(message("user", 3), "gpt-4o")
+
+        assert encoding.encode.call_count == calls
+
+    def test_image_parts(self, word_tiktoken):
+        """Test image parts are counted by detail level."""
+        counter = TokenCounter()
+        content = [
+            {"type": "text", "text": "look"},
+            {"type": "image_url", "image_url": {"url": "data:", "detail": "low"}},
+            {"type": "image_url", "image_url": {"url": "data:", "detail": "high"}},
+        ]
+
+        assert counter.count_message({"role": "user", "content": content}, "gpt-4o") == (
+            TOKENS_PER_MESSAGE + 1 + 1 + 85 + 765
+        )
+
+    def test_estimate_request_tokens(self):
+        """Test rate limit estimates use the character heuristic plus max_tokens."""
+        request = {
+            "max_tokens": 100,
+            "messages": [
+                {"role": "system", "content": "a" * 8},
+                {"role": "user", "content": [
+                    {"type": "text", "text": "b" * 4},
+                    {"type": "image_url", "image_url": {"url": "data:", "detail": "low"}},
+                ]},
+            ],
+        }
+
+        assert estimate_request_tokens(request) == 100 + 2 + 1 + 85
+
+
+class TestFitRequest:
+    """Test suite for context-window preflight."""
+
+    def test_clamps_max_tokens(self, word_tiktoken):
+        """Test max_tokens is clamped to the space left in the window."""
+        request = {"model": "gpt-4", "messages": [message("user", 8000)], "max_tokens": 1000}
+
+        fitted = fit_request(request, TokenCounter())
+
+        prompt = TOKENS_PER_MESSAGE + 1 + 8000 + REPLY_PRIMING_TOKENS
+        assert fitted["max_tokens"] == 8192 - prompt
+        assert request["max_tokens"] == 1000
+
+    def test_unknown_model_unchanged(self, word_tiktoken):
+        """Test requests for unknown models are not checked."""
+        request = {"model": "custom", "messages": [message("user", 10**6)], "max_tokens": 10}
+
+        assert fit_request(request, TokenCounter()) is request
+
+    def test_rejects_over_budget_prompt(self, word_tiktoken):
+        """Test an over-long prompt raises before anything is sent."""
+        request = {"model": "gpt-4", "messages": [message("user", 9000)], "max_tokens": 10}
+
+        with pytest.raises(ContextWindowExceededError) as excinfo:
+            fit_request(request, TokenCounter())
+
+        assert excinfo.value.context_window == 8192
+        assert isinstance(excinfo.value, ValueError)
+
+    def test_newer_models_are_not_checked_against_gpt_4(self, word_tiktoken):
+        """Test gpt-4.1 and gpt-4.5 prompts are checked against their own windows."""
+        for model in ("gpt-4.1", "gpt-4.5-preview"):
+            request = {"model": model, "messages": [message("user", 9000)], "max_tokens": 20000}
+
+            assert fit_request(request, TokenCounter())["max_tokens"] == 20000
+
+    def test_trims_oldest_messages(self, word_tiktoken):
+        """Test trimming drops old turns but keeps system and last messages."""
+        messages = [message("system", 100), message("user", 4000), message("assistant", 4000), message("user", 1000)]
+        request = {"model": "gpt-4", "messages": messages, "max_tokens": 500}
+
+        fitted = fit_request(request, TokenCounter(), trim=True)
+
+        assert fitted["messages"] == [messages[0], messages[2], messages[3]]
+        assert fitted["max_tokens"] <= 500
+
+    def test_trim_fails_when_last_message_too_long(self, word_tiktoken):
+        """Test trimming cannot drop the last message."""
+        messages = [message("user", 10), message("user", 9000)]
+
+        with pytest.raises(ContextWindowExceededError):
+            trim_messages(messages, "gpt-4", 8000, TokenCounter())
@@ -0,0 +1,303 @@
+"""
+Local token counting and context-window checks for chat requests.
+
+Counts prompt tokens with tiktoken when it is installed (falling back to a
+character-based estimate otherwise), including the per-message overhead of the
+chat format, so over-long requests can be rejected or trimmed before they are
+sent and max_tokens can be clamped to the space left in the context window.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+from logger import get_logger
+from cache import LRUCache
+from image_processing import BASE_IMAGE_TOKENS
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is optional
+    tiktoken = None
+
+logger = get_logger(__name__)
+
+# Context window sizes in tokens, matched by the longest model name prefix
+# that is followed by "-" or the end of the name (so "gpt-4.1" is not "gpt-4")
+CONTEXT_WINDOWS = {
+    "gpt-5": 400_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4.5": 128_000,
+    "gpt-4o": 128_000,
+    "chatgpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4-vision": 128_000,
+    "gpt-4-1106": 128_000,
+    "gpt-4-0125": 128_000,
+    "gpt-4-32k": 32_768,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "gpt-3.5-turbo-instruct": 4_096,
+    "o1": 200_000,
+    "o1-mini": 128_000,
+    "o1-preview": 128_000,
+    "o3": 200_000,
+    "o4-mini": 200_000,
+}
+
+# Chat format overhead: every message is wrapped in a few tokens, and the
+# reply is primed with a few more
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+REPLY_PRIMING_TOKENS = 3
+
+# Rough token cost of one high-detail image whose size is unknown
+IMAGE_TOKEN_ESTIMATE = 765
+
+DEFAULT_ENCODING = "o200k_base"
+
+
+class ContextWindowExceededError(ValueError):
+    """Raised when a request cannot fit in the model's context window."""
+
+    def __init__(self, model: str, prompt_tokens: int, context_window: int):
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.context_window = context_window
+        super().__init__(
+            f"Prompt of {prompt_tokens} tokens does not fit the {context_window} token "
+            f"context window of {model}"
+        )
+
+
+def context_window(model: str) -> Optional[int]:
+    """Return the context window of a model.
+
+    Args:
+        model: Model name, e.g. "gpt-4o" or "gpt-4o-2024-08-06". A known name
+            only matches up to a "-" or the end, so "gpt-4.1" is not "gpt-4".
+
+    Returns:
+        Context window in tokens, or None for unknown models.
+    """
+    matches = [
+        prefix for prefix in CONTEXT_WINDOWS
+        if model.startswith(prefix) and model[len(prefix):len(prefix) + 1] in ("", "-")
+    ]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text at about four characters per token."""
+    return (len(text) + 3) // 4
+
+
+def _count_content(content: Any, count_text: Callable[[str], int]) -> int:
+    """Count the tokens of message content (a string or a list of parts) with count_text."""
+    if isinstance(content, str):
+        return count_text(content)
+    tokens = 0
+    for part in content:
+        if part.get("type") == "text":
+            tokens += count_text(part["text"])
+        elif part.get("image_url", {}).get("detail") == "low":
+            tokens += BASE_IMAGE_TOKENS
+        else:
+            tokens += IMAGE_TOKEN_ESTIMATE
+    return tokens
+
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Estimate the tokens a chat request counts against a tokens-per-minute limit.
+
+    Uses estimate_tokens rather than a tokenizer, since it runs for every
+    attempt sent through a rate limiter or key pool.
+
+    Args:
+        request: Keyword arguments of the chat completion request.
+
+    Returns:
+        Estimated prompt tokens plus max_tokens.
+    """
+    tokens = request.get("max_tokens") or 0
+    for message in request["messages"]:
+        tokens += _count_content(message.get("content") or "", estimate_tokens)
+    return tokens
+
+
+class TokenCounter:
+    """Counts chat prompt tokens, caching the count of each message.
+
+    Conversations resend the same messages on every turn, so per-message counts
+    are kept in an LRU cache keyed by encoding, role, name and content.
+    """
+
+    def __init__(self, max_cached_messages: int = 10_000):
+        """Initialize the counter.
+
+        Args:
+            max_cached_messages: Maximum number of message counts to cache.
+        """
+        self._counts = LRUCache(max_entries=max_cached_messages, max_bytes=64 * 1024 * 1024)
+        self._encodings: Dict[str, Any] = {}
+
+    def encoding_name(self, model: str) -> str:
+        """Return the tiktoken encoding name used by a model."""
+        if tiktoken is None:
+            return "estimate"
+        try:
+            return tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            return DEFAULT_ENCODING
+
+    def _encoding(self, name: str) -> Optional[Any]:
+        """Return a tiktoken encoding, or None if it cannot be loaded."""
+        if name not in self._encodings:
+            try:
+                self._encodings[name] = tiktoken.get_encoding(name) if tiktoken is not None else None
+            except Exception as e:
+                logger.warning(f"Could not load tiktoken encoding {name}, estimating token counts: {str(e)}")
+                self._encodings[name] = None
+        return self._encodings[name]
+
+    def count_text(self, text: str, model: str) -> int:
+        """Count the tokens of a piece of text.
+
+        Args:
+            text: Text to count.
+            model: Model whose tokenizer to use.
+
+        Returns:
+            Number of tokens.
+        """
+        encoding = self._encoding(self.encoding_name(model))
+        if encoding is None:
+            return estimate_tokens(text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: Dict[str, Any], model: str) -> int:
+        """Count the tokens of one message, including the chat format overhead.
+
+        Args:
+            message: Message dictionary (role, content and optionally name).
+            model: Model whose tokenizer to use.
+
+        Returns:
+            Number of tokens.
+        """
+        content = message.get("content") or ""
+        name = message.get("name")
+        key = None
+        if isinstance(content, str):
+            key = (self.encoding_name(model), message["role"], name, content)
+            cached = self._counts.get(key)
+            if cached is not None:
+                return cached
+
+        tokens = TOKENS_PER_MESSAGE + self.count_text(message["role"], model)
+        if name:
+            tokens += TOKENS_PER_NAME + self.count_text(name, model)
+        tokens += _count_content(content, lambda text: self.count_text(text, model))
+
+        if key is not None:
+            self._counts.set(key, tokens, size=len(content) + 64)
+        return tokens
+
+    def count_messages(self, messages: List[Dict[str, Any]], model: str) -> int:
+        """Count the prompt tokens of a list of messages.
+
+        Args:
+            messages: Message dictionaries.
+            model: Model whose tokenizer to use.
+
+        Returns:
+            Number of prompt tokens, including the reply priming.
+        """
+        return sum(self.count_message(message, model) for message in messages) + REPLY_PRIMING_TOKENS
+
+
+def trim_messages(
+    messages: List[Dict[str, Any]],
+    model: str,
+    max_prompt_tokens: int,
+    counter: TokenCounter,
+) -> List[Dict[str, Any]]:
+    """Drop the oldest non-system messages until the prompt fits.
+
+    System messages and the last message are always kept.
+
+    Args:
+        messages: Message dictionaries, oldest first.
+        model: Model whose tokenizer to use.
+        max_prompt_tokens: Token budget for the prompt.
+        counter: Token counter.
+
+    Returns:
+        The kept messages in their original order.
+
+    Raises:
+        ContextWindowExceededError: If the prompt does not fit even after
+            dropping every message that may be dropped.
+    """
+    counts = [counter.count_message(message, model) for message in messages]
+    total = sum(counts) + REPLY_PRIMING_TOKENS
+    keep = [True] * len(messages)
+    for index, message in enumerate(messages[:-1]):
+        if total <= max_prompt_tokens:
+            break
+        if message["role"] == "system":
+            continue
+        keep[index] = False
+        total -= counts[index]
+
+    if total > max_prompt_tokens:
+        raise ContextWindowExceededError(model, total, max_prompt_tokens)
+    dropped = keep.count(False)
+    if dropped:
+        logger.debug(f"Trimmed {dropped} oldest messages to fit {max_prompt_tokens} prompt tokens")
+    return [message for message, kept in zip(messages, keep) if kept]
+
+
+def fit_request(
+    request: Dict[str, Any],
+    counter: TokenCounter,
+    trim: bool = False,
+    min_completion_tokens: int = 1,
+) -> Dict[str, Any]:
+    """Check a chat request against its model's context window.
+
+    Requests for models with an unknown context window are returned unchanged.
+
+    Args:
+        request: Keyword arguments of the chat completion request.
+        counter: Token counter.
+        trim: Drop the oldest non-system messages instead of failing when the
+            prompt is too long.
+        min_completion_tokens: Tokens that must remain for the completion.
+
+    Returns:
+        The request, with messages trimmed if requested and max_tokens clamped
+        to the space left in the context window.
+
+    Raises:
+        ContextWindowExceededError: If the prompt leaves fewer than
+            min_completion_tokens and cannot be trimmed to fit.
+    """
+    model = request["model"]
+    window = context_window(model)
+    if window is None:
+        return request
+
+    messages = request["messages"]
+    prompt_tokens = counter.count_messages(messages, model)
+    if window - prompt_tokens < min_completion_tokens:
+        if not trim:
+            raise ContextWindowExceededError(model, prompt_tokens, window)
+        messages = trim_messages(messages, model, window - min_completion_tokens, counter)
+        prompt_tokens = counter.count_messages(messages, model)
+        request = {**request, "messages": messages}
+
+    available = window - prompt_tokens
+    max_tokens = request.get("max_tokens")
+    if max_tokens is not None and max_tokens > available:
+        logger.debug(f"Clamping max_tokens from {max_tokens} to {available} for {model}")
+        request = {**request, "max_tokens": available}
+    return request